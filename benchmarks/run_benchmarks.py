@@ -0,0 +1,401 @@
+"""Benchmarks of the Backblaze data functions on synthetic fleets.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000
+    python -m benchmarks.run_benchmarks --sizes 1000 --save-baseline
+    python -m benchmarks.run_benchmarks --sizes 1000 --baseline benchmarks/baseline.json
+
+Every case runs in a fresh process so its peak RSS is not inflated by earlier cases. A case whose process
+dies (e.g. killed for running out of memory) is recorded with an error, and the run exits with status 1.
+Per-serial loops (adjust_dates, fix_date_gaps with vectorized=False) and the build_sequences_{failed,normal}
+cases only run on the first --loop-serials drives; serials_used in the results says how many.
+
+score_fleet scores one snapshot of every drive, so its throughput is drives per second; a wide, short fleet
+measures it at fleet scale:
+
+    python -m benchmarks.run_benchmarks --cases score_fleet --sizes 1000000 --days 2
+
+The run_parallel_pipeline_{1,4,16} cases run the same 16 partitions with 1, 4 and 16 worker processes;
+cpu_seconds only counts the parent process, and the speedup depends on the cores of the machine:
+
+    python -m benchmarks.run_benchmarks --cases run_parallel_pipeline_1 run_parallel_pipeline_4 run_parallel_pipeline_16
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import logging
+import multiprocessing
+import platform
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from phm_ml.data_process import data_backblaze_harddrive as harddrive
+from phm_ml.data_process.parallel import run_parallel_pipeline
+from phm_ml.data_process.sequences import build_sequences
+from phm_ml.data_process.synthetic import generate_fleet, write_daily_csv
+from phm_ml.data_process.validation import validate_telemetry
+from phm_ml.scoring.health import latest_snapshots, score_fleet
+from phm_ml.utils.memory import reset_peak_rss
+from phm_ml.utils.profiling import profile_stage
+import preprocess
+
+BENCHMARK_DIRECTORY = Path(__file__).parent
+DEFAULT_BASELINE = BENCHMARK_DIRECTORY / "baseline.json"
+
+# The functions only log through this logger, which stays quiet during the timings
+_logger = logging.getLogger("phm_ml.benchmarks")
+_logger.setLevel(logging.WARNING)
+
+
+class Fleet:
+    """Lazily prepared inputs of the benchmark cases for one synthetic fleet."""
+
+    def __init__(self, directory: Path, loop_serials: int):
+        self.directory = directory
+        self.path = directory / "fleet.parquet"
+        self.loop_serials = loop_serials
+
+    def scan(self) -> pl.LazyFrame:
+        return pl.scan_parquet(self.path)
+
+    def rows(self) -> int:
+        return self.scan().select(pl.len()).collect().item()
+
+    def cleaned(self) -> pl.DataFrame:
+        return harddrive.data_clean(self.scan(), _logger).collect()
+
+    def gap_filled(self) -> pl.DataFrame:
+        return harddrive.fix_date_gaps(self.cleaned().lazy()).collect()
+
+    def loop_subset(self, df: pl.DataFrame, failed: Optional[bool] = None) -> pl.Series:
+        """The first loop_serials serials of df, optionally only failed or only normal ones."""
+        summary = df.group_by('serial_number').agg((pl.col('failure') == 1).any().alias('failed')).sort('serial_number')
+        if failed is not None:
+            summary = summary.filter(pl.col('failed') == failed)
+        return summary.get_column('serial_number').head(self.loop_serials)
+
+
+def _case_data_clean(fleet: Fleet) -> Tuple[Callable, int, Optional[int]]:
+    return lambda: harddrive.data_clean(fleet.scan(), _logger).collect(), fleet.rows(), None
+
+
+def _case_compact_schema(fleet: Fleet):
+    cleaned = fleet.cleaned()
+    smart_columns = [col for col in cleaned.columns if col.startswith("smart_")]
+    return lambda: harddrive.compact_schema(cleaned.lazy(), smart_columns).collect(), cleaned.height, None
+
+
+def _case_summarize_serials(fleet: Fleet):
+    return lambda: harddrive.summarize_serials(fleet.scan()), fleet.rows(), None
+
+
+def _case_get_disk_serials(fleet: Fleet):
+    def run():
+        _, _, normal_df, failed_df = harddrive.get_disk_serials(fleet.scan(), num_normal_serials=100)
+        return pl.concat([normal_df, failed_df]).collect()
+    return run, fleet.rows(), None
+
+
+def _case_fix_date_gaps(fleet: Fleet):
+    cleaned = fleet.cleaned()
+    return lambda: harddrive.fix_date_gaps(cleaned.lazy()).collect(), cleaned.height, None
+
+
+def _case_fix_date_gaps_loop(fleet: Fleet):
+    cleaned = fleet.cleaned()
+    serials = fleet.loop_subset(cleaned)
+    subset = cleaned.filter(pl.col('serial_number').is_in(serials.implode()))
+    return (lambda: harddrive.fix_date_gaps(subset.lazy(), serials=serials, vectorized=False).collect(),
+            subset.height, serials.len())
+
+
+def _case_adjust_dates(fleet: Fleet):
+    cleaned = fleet.cleaned()
+    serials = fleet.loop_subset(cleaned)
+    frames = [cleaned.filter(pl.col('serial_number') == serial).lazy() for serial in serials]
+
+    def run():
+        return pl.concat([harddrive.adjust_dates(frame).collect() for frame in frames])
+    return run, sum(frame.select(pl.len()).collect().item() for frame in frames), serials.len()
+
+
+def _case_build_sequences_subset(failed: bool) -> Callable[[Fleet], Tuple[Callable, int, Optional[int]]]:
+    # Every window of the first loop_serials failed or normal drives
+    def setup(fleet: Fleet):
+        gap_filled = fleet.gap_filled()
+        serials = fleet.loop_subset(gap_filled, failed=failed)
+        subset = gap_filled.filter(pl.col('serial_number').is_in(serials.implode()))
+        return lambda: build_sequences(subset.lazy(), 10, 1), subset.height, serials.len()
+    return setup
+
+
+def _case_build_sequences(fleet: Fleet):
+    gap_filled = fleet.gap_filled()
+    return lambda: build_sequences(gap_filled.lazy(), 10, 1), gap_filled.height, None
+
+
+def _case_load_all_csv_files_streaming(fleet: Fleet):
+    return (lambda: preprocess.load_all_csv_files_streaming(fleet.directory, year=2017, num_quarters=1),
+            fleet.rows(), None)
+
+
+def _raw_frame(fleet: Fleet) -> pl.DataFrame:
+    return fleet.scan().with_columns(pl.col('date').dt.strftime("%Y-%m-%d")).collect()
+
+
+def _case_preprocess_data(fleet: Fleet):
+    raw = _raw_frame(fleet)
+    return lambda: preprocess.preprocess_data(raw), raw.height, None
+
+
+def _case_balance_dataset(fleet: Fleet):
+    preprocessed = preprocess.preprocess_data(_raw_frame(fleet))
+    return lambda: preprocess.balance_dataset(preprocessed), preprocessed.height, None
+
+
+def _case_prepare_train_test_split(fleet: Fleet):
+    preprocessed = preprocess.preprocess_data(_raw_frame(fleet))
+    return lambda: preprocess.prepare_train_test_split(preprocessed), preprocessed.height, None
+
+
+def _case_score_fleet(fleet: Fleet):
+    # The last day of every drive, scored against its previous day
+    snapshot, previous = (frame.collect() for frame in latest_snapshots(fleet.scan(), max_age_days=None))
+    return lambda: score_fleet(snapshot, previous), snapshot.height, None
+
+
+def _case_validate_telemetry(fleet: Fleet):
+    return lambda: validate_telemetry(fleet.scan()), fleet.rows(), None
+
+
+def _case_run_parallel_pipeline(workers: int) -> Callable[[Fleet], Tuple[Callable, int, Optional[int]]]:
+    # The same 16 partitions with 1, 4 or 16 worker processes; the speedup is the ratio of the wall times
+    def setup(fleet: Fleet):
+        output = fleet.directory / f"parallel-{workers}"
+        return (lambda: run_parallel_pipeline(fleet.path, output, 10, 1, num_shards=16, workers=workers),
+                fleet.rows(), None)
+    return setup
+
+
+# Case name -> (module of the benchmarked function, setup returning (run, rows_in, serials_used))
+CASES: Dict[str, Tuple[str, Callable[[Fleet], Tuple[Callable, int, Optional[int]]]]] = {
+    'data_clean': ("data_backblaze_harddrive", _case_data_clean),
+    'compact_schema': ("data_backblaze_harddrive", _case_compact_schema),
+    'summarize_serials': ("data_backblaze_harddrive", _case_summarize_serials),
+    'get_disk_serials': ("data_backblaze_harddrive", _case_get_disk_serials),
+    'fix_date_gaps': ("data_backblaze_harddrive", _case_fix_date_gaps),
+    'fix_date_gaps_loop': ("data_backblaze_harddrive", _case_fix_date_gaps_loop),
+    'adjust_dates': ("data_backblaze_harddrive", _case_adjust_dates),
+    'build_sequences': ("sequences", _case_build_sequences),
+    'build_sequences_failed': ("sequences", _case_build_sequences_subset(failed=True)),
+    'build_sequences_normal': ("sequences", _case_build_sequences_subset(failed=False)),
+    'load_all_csv_files_streaming': ("preprocess", _case_load_all_csv_files_streaming),
+    'preprocess_data': ("preprocess", _case_preprocess_data),
+    'balance_dataset': ("preprocess", _case_balance_dataset),
+    'prepare_train_test_split': ("preprocess", _case_prepare_train_test_split),
+    'score_fleet': ("scoring.health", _case_score_fleet),
+    'validate_telemetry': ("validation", _case_validate_telemetry),
+    **{f'run_parallel_pipeline_{workers}': ("parallel", _case_run_parallel_pipeline(workers)) for workers in [1, 4, 16]},
+}
+
+
+def prepare_fleet(work_directory: Path, num_serials: int, num_days: int, failure_rate: float,
+                  missing_day_rate: float, seed: int, csv: bool) -> Path:
+    """Generate (or reuse) the parquet file and daily CSV files of one synthetic fleet."""
+    directory = work_directory / f"fleet-{num_serials}x{num_days}-f{failure_rate:g}-m{missing_day_rate:g}-s{seed}"
+    path = directory / "fleet.parquet"
+    csv_directory = directory / "data_Q1_2017"
+    if path.exists() and (not csv or csv_directory.exists()):
+        return directory
+
+    directory.mkdir(parents=True, exist_ok=True)
+    df = generate_fleet(num_serials, num_days, failure_rate=failure_rate, missing_day_rate=missing_day_rate, seed=seed)
+    df.write_parquet(path)
+    if csv:
+        write_daily_csv(df, csv_directory)
+    return directory
+
+
+def run_case(case: str, fleet_directory: str, loop_serials: int, repeat: int) -> Dict[str, Any]:
+    """Run one benchmark case in the current (fresh) process; returns its result record."""
+    module, setup = CASES[case]
+    # preprocess.py reports progress with print
+    with contextlib.redirect_stdout(io.StringIO()):
+        run, rows_in, serials_used = setup(Fleet(Path(fleet_directory), loop_serials))
+
+    wall, cpu, increase, peak = [], [], [], 0
+    for _ in range(repeat):
+        # Start from the memory held by the prepared inputs, so the increase is the case's own peak
+        gc.collect()
+        reset_peak_rss()
+        with contextlib.redirect_stdout(io.StringIO()), profile_stage(case, _logger) as stage:
+            run()
+        wall.append(stage.metrics.wall_seconds)
+        cpu.append(stage.metrics.cpu_seconds)
+        increase.append(stage.metrics.rss_increase_bytes)
+        peak = max(peak, stage.metrics.peak_rss_bytes)
+
+    return {
+        'case': case,
+        'module': module,
+        'rows_in': rows_in,
+        'serials_used': serials_used,
+        'wall_seconds': min(wall),
+        'rows_per_second': rows_in / max(min(wall), 1e-9),
+        'cpu_seconds': min(cpu),
+        'peak_rss_mb': peak / 1024 ** 2,
+        'memory_increase_mb': max(increase) / 1024 ** 2,
+    }
+
+
+def compare_results(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+                    min_seconds: float) -> List[Dict[str, Any]]:
+    """
+    Compare results with a baseline, matching entries on (case, num_serials, num_days, serials_used).
+    serials_used is part of the match, so loop cases run with another --loop-serials are not compared.
+
+    A case regresses if its wall time grows by more than `tolerance` (relative) and by at least
+    `min_seconds`, or its memory increase grows by more than `tolerance` and by at least 16 MB.
+
+    Returns:
+        One row per matched entry with the time and memory ratios and a regression flag
+    """
+    def key(entry):
+        return entry['case'], entry['num_serials'], entry['num_days'], entry['serials_used']
+
+    previous = {key(entry): entry for entry in baseline['results']}
+    rows = []
+    for entry in results['results']:
+        old = previous.get(key(entry))
+        if old is None or entry.get('error') or old.get('error'):
+            continue
+        time_ratio = entry['wall_seconds'] / max(old['wall_seconds'], 1e-9)
+        memory_ratio = (entry['memory_increase_mb'] + 1) / (old['memory_increase_mb'] + 1)
+        slower = time_ratio > 1 + tolerance and entry['wall_seconds'] - old['wall_seconds'] >= min_seconds
+        bigger = memory_ratio > 1 + tolerance and entry['memory_increase_mb'] - old['memory_increase_mb'] >= 16
+        rows.append({**entry, 'baseline_wall_seconds': old['wall_seconds'], 'time_ratio': time_ratio,
+                     'baseline_memory_increase_mb': old['memory_increase_mb'], 'memory_ratio': memory_ratio,
+                     'regression': slower or bigger})
+    return rows
+
+
+def _table(rows: List[Dict[str, Any]], compared: bool) -> str:
+    header = f"{'case':<30} {'serials':>8} {'rows in':>10} {'wall s':>9} {'rows/s':>12} {'cpu s':>9} {'+MB':>8}"
+    if compared:
+        header += f" {'x time':>7} {'x mem':>7}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        serials = row['serials_used'] if row['serials_used'] is not None else row['num_serials']
+        if row.get('error'):
+            lines.append(f"{row['case']:<30} {serials:>8}  FAILED: {row['error']}")
+            continue
+        line = (f"{row['case']:<30} {serials:>8} {row['rows_in']:>10} {row['wall_seconds']:>9.3f} "
+                f"{row['rows_in'] / max(row['wall_seconds'], 1e-9):>12,.0f} {row['cpu_seconds']:>9.3f} {row['memory_increase_mb']:>8.1f}")
+        if compared:
+            line += f" {row['time_ratio']:>7.2f} {row['memory_ratio']:>7.2f}" + ("  REGRESSION" if row['regression'] else "")
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Backblaze data functions on synthetic fleets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Fleet sizes (serials)")
+    parser.add_argument("--days", type=int, default=30, help="Days per fleet")
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--missing-day-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--loop-serials", type=int, default=200, help="Serials used by the per-serial loop cases")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported")
+    parser.add_argument("--work-dir", default="data/benchmarks", help="Directory of the generated fleets")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also store the results as {DEFAULT_BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown / memory growth")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    work_directory = Path(args.work_dir)
+    csv = 'load_all_csv_files_streaming' in args.cases
+    context = multiprocessing.get_context("spawn")
+
+    entries = []
+    for num_serials in args.sizes:
+        fleet_directory = prepare_fleet(work_directory, num_serials, args.days, args.failure_rate,
+                                        args.missing_day_rate, args.seed, csv)
+        for case in args.cases:
+            # One process per case, so the peak RSS of a case does not carry over to the next. Unlike
+            # multiprocessing.Pool, the executor raises instead of waiting forever if the process is killed
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    entry = executor.submit(run_case, case, str(fleet_directory), args.loop_serials, args.repeat).result()
+            except BrokenProcessPool:
+                entry = {'case': case, 'module': CASES[case][0], 'rows_in': None, 'serials_used': None,
+                         'error': "the case process died, e.g. killed for running out of memory"}
+            except Exception as error:
+                entry = {'case': case, 'module': CASES[case][0], 'rows_in': None, 'serials_used': None,
+                         'error': repr(error)}
+            entry.update({'num_serials': num_serials, 'num_days': args.days})
+            entries.append(entry)
+            if entry.get('error'):
+                print(f"{case:<30} {num_serials:>8} serials: FAILED, {entry['error']}", flush=True)
+            else:
+                print(f"{case:<30} {num_serials:>8} serials: {entry['wall_seconds']:.3f} s, "
+                      f"+{entry['memory_increase_mb']:.1f} MB", flush=True)
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'python': platform.python_version(),
+            'polars': pl.__version__,
+            'numpy': np.__version__,
+        },
+        'parameters': {key: value for key, value in vars(args).items()
+                       if key in ['days', 'failure_rate', 'missing_day_rate', 'seed', 'loop_serials', 'repeat']},
+        'results': entries,
+    }
+
+    output = Path(args.output) if args.output else (
+        BENCHMARK_DIRECTORY / "results" / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Stored baseline {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        rows = compare_results(results, baseline, args.tolerance, args.min_seconds)
+        print(_table(rows, compared=True))
+        regressions = [row for row in rows if row['regression']]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+            return 1
+    else:
+        print(_table(entries, compared=False))
+    failed = [entry for entry in entries if entry.get('error')]
+    if failed:
+        print(f"\n{len(failed)} case(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,6 @@ def preprocess_data(df: pl.DataFrame) -> pl.DataFrame:
     return df
 
 
-from phm_ml.config.config_loader import DataConfig
-DATA_CONFIG = DataConfig.from_yaml("data.yaml")
-print(DATA_CONFIG)
+if __name__ == "__main__":
+    from phm_ml.config.config_loader import load_config
+    print(load_config())
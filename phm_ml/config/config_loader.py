@@ -1,46 +1,405 @@
+import functools
 import os
-import yaml
-from dataclasses import dataclass
-from typing import List, Dict, Optional
+import typing
+from collections.abc import Mapping as AbcMapping
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, ClassVar, Dict, Mapping, Optional, Sequence, Tuple
 from pathlib import Path
 
+# yaml is imported when a configuration is loaded, not with the package: importing phm_ml (e.g. in
+# every worker of a process pool) does no configuration I/O
+
+DEFAULT_CONFIG = "config/data.yaml"
+# Configuration file overriding DEFAULT_CONFIG, and the prefix of section overrides such as
+# PHM_ML__TIME_SERIES__SEQUENCE_LENGTH=20
+CONFIG_ENV = "PHM_ML_CONFIG"
+OVERRIDE_ENV_PREFIX = "PHM_ML__"
+
+
 class Settings:
     PROJECT_ROOT: Path = Path(__file__).parent.parent.parent
 
 
-@dataclass
+class ConfigError(ValueError):
+    """Raised for configuration values that do not match the schema."""
+
+
+def _resolve(path: Optional[str]) -> Optional[str]:
+    # Relative paths in the configuration are relative to the project root
+    if path is None or Path(path).is_absolute():
+        return path
+    return f"{Settings.PROJECT_ROOT}/{path}"
+
+
+class FrozenDict(dict):
+    """Read-only dict holding the mappings of a configuration.
+
+    It is a dict, so json, yaml and dataclasses.asdict handle it as one, and it pickles by value.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is read-only; use dataclasses.replace to derive a modified config")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+    def __hash__(self):
+        return hash(frozenset(self.items()))
+
+
+def _freeze(value: Any) -> Any:
+    # Mappings become FrozenDicts and lists tuples, so the shared config instance cannot be changed in place
+    if isinstance(value, AbcMapping):
+        return FrozenDict({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, AbcMapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def _matches(value: Any, annotation: Any) -> bool:
+    origin = typing.get_origin(annotation)
+    if annotation is Any:
+        return True
+    if origin is typing.Union:
+        return any(_matches(value, arg) for arg in typing.get_args(annotation))
+    if origin in (tuple, Tuple):
+        # Tuple[X, ...]: YAML lists are accepted and frozen into tuples
+        item = (typing.get_args(annotation) or (Any,))[0]
+        return isinstance(value, (list, tuple)) and all(_matches(v, item) for v in value)
+    if origin in (AbcMapping, Mapping):
+        key, item = typing.get_args(annotation) or (Any, Any)
+        return isinstance(value, AbcMapping) and all(_matches(k, key) and _matches(v, item) for k, v in value.items())
+    if annotation is type(None):
+        return value is None
+    if annotation is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if annotation is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, annotation)
+
+
+class _Section:
+    """Type checks of the fields of a configuration section, run once when the section is created.
+
+    Lists and mappings are frozen into tuples and FrozenDicts afterwards.
+    """
+    SECTION: ClassVar[str] = ""
+
+    def __post_init__(self):
+        hints = typing.get_type_hints(type(self))
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if not _matches(value, hints[f.name]):
+                raise ConfigError(f"{self.SECTION}.{f.name}: expected {hints[f.name]}, got {value!r}")
+            object.__setattr__(self, f.name, _freeze(value))
+        self.validate()
+
+    def validate(self) -> None:
+        """Checks beyond the field types."""
+
+    def _check(self, condition: bool, message: str) -> None:
+        if not condition:
+            raise ConfigError(f"{self.SECTION}.{message}")
+
+    def _choice(self, name: str, choices: Sequence[str]) -> None:
+        self._check(getattr(self, name) in choices, f"{name}: expected one of {list(choices)}, got {getattr(self, name)!r}")
+
+    def _positive(self, *names: str) -> None:
+        for name in names:
+            self._check(getattr(self, name) > 0, f"{name}: expected a positive value, got {getattr(self, name)!r}")
+
+    def _non_negative(self, *names: str) -> None:
+        for name in names:
+            self._check(getattr(self, name) >= 0, f"{name}: expected a non-negative value, got {getattr(self, name)!r}")
+
+    @classmethod
+    def from_dict(cls, values: Optional[Dict[str, Any]]) -> Any:
+        values = values or {}
+        unknown = sorted(set(values) - {f.name for f in fields(cls)})
+        if unknown:
+            raise ConfigError(f"{cls.SECTION}: unknown keys {unknown}")
+        return cls(**values)
+
+
+@dataclass(frozen=True)
+class TimeSeriesConfig(_Section):
+    """Sequence and label parameters."""
+    SECTION: ClassVar[str] = "time_series"
+    sequence_length: int = 10
+    lookahead: int = 1
+    num_normal_serials: int = 100
+    max_normal_seq: Optional[int] = 4_000
+    rul_horizons: Tuple[int, ...] = (7, 30)
+    label_column: str = "failure"
+
+    def validate(self) -> None:
+        self._positive('sequence_length', 'num_normal_serials')
+        self._non_negative('lookahead')
+        if self.max_normal_seq is not None:
+            self._positive('max_normal_seq')
+        self._check(all(horizon > 0 for horizon in self.rul_horizons), f"rul_horizons: expected positive days, got {self.rul_horizons}")
+        labels = ["failure"] + [f"fails_within_{horizon}d" for horizon in self.rul_horizons]
+        self._choice('label_column', labels)
+
+
+@dataclass(frozen=True)
+class SamplingConfig(_Section):
+    """Drive sampling of the training data."""
+    SECTION: ClassVar[str] = "sampling"
+    method: str = "stratified"
+    seed: int = 0
+    index_file: str = "data/features/sample_index.parquet"
+    reuse_index: bool = True
+
+    def validate(self) -> None:
+        self._choice('method', ["top", "random", "stratified"])
+
+
+@dataclass(frozen=True)
+class ExecutionConfig(_Section):
+    """Polars engine, memory budget, spilling and process pool settings."""
+    SECTION: ClassVar[str] = "execution"
+    engine: str = "streaming"
+    memory_budget_gb: float = 48
+    spill_directory: str = "data/spill"
+    compact_dtypes: bool = False
+    float32: bool = False
+    workers: int = 4
+    num_shards: int = 4
+
+    def validate(self) -> None:
+        self._choice('engine', ["auto", "in-memory", "streaming"])
+        self._positive('memory_budget_gb', 'workers', 'num_shards')
+
+
+@dataclass(frozen=True)
+class FeaturePruningConfig(_Section):
+    """SMART column pruning thresholds."""
+    SECTION: ClassVar[str] = "feature_pruning"
+    enabled: bool = True
+    max_null_fraction: float = 0.99
+    min_variance: float = 0.0
+    min_distinct: int = 2
+    selection_file: str = "data/features/smart_columns.json"
+
+    def validate(self) -> None:
+        self._check(0 <= self.max_null_fraction <= 1, f"max_null_fraction: expected a fraction, got {self.max_null_fraction}")
+
+
+@dataclass(frozen=True)
+class ScalingConfig(_Section):
+    """Feature scaling settings."""
+    SECTION: ClassVar[str] = "scaling"
+    method: str = "standard"
+    relative_accuracy: float = 0.01
+    scaler_file: str = "data/features/scaler.json"
+
+    def validate(self) -> None:
+        self._choice('method', ["standard", "minmax", "robust"])
+        self._positive('relative_accuracy')
+
+
+@dataclass(frozen=True)
+class ValidationConfig(_Section):
+    """Data-quality checks of the raw telemetry."""
+    SECTION: ClassVar[str] = "validation"
+    enabled: bool = True
+    action: str = "report"
+    report_directory: str = "data/validation"
+    counter_columns: Optional[Tuple[str, ...]] = None
+
+    def validate(self) -> None:
+        self._choice('action', ["report", "dedupe", "quarantine"])
+
+
+@dataclass(frozen=True)
+class CacheConfig(_Section):
+    """Stage output cache settings."""
+    SECTION: ClassVar[str] = "cache"
+    directory: str = "data/cache"
+    max_size_gb: float = 20
+
+    def validate(self) -> None:
+        self._positive('max_size_gb')
+
+
+@dataclass(frozen=True)
+class PipelineConfig(_Section):
+    """Stages of the pipeline runner."""
+    SECTION: ClassVar[str] = "pipeline"
+    targets: Optional[Tuple[str, ...]] = None
+    max_workers: int = 4
+    state_file: Optional[str] = None
+    stages: Mapping[str, Mapping[str, Any]] = field(default_factory=FrozenDict)
+
+    def validate(self) -> None:
+        self._positive('max_workers')
+        unknown = [target for target in self.targets or [] if target not in self.stages]
+        self._check(not unknown, f"targets: unknown stages {unknown}")
+
+
+# Section -> fields holding a path relative to the project root
+_PATH_FIELDS = {
+    'sampling': ['index_file'],
+    'execution': ['spill_directory'],
+    'feature_pruning': ['selection_file'],
+    'scaling': ['scaler_file'],
+    'validation': ['report_directory'],
+    'cache': ['directory'],
+    'pipeline': ['state_file'],
+}
+
+
+@dataclass(frozen=True)
 class DataConfig:
     """Configuration class for data loading and processing parameters.
 
+    Instances are created (and validated) by load_config or DataConfig.from_yaml; nothing is read on
+    import. Instances are immutable down to their lists (tuples) and mappings (FrozenDict), since
+    load_config shares one instance; they are picklable, so they are cheap to pass to pool workers,
+    and dataclasses.replace derives a modified copy.
+
     Attributes:
-        path (Dict[str, str]): Dictionary containing data directory paths.
-            Contains base_dir, raw, interim, and feature paths.
-        name (Dict[str, str]): Dictionary containing dataset names.
-            Currently includes bgsf2 dataset name.
-        loading (Dict[str, str]): Dictionary containing data loading parameters.
-            Includes file_extension and encoding settings.
+        path (Mapping[str, str]): Named data paths (base_directory, train_data, test_data, sequence_store, log_file).
+        time_series (TimeSeriesConfig): Sequence and label parameters (sequence_length, lookahead, ...).
+        sampling (SamplingConfig): Drive sampling settings (method, seed, index_file, reuse_index).
+        execution (ExecutionConfig): Execution settings (engine, memory_budget_gb, spill_directory,
+            compact_dtypes, float32, workers, num_shards).
+        feature_pruning (FeaturePruningConfig): SMART column pruning thresholds and selection_file.
+        features (Tuple[Mapping[str, Any], ...]): Derived feature specifications.
+        scaling (ScalingConfig): Feature scaling settings (method, relative_accuracy, scaler_file).
+        validation (ValidationConfig): Data-quality checks (enabled, action, report_directory, counter_columns).
+        cache (CacheConfig): Stage output cache settings (directory, max_size_gb).
+        pipeline (PipelineConfig): Stages of the pipeline runner (targets, max_workers, state_file, stages).
     """
-    path: Dict[str, str]
-    # name: Dict[str, str] 
-    # loading: Dict[str, str]
+    path: Mapping[str, str]
+    time_series: TimeSeriesConfig = field(default_factory=TimeSeriesConfig)
+    sampling: SamplingConfig = field(default_factory=SamplingConfig)
+    execution: ExecutionConfig = field(default_factory=ExecutionConfig)
+    feature_pruning: FeaturePruningConfig = field(default_factory=FeaturePruningConfig)
+    features: Tuple[Mapping[str, Any], ...] = ()
+    scaling: ScalingConfig = field(default_factory=ScalingConfig)
+    validation: ValidationConfig = field(default_factory=ValidationConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    pipeline: PipelineConfig = field(default_factory=PipelineConfig)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'path', _freeze(self.path))
+        object.__setattr__(self, 'features', _freeze(self.features))
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> 'DataConfig':
+        """Validate a configuration dictionary and resolve its paths against the project root.
+
+        Args:
+            config (Dict[str, Any]): Sections as read from the YAML file. Missing sections and keys
+                take the defaults of the section classes.
+
+        Returns:
+            DataConfig: Validated configuration.
+
+        Raises:
+            ConfigError: For unknown sections or keys and values that do not match the schema.
+        """
+        unknown = sorted(set(config) - {f.name for f in fields(cls)})
+        if unknown:
+            raise ConfigError(f"Unknown configuration sections {unknown}")
+        path = config.get('path') or {}
+        if not _matches(path, Mapping[str, str]):
+            raise ConfigError(f"path: expected a mapping of names to paths, got {path!r}")
+        features = config.get('features') or []
+        if not _matches(features, Tuple[Mapping[str, Any], ...]):
+            raise ConfigError(f"features: expected a list of feature specifications, got {features!r}")
+
+        sections = {}
+        for f in fields(cls):
+            if f.name in ('path', 'features'):
+                continue
+            section_type = typing.get_type_hints(cls)[f.name]
+            values = dict(config.get(f.name) or {})
+            for name in _PATH_FIELDS.get(f.name, []):
+                default = next(sf.default for sf in fields(section_type) if sf.name == name)
+                values[name] = _resolve(values.get(name, default))
+            sections[f.name] = section_type.from_dict(values)
+        return cls(path={name: _resolve(value) for name, value in path.items()}, features=features, **sections)
 
     @classmethod
-    def from_yaml(cls, config_path: str = "config/data.yaml") -> 'DataConfig':
+    def from_yaml(
+        cls,
+        config_path: str = DEFAULT_CONFIG,
+        overrides: Sequence[str] = (),
+        environ: Optional[Dict[str, str]] = None
+    ) -> 'DataConfig':
         """Load configuration from a YAML file.
 
         Args:
-            config_path (str): Path to the YAML configuration file.
-                Defaults to "data_config.yaml".
+            config_path (str): Path to the YAML configuration file, relative to the project root.
+                Defaults to "config/data.yaml".
+            overrides (Sequence[str]): Overrides such as "time_series.sequence_length=20", applied
+                after the environment overrides. Values are parsed as YAML.
+            environ (Optional[Dict[str, str]]): Environment read for PHM_ML__<SECTION>__<KEY>
+                overrides. Defaults to os.environ.
 
         Returns:
-            DataConfig: Configuration object with data parameters.
+            DataConfig: Validated configuration object with data parameters.
         """
-        with open(f"{Settings.PROJECT_ROOT}/{config_path}", 'r') as f:
-            config = yaml.safe_load(f)
-        for attr in cls.__annotations__:
-            setattr(cls, attr, config[attr])
-        cls.path = {k: f"{Settings.PROJECT_ROOT}/{v}" for k, v in cls.path.items()}
-        return cls
+        import yaml
 
+        with open(_resolve(config_path), 'r') as f:
+            config = yaml.safe_load(f) or {}
+        environ = os.environ if environ is None else environ
+        env_overrides = [
+            f"{name[len(OVERRIDE_ENV_PREFIX):].lower().replace('__', '.')}={value}"
+            for name, value in sorted(environ.items()) if name.startswith(OVERRIDE_ENV_PREFIX)
+        ]
+        for override in env_overrides + list(overrides):
+            _apply_override(config, override, yaml.safe_load)
+        return cls.from_dict(config)
 
-DataConfig.from_yaml()
+    def to_dict(self) -> Dict[str, Any]:
+        """The configuration as plain (mutable) dictionaries and lists, e.g. for logging or cache keys."""
+        return _thaw(asdict(self))
+
+
+def _apply_override(config: Dict[str, Any], override: str, parse) -> None:
+    key, separator, value = override.partition("=")
+    if not separator or not key.strip():
+        raise ConfigError(f"Invalid override '{override}', expected <section>.<key>=<value>")
+    *parents, name = key.strip().split(".")
+    target = config
+    for parent in parents:
+        target = target.setdefault(parent, {})
+        if not isinstance(target, dict):
+            raise ConfigError(f"Invalid override '{override}': '{parent}' is not a section")
+    target[name] = parse(value)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config(config_path: str, overrides: Tuple[str, ...], environment: Tuple[Tuple[str, str], ...]) -> DataConfig:
+    return DataConfig.from_yaml(config_path, overrides, dict(environment))
+
+
+def load_config(config_path: Optional[str] = None, overrides: Sequence[str] = ()) -> DataConfig:
+    """Load and validate the configuration once per process; later calls return the same instance.
+
+    Args:
+        config_path (Optional[str]): Configuration file. Defaults to $PHM_ML_CONFIG or "config/data.yaml".
+        overrides (Sequence[str]): Overrides such as "time_series.sequence_length=20", e.g. from a
+            --set command-line option.
+
+    Returns:
+        DataConfig: Validated configuration object with data parameters.
+    """
+    config_path = config_path or os.environ.get(CONFIG_ENV, DEFAULT_CONFIG)
+    environment = tuple(sorted((k, v) for k, v in os.environ.items() if k.startswith(OVERRIDE_ENV_PREFIX)))
+    return _load_config(config_path, tuple(overrides or ()), environment)
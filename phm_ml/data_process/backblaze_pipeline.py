@@ -0,0 +1,251 @@
+import json
+import polars as pl
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from phm_ml.data_process.data_backblaze_harddrive import (
+    data_clean, compact_casts, compact_schema, summarize_serials, get_disk_serials, fix_date_gaps, _fill_date_gaps_vectorized
+)
+from phm_ml.data_process.features import parse_feature_specs, add_features, compile_features, _feature_expr
+from phm_ml.data_process.feature_selection import (
+    profile_smart_columns, select_smart_columns, save_column_selection, prune_smart_columns
+)
+from phm_ml.data_process.labels import add_rul_labels
+from phm_ml.data_process.sampling import (
+    apply_sample_index, load_sample_index, sample_index_provenance, save_sample_index
+)
+from phm_ml.data_process.scaling import Scaler, fit_scaler
+from phm_ml.data_process.sequence_store import SequenceStore, write_sequence_store
+from phm_ml.data_process.sequences import SequenceSet, build_sequences
+from phm_ml.data_process.streaming import plan_num_shards, run_sharded
+from phm_ml.data_process.validation import (
+    SUMMARY_FILE, apply_validation, deduplicate_rows, drop_post_failure_rows, quarantine_serials, validate_telemetry
+)
+from phm_ml.utils.cache import fingerprint_file
+from phm_ml.utils.memory import log_peak_rss
+from phm_ml.utils.pipeline import StageContext, StageFunction, stage_function
+
+# Stage functions of the Backblaze pipeline; config/data.yaml (`pipeline.stages`) wires them into a DAG
+BACKBLAZE_STAGES: Dict[str, StageFunction] = {}
+
+
+@stage_function(BACKBLAZE_STAGES, files=lambda config, params: [config.path[params['path']]])
+def scan(context: StageContext, path: str = "train_data") -> pl.LazyFrame:
+    """Lazy scan of the parquet file configured under `path.<path>`."""
+    return pl.scan_parquet(context.config.path[path])
+
+
+@stage_function(BACKBLAZE_STAGES,
+                code=[validate_telemetry, apply_validation, deduplicate_rows, drop_post_failure_rows, quarantine_serials],
+                key_params=lambda config, params: {'validation': asdict(config.validation)})
+def validate(context: StageContext, df: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Data-quality checks in one grouped pass, with the `validation.action` applied to the data.
+
+    The report is written to `validation.report_directory/<stage>`; quarantined rows go next to it.
+    With action "report" the data passes through unchanged, so the (sorting) pass only runs when the
+    saved report was made for another stage key, i.e. other input data, settings or code.
+    """
+    validation = context.config.validation
+    if not validation.enabled:
+        return df
+    directory = Path(validation.report_directory) / context.stage
+    if validation.action == "report" and _report_key(directory) == context.key:
+        context.logger.info(f"Validation report in {directory} is up to date")
+        return df
+    report = validate_telemetry(df, counter_columns=validation.counter_columns, engine=context.engine,
+                                logger=context.logger)
+    report.summary['stage_key'] = context.key
+    report.save(directory)
+    return apply_validation(df, report, action=validation.action,
+                            quarantine_file=directory / "quarantined.parquet", logger=context.logger)
+
+
+def _report_key(directory: Path) -> Optional[str]:
+    # Stage key the report saved in `directory` was made for, if any
+    if not (directory / SUMMARY_FILE).exists():
+        return None
+    with open(directory / SUMMARY_FILE, 'r') as f:
+        return json.load(f).get('stage_key')
+
+
+@stage_function(BACKBLAZE_STAGES, code=[summarize_serials])
+def serial_summary(context: StageContext, df: pl.LazyFrame) -> pl.DataFrame:
+    """One grouped pass over the data; serial selection and labelling reuse the summary."""
+    return summarize_serials(df, context.logger, engine=context.engine)
+
+
+@stage_function(BACKBLAZE_STAGES, code=[get_disk_serials],
+                key_params=lambda config, params: {'num_normal_serials': config.time_series.num_normal_serials,
+                                                   'method': config.sampling.method,
+                                                   'seed': config.sampling.seed})
+def sample_index(context: StageContext, df: pl.LazyFrame, summary: pl.DataFrame) -> pl.DataFrame:
+    """
+    Drive-level sample of the training data.
+
+    The index is saved to `sampling.index_file` together with the sampling parameters and a fingerprint
+    of the training data. Later runs (with `reuse_index`) reuse it while both match, so the drives stay
+    the same even when the sampling code changes; otherwise the drives are sampled again.
+    """
+    sampling = context.config.sampling
+    provenance = {
+        'num_normal_serials': context.config.time_series.num_normal_serials,
+        'method': sampling.method,
+        'seed': sampling.seed,
+        'source': fingerprint_file(context.config.path['train_data']),
+    }
+    # Round-tripped through JSON, so it compares equal to the provenance read back from the index file
+    provenance = json.loads(json.dumps(provenance, sort_keys=True, default=str))
+    if sampling.reuse_index and Path(sampling.index_file).exists():
+        if sample_index_provenance(sampling.index_file) == provenance:
+            index = load_sample_index(sampling.index_file)
+            context.logger.info(f"Reusing {index.height} sampled drives from {sampling.index_file}")
+            return index
+        context.logger.info(f"Sample index {sampling.index_file} was drawn with other sampling parameters "
+                            f"or source data; sampling the drives again")
+
+    normal_serials, failed_serials, _, _ = get_disk_serials(
+        df, num_normal_serials=context.config.time_series.num_normal_serials, logger=context.logger,
+        summary=summary, sampling=sampling.method, seed=sampling.seed
+    )
+    serials = pl.concat([normal_serials, failed_serials]).to_frame()
+    index = summary.join(serials, on='serial_number', how='semi')
+    save_sample_index(index, sampling.index_file, provenance)
+    log_peak_rss(context.logger, "serial selection", context.config.execution.memory_budget_gb)
+    return index
+
+
+@stage_function(BACKBLAZE_STAGES, code=[apply_sample_index])
+def select_drives(context: StageContext, df: pl.LazyFrame, index: pl.DataFrame) -> pl.LazyFrame:
+    """Rows of the sampled drives, as a lazy semi-join."""
+    return apply_sample_index(df, index)
+
+
+@stage_function(BACKBLAZE_STAGES, code=[profile_smart_columns],
+                key_params=lambda config, params: {'enabled': config.feature_pruning.enabled})
+def smart_profile(context: StageContext, df: pl.LazyFrame) -> pl.DataFrame:
+    """Null fraction, variance and distinct count of every SMART column in one pass (empty if pruning is off)."""
+    if not context.config.feature_pruning.enabled:
+        return profile_smart_columns(df.head(0))
+    return profile_smart_columns(df, engine=context.engine)
+
+
+@stage_function(BACKBLAZE_STAGES, code=[select_smart_columns, save_column_selection],
+                key_params=lambda config, params: {'feature_pruning': asdict(config.feature_pruning)})
+def smart_columns(context: StageContext, profile: pl.DataFrame) -> Optional[List[str]]:
+    """
+    SMART columns kept by the pruning thresholds, saved so the test data gets the same projection.
+
+    Returns None (keep every column) if pruning is disabled.
+    """
+    pruning = context.config.feature_pruning
+    if not pruning.enabled:
+        return None
+    columns = select_smart_columns(
+        profile,
+        max_null_fraction=pruning.max_null_fraction,
+        min_variance=pruning.min_variance,
+        min_distinct=pruning.min_distinct,
+        logger=context.logger
+    )
+    save_column_selection(columns, pruning.selection_file)
+    return columns
+
+
+@stage_function(BACKBLAZE_STAGES,
+                code=[data_clean, compact_casts, compact_schema, fix_date_gaps, _fill_date_gaps_vectorized, run_sharded,
+                      add_features, compile_features, _feature_expr, add_rul_labels, prune_smart_columns],
+                key_params=lambda config, params: {'compact_dtypes': config.execution.compact_dtypes,
+                                                   'float32': config.execution.float32,
+                                                   'features': config.features,
+                                                   'rul_horizons': config.time_series.rul_horizons})
+def gap_filled(
+    context: StageContext,
+    df: pl.LazyFrame,
+    smart_columns: Optional[List[str]] = None,
+    summary: Optional[pl.DataFrame] = None
+) -> pl.LazyFrame:
+    """
+    Cleaned, gap-filled data with derived features and RUL labels.
+
+    Cleaning and gap filling are per serial, so they run shard by shard within the memory budget; the
+    result is a scan of the spilled shards. When the stage is cached, the shards are spilled to its
+    output directory and become the cache entry, so the data is written once. Without a summary the
+    labels are computed from the data.
+    With compact_dtypes the dtypes are profiled once over the whole input, so all shards share one schema.
+    """
+    execution = context.config.execution
+    if smart_columns is not None:
+        df = prune_smart_columns(df, smart_columns)
+    casts = compact_casts(df, float32=execution.float32) if execution.compact_dtypes else None
+    feature_specs = parse_feature_specs(context.config.features)
+    return run_sharded(
+        df,
+        lambda shard_df: add_rul_labels(
+            add_features(
+                fix_date_gaps(
+                    data_clean(shard_df, context.logger, compact=execution.compact_dtypes, float32=execution.float32,
+                               casts=casts),
+                    logger=context.logger
+                ),
+                feature_specs,
+                context.logger
+            ),
+            horizons=context.config.time_series.rul_horizons,
+            summary=summary
+        ),
+        spill_directory=context.output_directory or execution.spill_directory,
+        num_shards=plan_num_shards(df, execution.memory_budget_gb),
+        stage_name=context.stage,
+        engine=context.engine,
+        memory_budget_gb=execution.memory_budget_gb,
+        logger=context.logger
+    )
+
+
+@stage_function(BACKBLAZE_STAGES, code=[build_sequences],
+                key_params=lambda config, params: {key: getattr(config.time_series, key) for key in
+                                                   ['sequence_length', 'lookahead', 'max_normal_seq', 'label_column']})
+def sequences(context: StageContext, df: pl.LazyFrame) -> SequenceSet:
+    """Fixed-length sequences with the `time_series` parameters, read from the scan of the cached gap_filled output."""
+    time_series = context.config.time_series
+    result = build_sequences(
+        df,
+        sequence_length=time_series.sequence_length,
+        lookahead=time_series.lookahead,
+        max_normal_seq=time_series.max_normal_seq,
+        label_column=time_series.label_column,
+        logger=context.logger
+    )
+    context.logger.info(f"Sequences: {result.X.shape}, {result.X.nbytes / 1024 ** 2:.1f} MB")
+    log_peak_rss(context.logger, "sequence building", context.config.execution.memory_budget_gb)
+    return result
+
+
+@stage_function(BACKBLAZE_STAGES, code=[write_sequence_store],
+                key_params=lambda config, params: {'directory': config.path['sequence_store']})
+def sequence_store(context: StageContext, sequences: SequenceSet) -> SequenceStore:
+    """Memory-mapped store read by training loops through store.batches(...)."""
+    store = write_sequence_store(sequences, context.config.path['sequence_store'])
+    context.logger.info(f"Wrote {len(store)} sequences to {store.directory}")
+    return store
+
+
+@stage_function(BACKBLAZE_STAGES, code=[fit_scaler],
+                key_params=lambda config, params: {'scaling': asdict(config.scaling)})
+def scaler(context: StageContext, df: pl.LazyFrame) -> Scaler:
+    """
+    Scaling statistics of the SMART columns (the sequence features) in one pass, saved to `scaling.scaler_file`.
+
+    The sequence store stays unscaled; the saved scaler is applied to batches and to the test data.
+    """
+    result = fit_scaler(
+        df,
+        method=context.config.scaling.method,
+        relative_accuracy=context.config.scaling.relative_accuracy,
+        engine=context.engine,
+        logger=context.logger
+    )
+    result.save(context.config.scaling.scaler_file)
+    return result
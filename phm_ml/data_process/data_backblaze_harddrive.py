@@ -1,14 +1,30 @@
 # This script is based on "https://github.com/HROlive/Applications-of-AI-for-Predictive-Maintenance/blob/main/Lab2-LSTM-For-Timeseries.ipynb"
 import logging
 import polars as pl
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-def data_clean(df: pl.LazyFrame, logger: logging.Logger) -> pl.LazyFrame:
+from phm_ml.data_process.sampling import stratified_sample_drives
+from phm_ml.utils.memory import estimate_row_bytes
+from phm_ml.utils.profiling import instrument_stage
+
+def data_clean(
+    df: pl.LazyFrame,
+    logger: logging.Logger,
+    compact: bool = False,
+    float32: bool = False,
+    casts: Optional[Dict[str, Any]] = None
+) -> pl.LazyFrame:
     """
     Clean the input dataframe by removing unnecessary columns and preprocessing SMART sensor data.
     
     Args:
         df: Input LazyFrame containing hard drive data
+        logger: Logger instance for logging
+        compact: If True, downcast SMART columns to the smallest lossless dtype, encode serial
+            numbers as categoricals and store dates as pl.Date (see compact_schema)
+        float32: With compact, store non-integer SMART columns as float32 instead of float64
+        casts: With compact, the dtypes of compact_casts computed over the whole input. Pass them when
+            cleaning the data shard by shard, so every shard gets the same schema
         
     Returns:
         Cleaned LazyFrame
@@ -34,10 +50,11 @@ def data_clean(df: pl.LazyFrame, logger: logging.Logger) -> pl.LazyFrame:
     else:
         logger.info("No columns to drop")
 
-    logger.info("Converting smart sensor columns to float64")
-    # Convert all smart sensor columns to float64 only if they exist
+    # Convert all smart sensor columns to float64 only if they exist; with compact, compact_schema
+    # then casts them to their final dtypes and logs those
     if smart_columns:
-        logger.info(f"Converting {len(smart_columns)} SMART columns to float64")
+        if not compact:
+            logger.info(f"Converting {len(smart_columns)} SMART columns to float64")
         df = df.with_columns(pl.col(smart_columns).cast(pl.Float64))
     else:
         logger.warning("No SMART columns found")
@@ -46,40 +63,198 @@ def data_clean(df: pl.LazyFrame, logger: logging.Logger) -> pl.LazyFrame:
     # Sort by timestamp and serial_number(SN) and fill nulls
     df = df.sort(["date", "serial_number"]).fill_null(0)
 
+    if compact:
+        df = compact_schema(df, smart_columns, float32=float32, logger=logger, casts=casts)
+
     return df
 
 
-def get_disk_serials(df: pl.LazyFrame, num_normal_serials: int = 100, logger: logging.Logger = None) -> Tuple[pl.Series, pl.Series]:
+_INTEGER_DTYPES = [(pl.Int8, 2 ** 7), (pl.Int16, 2 ** 15), (pl.Int32, 2 ** 31), (pl.Int64, 2 ** 63)]
+
+
+def compact_casts(df: pl.LazyFrame, smart_columns: Optional[List[str]] = None, float32: bool = False) -> Dict[str, Any]:
+    """
+    Profile the compact dtypes of hard drive data in one aggregation.
+
+    Integer-valued SMART columns get the smallest signed integer type that holds their range, other
+    SMART columns float32 if requested and float64 otherwise. Nulls count as 0, as data_clean fills
+    them. serial_number and model become categoricals, failure becomes int8 and date becomes pl.Date.
+
+    The dtypes depend on the value ranges of the data, so data processed in shards or partitions has
+    to be profiled once as a whole; per-shard profiles disagree and the shards cannot be scanned together.
+
+    Args:
+        df: Input LazyFrame containing hard drive data, raw or cleaned
+        smart_columns: SMART columns to downcast. Defaults to the smart_*_raw columns of df
+        float32: Store non-integer SMART columns as float32 (lossy) instead of float64
+
+    Returns:
+        Dictionary of column name to dtype, to pass to compact_schema / data_clean
+    """
+    schema = df.collect_schema()
+    if smart_columns is None:
+        smart_columns = [col for col in schema.names() if col.startswith("smart_") and not col.endswith("normalized")]
+
+    values = {col: pl.col(col).cast(pl.Float64).fill_null(0) for col in smart_columns}
+    profile = df.select(
+        [pl.len().alias('__rows')]
+        + [values[col].min().alias(f"{col}__min") for col in smart_columns]
+        + [values[col].max().alias(f"{col}__max") for col in smart_columns]
+        + [(values[col] == values[col].round()).all().alias(f"{col}__int") for col in smart_columns]
+    ).collect().row(0, named=True)
+
+    casts = {}
+    for col in smart_columns:
+        low, high, integral = profile[f"{col}__min"], profile[f"{col}__max"], profile[f"{col}__int"]
+        if low is None:
+            casts[col] = pl.Int8
+        elif integral:
+            casts[col] = next((dtype for dtype, bound in _INTEGER_DTYPES if -bound <= low and high < bound), pl.Float64)
+        else:
+            casts[col] = pl.Float32 if float32 else pl.Float64
+    for col in ['serial_number', 'model']:
+        if col in schema:
+            casts[col] = pl.Categorical
+    if 'failure' in schema:
+        casts['failure'] = pl.Int8
+    if 'date' in schema and schema['date'] != pl.Date:
+        casts['date'] = pl.Date
+    return casts
+
+
+def compact_schema(
+    df: pl.LazyFrame,
+    smart_columns: List[str],
+    float32: bool = False,
+    logger: logging.Logger = None,
+    casts: Optional[Dict[str, Any]] = None
+) -> pl.LazyFrame:
+    """
+    Shrink the dtypes of hard drive data without losing information.
+    
+    The dtypes come from compact_casts: the value range and integrality of every SMART column are
+    profiled in one aggregation, unless `casts` is given.
+    
+    Args:
+        df: Input LazyFrame containing hard drive data
+        smart_columns: SMART columns to downcast
+        float32: Store non-integer SMART columns as float32 (lossy) instead of float64
+        logger: Optional logger instance for logging
+        casts: Dtypes of compact_casts profiled over the whole input; columns missing from df are ignored
+        
+    Returns:
+        LazyFrame with compact dtypes
+    """
+    schema = df.collect_schema()
+    if casts is None:
+        casts = compact_casts(df, smart_columns, float32=float32)
+
+    exprs = []
+    for col, dtype in casts.items():
+        if col not in schema:
+            continue
+        if col == 'date' and schema['date'] == pl.String:
+            exprs.append(pl.col(col).str.to_date())
+        else:
+            exprs.append(pl.col(col).cast(dtype))
+    df = df.with_columns(exprs)
+
+    if logger:
+        before = estimate_row_bytes(schema)
+        after = estimate_row_bytes(df.collect_schema())
+        smart_dtypes = {}
+        for col, dtype in casts.items():
+            if col in schema and col.startswith("smart_"):
+                smart_dtypes[str(dtype)] = smart_dtypes.get(str(dtype), 0) + 1
+        logger.info(f"Compact schema: {before} -> {after} bytes per row, SMART columns by dtype: {smart_dtypes}")
+
+    return df
+
+
+@instrument_stage()
+def summarize_serials(df: pl.LazyFrame, logger: logging.Logger = None, engine: str = "auto") -> pl.DataFrame:
+    """
+    Summarize every disk in a single grouped pass over the data.
+    
+    Args:
+        df: Input LazyFrame containing hard drive data
+        logger: Optional logger instance for logging
+        engine: Polars engine used to run the aggregation (default: "auto")
+        
+    Returns:
+        DataFrame with one row per serial_number and the columns count, first_date, last_date,
+        failed, failure_date (null for disks that never failed) and, if df has one, model
+    """
+    model = [pl.col('model').first()] if 'model' in df.collect_schema().names() else []
+    summary = (df
+               .group_by('serial_number')
+               .agg([
+                   pl.len().alias('count'),
+                   pl.col('date').min().alias('first_date'),
+                   pl.col('date').max().alias('last_date'),
+                   (pl.col('failure') == 1).any().alias('failed'),
+                   pl.col('date').filter(pl.col('failure') == 1).min().alias('failure_date'),
+               ] + model)
+               .sort('serial_number')
+               .collect(engine=engine))
+    
+    if logger:
+        logger.info(f"Summarized {summary.height} disks")
+    return summary
+
+
+@instrument_stage()
+def get_disk_serials(
+    df: pl.LazyFrame,
+    num_normal_serials: int = 100,
+    logger: logging.Logger = None,
+    summary: pl.DataFrame = None,
+    sampling: str = "top",
+    seed: int = 0
+) -> Tuple[pl.Series, pl.Series, pl.LazyFrame, pl.LazyFrame]:
     """
     Extract serial numbers of failed and normal disks.
     
     Args:
         df: Input LazyFrame containing hard drive data
         num_normal_serials: Number of normal disks to select (default: 100)
+        logger: Optional logger instance for logging
+        summary: Optional output of summarize_serials for df. Computed (one pass over df) if None
+        sampling: How to pick normal disks: "top" keeps the disks with the most rows,
+            "random" draws a seeded random sample and "stratified" a seeded hash-based sample
+            stratified by model and month of the first observation (default: "top")
+        seed: Seed for random and stratified sampling
         
     Returns:
-        Tuple of (failed_serials, normal_serials) as Polars Series
+        Tuple of (normal_serials, failed_serials, normal_df, failed_df), where normal_df and
+        failed_df are df restricted to all rows of the selected normal and failed disks
     """
-    # Get the disk serials of the failed disks
-    failed_df = df.filter(pl.col("failure") == 1)
-    failed_serials = failed_df.select("serial_number").unique().collect().to_series()
+    if summary is None:
+        summary = summarize_serials(df, logger)
+
+    failed_serials = summary.filter(pl.col('failed')).get_column('serial_number')
     
     if logger:
         logger.info(f"Number of failed disks: {failed_serials.len()}")
 
-    # Get normal disk serials (excluding failed ones)
-    normal_df = df.filter(~pl.col('serial_number').is_in(failed_serials))
-    normal_serials = (normal_df
-                     .group_by('serial_number')
-                     .agg(pl.count().alias('count'))
-                     .sort('count', descending=True)
-                     .head(num_normal_serials)
-                     .select('serial_number')
-                     .collect()
-                     .to_series())
+    # Get normal disk serials (excluding failed ones) from the summary table
+    normal_summary = summary.filter(~pl.col('failed'))
+    if sampling == "top":
+        normal_summary = normal_summary.sort(['count', 'serial_number'], descending=[True, False]).head(num_normal_serials)
+    elif sampling == "random":
+        normal_summary = normal_summary.sample(n=min(num_normal_serials, normal_summary.height), seed=seed)
+    elif sampling == "stratified":
+        strata = ["failed", "model", "date_bucket"] if 'model' in normal_summary.columns else ["failed", "date_bucket"]
+        normal_summary = stratified_sample_drives(normal_summary, sizes={False: num_normal_serials}, strata=strata, seed=seed)
+    else:
+        raise ValueError(f"Unknown sampling method: {sampling}")
+    normal_serials = normal_summary.get_column('serial_number')
     
     if logger:
         logger.info(f"Number of normal disks: {normal_serials.len()}")
+
+    normal_df = df.filter(pl.col('serial_number').is_in(normal_serials.implode()))
+    failed_df = df.filter(pl.col('serial_number').is_in(failed_serials.implode()))
     return normal_serials, failed_serials, normal_df, failed_df
 
 
@@ -97,17 +272,21 @@ def adjust_dates(df: pl.LazyFrame, logger: logging.Logger = None) -> pl.LazyFram
     if logger:
         logger.info("Adjusting dates to fill missing dates")
     
-    # Get basic info (need to collect minimal data for logic)
-    cur_serial = df.select(pl.col('serial_number')).unique().collect().to_series().to_list()[0]
     col_list = df.collect_schema().names()  # Fix performance warning by using collect_schema()
     
-    # Get date range info
+    # Get the serial and date range info in one pass
     date_stats = df.select([
+        pl.col('serial_number').n_unique().alias('num_serials'),
+        pl.col('serial_number').first().alias('serial_number'),
         pl.col('date').min().alias('first_date'),
         pl.col('date').max().alias('last_date'),
         pl.col('date').count().alias('record_count')
     ]).collect()
+    # Filling gaps of several serials at once would mix their rows (see phm_ml.data_process.validation)
+    if date_stats['num_serials'][0] > 1:
+        raise ValueError(f"adjust_dates expects the rows of one serial, got {date_stats['num_serials'][0]} serials")
     
+    cur_serial = date_stats['serial_number'][0]
     first_date = date_stats['first_date'][0]
     last_date = date_stats['last_date'][0]
     record_count = date_stats['record_count'][0]
@@ -159,20 +338,30 @@ def adjust_dates(df: pl.LazyFrame, logger: logging.Logger = None) -> pl.LazyFram
         return df
 
 
-def fix_date_gaps(df: pl.LazyFrame, serials: pl.Series, logger: logging.Logger = None) -> pl.LazyFrame:
+def fix_date_gaps(df: pl.LazyFrame, serials: pl.Series = None, logger: logging.Logger = None, vectorized: bool = True) -> pl.LazyFrame:
     """
     Fix date gaps in the input dataframe for all serial numbers.
     
     Args:
         df: Input LazyFrame containing hard drive data
-        serials: Series of disk serial numbers
+        serials: Series of disk serial numbers. If None, every serial in df is processed
         logger: Optional logger instance for logging
+        vectorized: If True (default), fill gaps for the whole fleet in a single lazy plan.
+            If False, fall back to calling adjust_dates once per serial
         
     Returns:
         LazyFrame with fixed date gaps
     """
     if logger: 
         logger.info("Fixing date gaps for all serial numbers")
+
+    if vectorized:
+        if serials is not None:
+            df = df.filter(pl.col('serial_number').is_in(serials.implode()))
+        return _fill_date_gaps_vectorized(df)
+
+    if serials is None:
+        serials = df.select('serial_number').unique(maintain_order=True).collect().to_series()
     
     # Process each serial number and collect results
     fixed_frames = []
@@ -190,74 +379,65 @@ def fix_date_gaps(df: pl.LazyFrame, serials: pl.Series, logger: logging.Logger =
     else:
         # Return empty LazyFrame with same schema if no serials provided
         return df.filter(pl.lit(False))
-    
-
-def create_failed_sequences(df: pl.LazyFrame, failed_serials: pl.Series, sequence_length: int, lookahead: int, logger: logging.Logger = None) -> pl.LazyFrame:
-    """
-    Create sequences of data from the dataframe for failed disks.
-    
-    Args:
-        df: Input LazyFrame containing hard drive data
-        failed_serials: Series of failed disk serial numbers
-        sequence_length: Length of each sequence
-        lookahead: Number of steps to look ahead
-        logger: Optional logger instance for logging
-        
-    Returns:
-        LazyFrame with sequences of data
-    """
 
-    logger.info(f"Creating sequences of data for {failed_serials.len()} failed disks")
 
-    failed_seq_list = []
-    for serial in failed_serials:
-        tmp_serial_failed = df.filter(pl.col('serial_number') == serial).collect()
-
-        if tmp_serial_failed.shape[0] > (sequence_length + lookahead):
-            tmp_serial_failed = tmp_serial_failed.with_columns(
-                pl.arange(pl.len()).over('serial_number').alias('row_idx'))
-            
-            failed_rows = tmp_serial_failed.filter(pl.col('failure') == 1)
-            end_idx = failed_rows.select('row_idx').row(0)[0] - lookahead +1
-            start_idx = end_idx - sequence_length
-
-            if start_idx > 0:
-                failed_seq_list.append(tmp_serial_failed.slice(start_idx, sequence_length).lazy())
-    del tmp_serial_failed
-    
-    if logger:
-        logger.info(f"Created {len(failed_seq_list)} sequences of data for {failed_serials.len()} failed disks")
-    
-    return pl.concat(failed_seq_list, how='vertical') # TODO: delete row index
+def _fill_date_gaps_vectorized(df: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Fill missing dates for every serial number in one lazy plan.
 
+    Builds the complete daily grid between each serial's first and last date with a single
+    group-wise date range, left-joins the observations onto it and forward-fills within each
+    serial. As in adjust_dates, only serials that actually have gaps are forward-filled.
 
-def create_normal_sequences(df: pl.LazyFrame, normal_serials: pl.Series, sequence_length: int, lookahead: int, logger: logging.Logger = None) -> pl.LazyFrame:
-    """
-    Create sequences of data from the dataframe for normal disks.
-    
     Args:
         df: Input LazyFrame containing hard drive data
-        normal_serials: Series of normal disk serial numbers        
-        sequence_length: Length of each sequence
-        lookahead: Number of steps to look ahead
-        logger: Optional logger instance for logging
-        
-    Returns:
-        LazyFrame with sequences of data
-    """ 
-
-    logger.info(f"Creating sequences of data for {normal_serials.len()} normal disks")
 
-    for serial in normal_serials:
-        df_tmp = df.filter(pl.col('serial_number') == serial).collect()
-        if df_tmp.shape[0] > (sequence_length + lookahead):
-            df_tmp = df_tmp.with_columns(
-                pl.arange(pl.len()).over('serial_number').alias('row_idx'))
-            
-            normal_rows = df_tmp.filter(pl.col('failure') == 0)
-            end_idx = normal_rows.select('row_idx').row(0)[0] - lookahead +1        
-            ## TODO: correct
+    Returns:
+        LazyFrame sorted by serial_number and date without date gaps
+    """
+    schema = df.collect_schema()
+    col_list = schema.names()
+    date_dtype = schema['date']
+    fill_columns = [col for col in col_list if col not in ['date', 'serial_number']]
 
+    # One grouped pass for the date span of every serial
+    spans = df.group_by('serial_number').agg([
+        pl.col('date').min().alias('first_date'),
+        pl.col('date').max().alias('last_date'),
+        pl.col('date').count().alias('record_count'),
+    ])
 
+    # Daily grid per serial, cast back to the input date type
+    grid = (
+        spans
+        .with_columns(
+            pl.date_ranges(
+                pl.col('first_date').cast(pl.Date),
+                pl.col('last_date').cast(pl.Date),
+                interval='1d'
+            ).alias('date')
+        )
+        .with_columns(
+            ((pl.col('last_date').cast(pl.Date) - pl.col('first_date').cast(pl.Date)).dt.total_days() + 1
+             > pl.col('record_count')).alias('_has_gap')
+        )
+        .select(['serial_number', 'date', '_has_gap'])
+        .explode('date')
+        .with_columns(pl.col('date').cast(date_dtype))
+    )
 
+    df_complete = (
+        grid
+        .join(df, on=['serial_number', 'date'], how='left')
+        .sort(['serial_number', 'date'])
+        .with_columns([
+            pl.when(pl.col('_has_gap'))
+            .then(pl.col(col).forward_fill().over('serial_number'))
+            .otherwise(pl.col(col))
+            .alias(col)
+            for col in fill_columns
+        ])
+        .select(col_list)
+    )
 
+    return df_complete
@@ -0,0 +1,109 @@
+import json
+import logging
+import polars as pl
+from pathlib import Path
+from typing import List, Optional, Union
+
+
+def profile_smart_columns(df: pl.LazyFrame, columns: Optional[List[str]] = None, engine: str = "auto") -> pl.DataFrame:
+    """
+    Profile all SMART columns in a single aggregation over the data.
+
+    Args:
+        df: Input LazyFrame containing hard drive data
+        columns: Columns to profile. Defaults to all raw SMART columns (smart_*_raw)
+        engine: Polars engine used to run the aggregation (default: "auto")
+
+    Returns:
+        DataFrame with one row per column and the columns column, null_fraction, variance
+        (of the non-null values, 0 for all-null columns) and n_distinct (approximate, nulls excluded)
+    """
+    if columns is None:
+        columns = [col for col in df.collect_schema().names() if col.startswith("smart_") and col.endswith("_raw")]
+
+    stats = df.select(
+        [pl.len().alias('__rows')]
+        + [pl.col(col).null_count().alias(f"{col}__nulls") for col in columns]
+        + [pl.col(col).cast(pl.Float64).var().alias(f"{col}__var") for col in columns]
+        + [pl.col(col).drop_nulls().approx_n_unique().alias(f"{col}__distinct") for col in columns]
+    ).collect(engine=engine).row(0, named=True)
+
+    rows = max(stats['__rows'], 1)
+    return pl.DataFrame({
+        'column': columns,
+        'null_fraction': [stats[f"{col}__nulls"] / rows for col in columns],
+        'variance': [stats[f"{col}__var"] or 0.0 for col in columns],
+        'n_distinct': [stats[f"{col}__distinct"] for col in columns],
+    }, schema={'column': pl.String, 'null_fraction': pl.Float64, 'variance': pl.Float64, 'n_distinct': pl.UInt32})
+
+
+def select_smart_columns(
+    profile: pl.DataFrame,
+    max_null_fraction: float = 0.99,
+    min_variance: float = 0.0,
+    min_distinct: int = 2,
+    logger: logging.Logger = None
+) -> List[str]:
+    """
+    Choose the SMART columns worth keeping from a profile_smart_columns result.
+
+    A column is kept if its null fraction is at most `max_null_fraction`, its variance is greater than
+    `min_variance` and it has at least `min_distinct` distinct values. With the defaults this drops
+    dead (all-null) and constant columns.
+
+    Args:
+        profile: Output of profile_smart_columns
+        max_null_fraction: Maximum fraction of null values (default: 0.99)
+        min_variance: Variance a column must exceed (default: 0.0)
+        min_distinct: Minimum number of distinct non-null values (default: 2)
+        logger: Optional logger instance for logging
+
+    Returns:
+        List of kept column names, in profile order
+    """
+    kept = profile.filter(
+        (pl.col('null_fraction') <= max_null_fraction)
+        & (pl.col('variance') > min_variance)
+        & (pl.col('n_distinct') >= min_distinct)
+    ).get_column('column').to_list()
+
+    if logger:
+        dropped = [col for col in profile['column'] if col not in kept]
+        logger.info(f"Keeping {len(kept)} of {profile.height} SMART columns, dropping {dropped}")
+    return kept
+
+
+def save_column_selection(columns: List[str], path: Union[str, Path]) -> None:
+    """Save a column selection so other datasets (e.g. test data) get the same projection."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'smart_columns': columns}, f, indent=2)
+
+
+def load_column_selection(path: Union[str, Path]) -> List[str]:
+    """Load a column selection written by save_column_selection."""
+    with open(path, 'r') as f:
+        return json.load(f)['smart_columns']
+
+
+def prune_smart_columns(df: pl.LazyFrame, keep: List[str]) -> pl.LazyFrame:
+    """
+    Drop all SMART columns that are not in `keep`; other columns are left untouched.
+
+    Applied directly to a scan, the projection is pushed down so dropped columns are never read.
+    Kept columns missing from `df` are added as nulls, so every dataset ends up with the same columns.
+
+    Args:
+        df: Input LazyFrame containing hard drive data
+        keep: SMART columns to keep, e.g. from select_smart_columns or load_column_selection
+
+    Returns:
+        LazyFrame without the pruned SMART columns
+    """
+    names = df.collect_schema().names()
+    keep_set = set(keep)
+    return df.select(
+        [col for col in names if not col.startswith("smart_") or col in keep_set]
+        + [pl.lit(None, dtype=pl.Float64).alias(col) for col in keep if col not in names]
+    )
@@ -0,0 +1,122 @@
+import logging
+import polars as pl
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+FEATURE_KINDS = [
+    "delta",
+    "rolling_mean",
+    "rolling_std",
+    "rolling_max",
+    "rolling_min",
+    "ewm_mean",
+    "days_since_change",
+]
+
+
+@dataclass
+class FeatureSpec:
+    """Declarative specification of one family of per-drive features.
+
+    Attributes:
+        kind (str): One of FEATURE_KINDS.
+        columns (Union[str, List[str]]): Source columns, or "smart" for every raw SMART column.
+        window (int): Window in rows (days on gap-filled data) for delta and rolling features.
+        span (float): Span of ewm_mean.
+    """
+    kind: str
+    columns: Union[str, List[str]] = "smart"
+    window: int = 1
+    span: float = 7
+
+    def __post_init__(self):
+        if self.kind not in FEATURE_KINDS:
+            raise ValueError(f"Unknown feature kind '{self.kind}', expected one of {FEATURE_KINDS}")
+
+    @property
+    def suffix(self) -> str:
+        if self.kind == "ewm_mean":
+            return f"ewm_mean_{self.span:g}"
+        if self.kind == "days_since_change":
+            return self.kind
+        return f"{self.kind}_{self.window}"
+
+    def source_columns(self, available: List[str]) -> List[str]:
+        if self.columns == "smart":
+            return [col for col in available if col.startswith("smart_") and col.endswith("_raw")]
+        return [col for col in self.columns if col in available]
+
+
+def parse_feature_specs(config: Optional[List[Dict[str, Any]]]) -> List[FeatureSpec]:
+    """Build feature specs from the `features` list of data.yaml."""
+    return [FeatureSpec(**entry) for entry in (config or [])]
+
+
+def _feature_expr(spec: FeatureSpec, col: str, date_col: str) -> pl.Expr:
+    value = pl.col(col)
+    if spec.kind == "delta":
+        expr = (value - value.shift(spec.window)).fill_null(0)
+    elif spec.kind == "rolling_mean":
+        expr = value.rolling_mean(spec.window, min_samples=1)
+    elif spec.kind == "rolling_std":
+        expr = value.rolling_std(spec.window, min_samples=1).fill_null(0)
+    elif spec.kind == "rolling_max":
+        expr = value.rolling_max(spec.window, min_samples=1)
+    elif spec.kind == "rolling_min":
+        expr = value.rolling_min(spec.window, min_samples=1)
+    elif spec.kind == "ewm_mean":
+        expr = value.ewm_mean(span=spec.span, adjust=False)
+    else:
+        previous = value.shift(1)
+        changed = previous.is_null() | (value != previous)
+        last_change = pl.when(changed).then(pl.col(date_col)).forward_fill()
+        expr = (pl.col(date_col) - last_change).dt.total_days()
+    return expr.over('serial_number').alias(f"{col}__{spec.suffix}")
+
+
+def compile_features(specs: List[FeatureSpec], columns: List[str], date_col: str = "date", logger: logging.Logger = None) -> List[pl.Expr]:
+    """
+    Compile feature specs into window expressions over serial_number.
+
+    Args:
+        specs: Feature specifications
+        columns: Columns available in the frame the expressions will run on
+        date_col: Name of the date column (default: "date")
+        logger: Optional logger instance for logging
+
+    Returns:
+        List of expressions, one per (spec, source column)
+    """
+    exprs = []
+    for spec in specs:
+        sources = spec.source_columns(columns)
+        if logger and spec.columns != "smart" and len(sources) < len(spec.columns):
+            missing = [col for col in spec.columns if col not in columns]
+            logger.warning(f"Skipping missing columns for {spec.kind} features: {missing}")
+        exprs.extend(_feature_expr(spec, col, date_col) for col in sources)
+    return exprs
+
+
+def add_features(df: pl.LazyFrame, specs: List[FeatureSpec], logger: logging.Logger = None) -> pl.LazyFrame:
+    """
+    Add all derived features to a gap-filled frame in one lazy plan.
+
+    The frame is sorted by (serial_number, date) once and every feature is a window expression over
+    serial_number, so all of them are computed in a single pass without per-serial collects. Rolling
+    windows are counted in rows, which equals days on gap-filled data. Deltas and standard deviations
+    without enough history are 0; rolling statistics use the available history.
+
+    Args:
+        df: Gap-filled LazyFrame containing hard drive data
+        specs: Feature specifications, e.g. parse_feature_specs(load_config().features)
+        logger: Optional logger instance for logging
+
+    Returns:
+        LazyFrame with the derived feature columns appended
+    """
+    exprs = compile_features(specs, df.collect_schema().names(), logger=logger)
+    if logger:
+        logger.info(f"Adding {len(exprs)} derived features from {len(specs)} feature specs")
+    if not exprs:
+        return df
+    return df.sort(['serial_number', 'date']).with_columns(exprs)
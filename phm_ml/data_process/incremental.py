@@ -0,0 +1,191 @@
+import json
+import logging
+import numpy as np
+import polars as pl
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from phm_ml.data_process.data_backblaze_harddrive import fix_date_gaps
+from phm_ml.data_process.sequences import SequenceSet, build_sequences
+
+STATE_FILE = "state.parquet"
+TAIL_FILE = "tail.parquet"
+META_FILE = "meta.json"
+
+
+@dataclass
+class IncrementalState:
+    """Persisted per-serial state for appending daily snapshots without reprocessing history.
+
+    Attributes:
+        state (pl.DataFrame): One row per serial with `last_date`, `row_count`, `failed` and the last
+            observed value of every value column.
+        tail (pl.DataFrame): The last `sequence_length + lookahead - 1` gap-filled rows of every
+            serial, i.e. the rows a new window can still reach back to.
+        value_columns (List[str]): Columns carried forward by gap filling (SMART columns and failure).
+        sequence_length (int): Length of each sequence.
+        lookahead (int): Number of steps to look ahead.
+    """
+    state: pl.DataFrame
+    tail: pl.DataFrame
+    value_columns: List[str]
+    sequence_length: int
+    lookahead: int
+
+    @classmethod
+    def empty(cls, schema: pl.Schema, sequence_length: int, lookahead: int) -> 'IncrementalState':
+        """
+        Create an empty state for cleaned frames with the given schema.
+
+        Args:
+            schema: Schema of the cleaned daily frames (output of data_clean)
+            sequence_length: Length of each sequence
+            lookahead: Number of steps to look ahead
+
+        Returns:
+            IncrementalState without any serials
+        """
+        value_columns = [col for col in schema.names() if col not in ['date', 'serial_number']]
+        tail = pl.DataFrame(schema=schema)
+        state = pl.DataFrame(schema={
+            'serial_number': schema['serial_number'],
+            'last_date': schema['date'],
+            'row_count': pl.UInt32,
+            'failed': pl.Boolean,
+            **{col: schema[col] for col in value_columns}
+        })
+        return cls(state, tail.select(['date', 'serial_number'] + value_columns), value_columns,
+                   sequence_length, lookahead)
+
+    @property
+    def tail_length(self) -> int:
+        return self.sequence_length + self.lookahead - 1
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> 'IncrementalState':
+        """Load a state saved with save()."""
+        directory = Path(directory)
+        with open(directory / META_FILE, 'r') as f:
+            meta = json.load(f)
+        return cls(
+            state=pl.read_parquet(directory / STATE_FILE),
+            tail=pl.read_parquet(directory / TAIL_FILE),
+            value_columns=meta['value_columns'],
+            sequence_length=meta['sequence_length'],
+            lookahead=meta['lookahead']
+        )
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Persist the state as two parquet files and a small JSON metadata file."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.state.write_parquet(directory / STATE_FILE)
+        self.tail.write_parquet(directory / TAIL_FILE)
+        with open(directory / META_FILE, 'w') as f:
+            json.dump({
+                'value_columns': self.value_columns,
+                'sequence_length': self.sequence_length,
+                'lookahead': self.lookahead
+            }, f, indent=2)
+
+    def update(self, new_df: pl.LazyFrame, logger: logging.Logger = None) -> Tuple[pl.DataFrame, SequenceSet]:
+        """
+        Append new daily rows, gap-fill the affected drives and emit the newly completed windows.
+
+        Only the serials present in `new_df` are touched. Each of them is gap-filled from its last
+        observed date, so the appended rows are identical to what fix_date_gaps produces over the full
+        history. A window is emitted when its target row (`lookahead` rows after the window end) is
+        one of the appended rows.
+
+        Args:
+            new_df: Cleaned LazyFrame (output of data_clean) with one or more new days
+            logger: Optional logger instance for logging
+
+        Returns:
+            Tuple of (appended gap-filled rows, newly completed sequences)
+        """
+        columns = ['date', 'serial_number'] + self.value_columns
+        new = new_df.select(columns).collect()
+
+        # Drop rows that are not newer than what was already processed for the serial
+        new = (new
+               .join(self.state.select(['serial_number', 'last_date']), on='serial_number', how='left')
+               .filter(pl.col('last_date').is_null() | (pl.col('date') > pl.col('last_date')))
+               .drop('last_date'))
+        affected = new.select('serial_number').unique()
+
+        previous = (self.state
+                    .join(affected, on='serial_number', how='semi')
+                    .select([pl.col('last_date').alias('date'), pl.col('serial_number')] + self.value_columns))
+
+        # Gap-fill from the last known row of each affected serial, then keep only the new rows
+        appended = (fix_date_gaps(pl.concat([previous, new], how='vertical').lazy())
+                    .join(previous.lazy().select(['serial_number', pl.col('date').alias('_last_date')]),
+                          on='serial_number', how='left')
+                    .filter(pl.col('_last_date').is_null() | (pl.col('date') > pl.col('_last_date')))
+                    .drop('_last_date')
+                    .collect())
+
+        # Windows over the retained tail plus the appended rows of the affected serials
+        window_rows = pl.concat([self.tail.join(affected, on='serial_number', how='semi'), appended],
+                                how='vertical')
+        sequences = build_sequences(
+            window_rows.lazy(),
+            self.sequence_length,
+            self.lookahead,
+            feature_columns=[col for col in self.value_columns if col != 'failure']
+        )
+        sequences = _select_new_windows(sequences, previous, self.lookahead)
+
+        summary = appended.group_by('serial_number').agg([
+            pl.col('date').max().alias('last_date'),
+            pl.len().cast(pl.UInt32).alias('new_rows'),
+            (pl.col('failure') == 1).any().alias('new_failed'),
+        ])
+        last_values = appended.sort('date').group_by('serial_number').last().select(['serial_number'] + self.value_columns)
+        self.state = (pl.concat([
+            self.state.join(affected, on='serial_number', how='anti'),
+            summary
+            .join(self.state.select(['serial_number', 'row_count', 'failed']), on='serial_number', how='left')
+            .join(last_values, on='serial_number', how='left')
+            .select([
+                pl.col('serial_number'),
+                pl.col('last_date'),
+                (pl.col('row_count').fill_null(0) + pl.col('new_rows')).alias('row_count'),
+                (pl.col('failed').fill_null(False) | pl.col('new_failed')).alias('failed'),
+                *self.value_columns
+            ])
+        ], how='vertical'))
+
+        self.tail = pl.concat([
+            self.tail.join(affected, on='serial_number', how='anti'),
+            window_rows
+            .sort(['serial_number', 'date'])
+            .group_by('serial_number', maintain_order=True).tail(self.tail_length)
+            .select(self.tail.columns)
+        ], how='vertical')
+
+        if logger:
+            logger.info(f"Appended {appended.height} rows for {affected.height} serials, "
+                        f"emitted {len(sequences)} new sequences")
+
+        return appended, sequences
+
+
+def _select_new_windows(sequences: SequenceSet, previous: pl.DataFrame, lookahead: int) -> SequenceSet:
+    """Keep the windows whose target row lies after the previously processed date of its serial."""
+    serials = pl.Series('serial_number', sequences.serial_numbers.tolist(), dtype=previous.schema['serial_number'])
+    previous_dates = (serials.to_frame()
+                      .join(previous.select(['serial_number', 'date']), on='serial_number', how='left',
+                            maintain_order='left')
+                      ['date'].to_numpy().astype('datetime64[D]'))
+    end_dates = sequences.end_dates.astype('datetime64[D]')
+    keep = np.isnat(previous_dates) | (end_dates + np.timedelta64(lookahead, 'D') > previous_dates)
+    return SequenceSet(
+        X=sequences.X[keep],
+        y=sequences.y[keep],
+        serial_numbers=sequences.serial_numbers[keep],
+        end_dates=sequences.end_dates[keep],
+        feature_names=sequences.feature_names
+    )
@@ -0,0 +1,267 @@
+import datetime
+import logging
+import os
+import re
+import polars as pl
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+BASE_COLUMNS = ['date', 'serial_number', 'model', 'capacity_bytes', 'failure']
+# Errors of a single unreadable or malformed CSV file; ingest_csv_to_parquet logs and skips the file
+READ_ERRORS = (OSError, UnicodeDecodeError, pl.exceptions.PolarsError)
+
+# Partition (model=__null__) of the rows without a model
+NULL_PARTITION = "__null__"
+
+BASE_DTYPES = {
+    'date': pl.Date,
+    'serial_number': pl.String,
+    'model': pl.String,
+    'capacity_bytes': pl.Int64,
+    'failure': pl.Int64,
+}
+
+
+def find_data_directories(base_directory: Union[str, Path], year: int) -> List[Path]:
+    """
+    Find the `data_*_{year}` directories of a Backblaze download, sorted by quarter.
+
+    Args:
+        base_directory: Base directory containing the data folders
+        year: Year of data to load
+
+    Returns:
+        List of matching directories, Q1 first
+    """
+    def directory_sort_key(dir_path: Path):
+        match = re.search(rf'data_(.+)_{year}', dir_path.name)
+        if match:
+            q_match = re.match(r'Q(\d+)', match.group(1))
+            if q_match:
+                return (0, int(q_match.group(1)), '')
+            return (1, 0, match.group(1))
+        return (2, 0, dir_path.name)
+
+    directories = [p for p in Path(base_directory).glob(f'data_*_{year}') if p.is_dir()]
+    return sorted(directories, key=directory_sort_key)
+
+
+def _read_header(csv_file: Path) -> List[str]:
+    """Read the column names of a CSV file without parsing any data."""
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        return [col.strip().strip('"') for col in f.readline().strip().split(',')]
+
+
+def _smart_sort_key(col: str):
+    match = re.match(r'smart_(\d+)_(.+)', col)
+    return (int(match.group(1)), match.group(2)) if match else (10**6, col)
+
+
+def harmonize_schema(csv_files: List[Path], logger: logging.Logger = None) -> Dict[str, pl.DataType]:
+    """
+    Build the union schema of a set of daily CSV files.
+
+    SMART columns appear and disappear between quarters; the union keeps every column seen in any file
+    so all partitions share one schema. Only the header line of each file is read; files whose header
+    cannot be read are left out.
+
+    Args:
+        csv_files: Daily Backblaze CSV files
+        logger: Optional logger instance for logging
+
+    Returns:
+        Ordered mapping of column name to target dtype
+    """
+    seen = {}
+    for csv_file in csv_files:
+        try:
+            header = _read_header(csv_file)
+        except (OSError, UnicodeDecodeError) as error:
+            if logger:
+                logger.error(f"Cannot read the header of {csv_file}: {error}")
+            continue
+        for col in header:
+            seen.setdefault(col, None)
+
+    smart_columns = sorted((col for col in seen if col.startswith('smart_')), key=_smart_sort_key)
+    other_columns = [col for col in seen if col not in BASE_DTYPES and not col.startswith('smart_')]
+
+    schema = {col: BASE_DTYPES[col] for col in BASE_COLUMNS}
+    schema.update({col: pl.String for col in other_columns})
+    schema.update({col: pl.Float64 for col in smart_columns})
+    return schema
+
+
+def read_daily_csv(csv_file: Path, schema: Dict[str, pl.DataType]) -> pl.DataFrame:
+    """
+    Read one daily CSV file and project it onto the harmonized schema.
+
+    Args:
+        csv_file: Daily Backblaze CSV file
+        schema: Target schema from harmonize_schema
+
+    Returns:
+        DataFrame with exactly the columns of `schema`, missing ones filled with nulls
+    """
+    header = _read_header(csv_file)
+    overrides = {col: schema[col] for col in header if col in schema}
+    df = pl.read_csv(csv_file, schema_overrides=overrides)
+    return df.select([
+        pl.col(col) if col in header else pl.lit(None, dtype=dtype).alias(col)
+        for col, dtype in schema.items()
+    ])
+
+
+def _partition_name(model: Optional[str]) -> str:
+    # Rows without a model go to their own partition
+    if model is None:
+        return NULL_PARTITION
+    return re.sub(r'[\\/]', '_', model)
+
+
+def ingest_csv_to_parquet(
+    base_directory: Union[str, Path],
+    year: int,
+    output_directory: Union[str, Path],
+    num_quarters: Optional[int] = None,
+    models: Optional[List[str]] = None,
+    max_workers: int = 4,
+    logger: logging.Logger = None
+) -> List[Path]:
+    """
+    Convert the daily Backblaze CSV files of one year into parquet partitioned by model and date.
+
+    Each CSV file holds one day of the whole fleet. Files are read independently by a pool of threads,
+    projected onto the union schema of all files and split by model into
+    `output_directory/model=<model>/<date>.parquet`. Peak memory is bounded by `max_workers` daily
+    files instead of the whole year.
+
+    Rows without a model go to `model=__null__`; rows without a date cannot be placed in a day and
+    are dropped with a warning. A file that cannot be read is logged and skipped; the other files are
+    still ingested. Before the partitions of a day are written, the existing partitions of that day
+    (of the selected models) are removed, so a rerun replaces a day instead of leaving stale models
+    behind, and every partition is written to a temporary file first, so an interrupted run never
+    leaves a truncated one.
+
+    Args:
+        base_directory: Base directory containing the `data_*_{year}` folders
+        year: Year of data to load
+        output_directory: Root directory of the partitioned parquet dataset
+        num_quarters: Optional limit on the number of quarter directories to load
+        models: Optional list of drive models to keep. Defaults to all models
+        max_workers: Number of files read and written concurrently (default: 4)
+        logger: Optional logger instance for logging
+
+    Returns:
+        List of written parquet files
+    """
+    directories = find_data_directories(base_directory, year)[:num_quarters]
+    if not directories:
+        if logger:
+            logger.warning(f"No directories matching 'data_*_{year}' found in {base_directory}")
+        return []
+
+    csv_files = [csv_file for directory in directories for csv_file in sorted(directory.glob('*.csv'))]
+    schema = harmonize_schema(csv_files, logger)
+    output_directory = Path(output_directory)
+
+    if logger:
+        logger.info(f"Ingesting {len(csv_files)} CSV files from {len(directories)} directories "
+                    f"with {len(schema)} harmonized columns")
+
+    def convert(csv_file: Path) -> Optional[List[Path]]:
+        try:
+            df = read_daily_csv(csv_file, schema)
+        except READ_ERRORS as error:
+            if logger:
+                logger.error(f"Skipped unreadable file {csv_file}: {error}")
+            return None
+        if models is not None:
+            df = df.filter(pl.col('model').is_in(models))
+        null_dates = df.get_column('date').null_count()
+        if null_dates:
+            if logger:
+                logger.warning(f"Dropped {null_dates} rows without a date from {csv_file}")
+            df = df.filter(pl.col('date').is_not_null())
+        if df.height == 0:
+            if logger:
+                logger.info(f"Skipped empty file: {csv_file}")
+            return []
+
+        for date in df.get_column('date').unique():
+            _clear_date_partitions(output_directory, date, models)
+        written = []
+        for (model, date), part in df.partition_by(['model', 'date'], as_dict=True).items():
+            part_directory = output_directory / f"model={_partition_name(model)}"
+            part_directory.mkdir(parents=True, exist_ok=True)
+            part_file = part_directory / f"{date}.parquet"
+            tmp_file = part_file.with_suffix('.tmp')
+            part.write_parquet(tmp_file)
+            os.replace(tmp_file, part_file)
+            written.append(part_file)
+        return written
+
+    written_files, skipped_files = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for csv_file, written in zip(csv_files, executor.map(convert, csv_files)):
+            if written is None:
+                skipped_files.append(csv_file)
+                continue
+            written_files.extend(written)
+            if logger:
+                logger.info(f"Loaded {csv_file.name} into {len(written)} partitions")
+
+    if logger:
+        logger.info(f"Wrote {len(written_files)} parquet partitions to {output_directory}")
+        if skipped_files:
+            logger.warning(f"Skipped {len(skipped_files)} unreadable files: {[f.name for f in skipped_files]}")
+    return written_files
+
+
+def _clear_date_partitions(output_directory: Path, date: datetime.date, models: Optional[List[str]]) -> None:
+    # Remove the existing partitions of one day, limited to the selected models
+    if models is None:
+        part_files = output_directory.glob(f"model=*/{date}.parquet")
+    else:
+        part_files = [output_directory / f"model={_partition_name(model)}" / f"{date}.parquet" for model in models]
+    for part_file in part_files:
+        part_file.unlink(missing_ok=True)
+
+
+def export_model_parquet(
+    partition_directory: Union[str, Path],
+    model: str,
+    output_path: Union[str, Path],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    logger: logging.Logger = None
+) -> Path:
+    """
+    Stream the partitions of one model into a single interim parquet file.
+
+    Args:
+        partition_directory: Root directory written by ingest_csv_to_parquet
+        model: Drive model to export, e.g. "ST4000DM000"
+        output_path: Destination parquet file, e.g. "data/interim/Lab1-2017-Q1-ST4000DM000.parquet"
+        start_date: Optional first date to keep (inclusive, "YYYY-MM-DD")
+        end_date: Optional last date to keep (inclusive, "YYYY-MM-DD")
+        logger: Optional logger instance for logging
+
+    Returns:
+        Path of the written parquet file
+    """
+    source = Path(partition_directory) / f"model={_partition_name(model)}" / "*.parquet"
+    lf = pl.scan_parquet(source, hive_partitioning=False)
+    if start_date is not None:
+        lf = lf.filter(pl.col('date') >= pl.lit(start_date).str.to_date())
+    if end_date is not None:
+        lf = lf.filter(pl.col('date') <= pl.lit(end_date).str.to_date())
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    lf.sort(['date', 'serial_number']).sink_parquet(output_path)
+
+    if logger:
+        logger.info(f"Exported model {model} to {output_path}")
+    return output_path
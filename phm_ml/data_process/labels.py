@@ -0,0 +1,78 @@
+import logging
+import polars as pl
+from typing import List, Sequence
+
+
+def horizon_label(days: int) -> str:
+    """Name of the "fails within `days` days" label column."""
+    return f"fails_within_{days}d"
+
+
+def add_rul_labels(
+    df: pl.LazyFrame,
+    horizons: Sequence[int] = (7, 30),
+    summary: pl.DataFrame = None,
+    logger: logging.Logger = None
+) -> pl.LazyFrame:
+    """
+    Attach remaining-useful-life and time-to-failure labels to every row.
+
+    Every row is measured against the drive's next failure on or after its date: within each drive
+    (sorted by date) the date of every failure row is filled backwards, so a drive that fails more than
+    once never gets a negative days_to_failure. The last date of each drive comes from one aggregation
+    (or from a precomputed summarize_serials result) joined back onto the rows. Rows after a drive's
+    last failure are right-censored: their days_to_failure is null and days_to_last_observation gives
+    a lower bound on their RUL.
+
+    Added columns:
+        failure_date: Date of the drive's next failure on or after the row (null if none is observed)
+        event_observed: Whether a failure of the drive is observed at or after the row
+        days_to_failure: Days from the row to the next failure (0 on a failure day, null if censored)
+        days_to_last_observation: Days from the row to the drive's last observation
+        fails_within_{N}d: 1 if the drive fails within N days of the row (failure day included), else 0
+
+    Args:
+        df: LazyFrame containing hard drive data
+        horizons: Horizons in days for the fails_within_{N}d labels (default: 7 and 30)
+        summary: Optional output of summarize_serials for the same data, which avoids the aggregation
+        logger: Optional logger instance for logging
+
+    Returns:
+        LazyFrame with the label columns appended
+    """
+    if summary is not None:
+        dates = summary.lazy().select(['serial_number', 'last_date'])
+    else:
+        dates = df.group_by('serial_number').agg(pl.col('date').max().alias('last_date'))
+    schema = df.collect_schema()
+    dates = dates.with_columns([
+        pl.col('serial_number').cast(schema['serial_number']),
+        pl.col('last_date').cast(schema['date']),
+    ])
+
+    labeled = (df
+               .join(dates.rename({'last_date': '__last_date'}), on='serial_number', how='left')
+               .sort(['serial_number', 'date'])
+               .with_columns(
+                   pl.when(pl.col('failure') == 1).then(pl.col('date'))
+                   .fill_null(strategy='backward').over('serial_number').alias('failure_date'))
+               .with_columns([
+                   pl.col('failure_date').is_not_null().alias('event_observed'),
+                   (pl.col('failure_date') - pl.col('date')).dt.total_days().alias('days_to_failure'),
+                   (pl.col('__last_date') - pl.col('date')).dt.total_days().alias('days_to_last_observation'),
+               ])
+               .with_columns([
+                   (pl.col('days_to_failure') <= days).fill_null(False).cast(pl.Int8).alias(horizon_label(days))
+                   for days in horizons
+               ])
+               .drop('__last_date'))
+
+    if logger:
+        logger.info(f"Added RUL labels with horizons {list(horizons)} days")
+    return labeled
+
+
+def label_columns(horizons: Sequence[int]) -> List[str]:
+    """All columns added by add_rul_labels."""
+    return (['failure_date', 'event_observed', 'days_to_failure', 'days_to_last_observation']
+            + [horizon_label(days) for days in horizons])
@@ -0,0 +1,247 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+import polars as pl
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from phm_ml.data_process.data_backblaze_harddrive import compact_casts, data_clean, fix_date_gaps
+from phm_ml.data_process.feature_selection import prune_smart_columns
+from phm_ml.data_process.sampling import _allocate
+from phm_ml.data_process.scaling import Scaler, fit_scaler
+from phm_ml.data_process.sequence_store import write_sequence_store
+from phm_ml.data_process.sequences import build_sequences
+
+MANIFEST_FILE = "manifest.json"
+SCALER_FILE = "scaler.json"
+SPILL_FILE = "_gap_filled.parquet"
+
+
+@dataclass
+class PartitionTask:
+    """One unit of work of the parallel pipeline: the drives of one model falling into one serial-hash shard.
+
+    Attributes:
+        source (str): Parquet file or glob with the interim data
+        model (str): Drive model of the partition
+        shard (int): Serial-hash shard of the partition
+        num_shards (int): Total number of shards per model
+        output_directory (str): Root directory of the partition outputs
+        sequence_length (int): Length of each sequence
+        lookahead (int): Number of steps to look ahead
+        stride (int): Step between consecutive windows of a drive
+        compact (bool): Whether data_clean compacts the schema
+        smart_columns (Optional[List[str]]): Optional SMART column selection applied before cleaning
+        scaling_method (str): Method of the scaler fitted on the partition
+        relative_accuracy (float): Relative accuracy of the scaler's quantile sketches
+        casts (Optional[Dict[str, Any]]): With compact, the dtypes of compact_casts profiled over the whole
+            source, so every partition gets the same schema
+        max_normal_seq (Optional[int]): Cap on the sequences labelled 0 of this partition, its share of
+            the cap of the whole run
+    """
+    source: str
+    model: str
+    shard: int
+    num_shards: int
+    output_directory: str
+    sequence_length: int
+    lookahead: int
+    stride: int = 1
+    compact: bool = False
+    smart_columns: Optional[List[str]] = None
+    scaling_method: str = "standard"
+    relative_accuracy: float = 0.01
+    casts: Optional[Dict[str, Any]] = None
+    max_normal_seq: Optional[int] = None
+
+    @property
+    def partition_directory(self) -> Path:
+        safe_model = self.model.replace('/', '_').replace('\\', '_')
+        return Path(self.output_directory) / f"model={safe_model}" / f"shard={self.shard:04d}"
+
+
+def process_partition(task: PartitionTask) -> Dict[str, Any]:
+    """
+    Run clean -> gap-fill -> window extraction for one partition and write its output.
+
+    Runs in a worker process, so it only takes picklable arguments and reads its input itself. The
+    gap-filled data is sunk to a spill file in the partition directory and read back as a scan, so only
+    the columns of the sequence tensor are ever in memory; the spill file is removed at the end.
+
+    Args:
+        task: Partition to process
+
+    Returns:
+        Manifest entry of the written partition
+    """
+    start = time.perf_counter()
+    logger = logging.getLogger("phm_ml")
+
+    df = pl.scan_parquet(task.source).filter(pl.col('model') == task.model)
+    if task.num_shards > 1:
+        df = df.filter(pl.col('serial_number').hash(seed=0) % task.num_shards == task.shard)
+    if task.smart_columns is not None:
+        df = prune_smart_columns(df, task.smart_columns)
+
+    partition_directory = task.partition_directory
+    partition_directory.mkdir(parents=True, exist_ok=True)
+    spill_file = partition_directory / SPILL_FILE
+    fix_date_gaps(data_clean(df, logger, compact=task.compact, casts=task.casts)).sink_parquet(spill_file, engine="streaming")
+    gap_filled = pl.scan_parquet(spill_file)
+    counts = gap_filled.select(pl.len().alias('rows'), pl.col('serial_number').n_unique().alias('serials')).collect()
+
+    sequences = build_sequences(gap_filled, task.sequence_length, task.lookahead, stride=task.stride,
+                                max_normal_seq=task.max_normal_seq)
+    write_sequence_store(sequences, partition_directory)
+    # Partition scalers are merged by the parent into the scaler of the whole run
+    fit_scaler(gap_filled, sequences.feature_names, task.scaling_method,
+               relative_accuracy=task.relative_accuracy, engine="streaming").save(partition_directory / SCALER_FILE)
+    spill_file.unlink()
+
+    return {
+        'model': task.model,
+        'shard': task.shard,
+        'path': str(partition_directory),
+        'rows': counts['rows'].item(),
+        'serials': counts['serials'].item(),
+        'sequences': len(sequences),
+        'failed_sequences': int((sequences.y == 1).sum()),
+        'feature_names': sequences.feature_names,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def run_parallel_pipeline(
+    source: Union[str, Path],
+    output_directory: Union[str, Path],
+    sequence_length: int,
+    lookahead: int,
+    models: Optional[List[str]] = None,
+    num_shards: int = 4,
+    workers: int = 4,
+    stride: int = 1,
+    compact: bool = False,
+    smart_columns: Optional[List[str]] = None,
+    scaling_method: str = "standard",
+    relative_accuracy: float = 0.01,
+    max_normal_seq: Optional[int] = None,
+    logger: logging.Logger = None
+) -> Dict[str, Any]:
+    """
+    Fan the Backblaze pipeline out over drive models and serial-hash shards in a process pool.
+
+    Every (model, shard) partition is processed independently by process_partition, which writes
+    a sequence store and the scaling statistics of its data to `output_directory/model=<model>/shard=<k>/`.
+    The entries of all partitions are merged into one `manifest.json` and their statistics into one
+    `scaler.json`. Workers are started with "spawn" and each gets
+    an equal share of the CPU cores for its polars thread pool.
+
+    Args:
+        source: Parquet file or glob with the interim data
+        output_directory: Root directory of the partition outputs and the manifest
+        sequence_length: Length of each sequence
+        lookahead: Number of steps to look ahead
+        models: Drive models to process. Defaults to all models in the data
+        num_shards: Number of serial-hash shards per model (default: 4)
+        workers: Number of worker processes (default: 4)
+        stride: Step between consecutive windows of a drive (default: 1)
+        compact: Whether data_clean compacts the schema (default: False); the dtypes are profiled once
+            over the whole source
+        smart_columns: Optional SMART column selection applied before cleaning
+        scaling_method: Method of the merged scaler (default: "standard")
+        relative_accuracy: Relative accuracy of the quantile sketches (default: 0.01)
+        max_normal_seq: Optional cap on the sequences labelled 0 of the whole run. It is split over the
+            partitions in proportion to their rows, and each partition subsamples its share
+        logger: Optional logger instance for logging
+
+    Returns:
+        The merged manifest
+    """
+    start = time.perf_counter()
+    if models is None:
+        models = pl.scan_parquet(source).select(pl.col('model').unique().sort()).collect().to_series().to_list()
+
+    casts = None
+    if compact:
+        # One profile of the whole source: per-partition dtypes would differ between the partitions
+        df = pl.scan_parquet(source).filter(pl.col('model').is_in(models))
+        if smart_columns is not None:
+            df = prune_smart_columns(df, smart_columns)
+        casts = compact_casts(df)
+
+    normal_caps = {}
+    if max_normal_seq is not None:
+        normal_caps = _partition_caps(source, models, num_shards, max_normal_seq)
+
+    tasks = [
+        PartitionTask(str(source), model, shard, num_shards, str(output_directory), sequence_length,
+                      lookahead, stride, compact, smart_columns, scaling_method, relative_accuracy, casts,
+                      max_normal_seq=normal_caps.get((model, shard), 0 if max_normal_seq is not None else None))
+        for model in models for shard in range(num_shards)
+    ]
+    if logger:
+        logger.info(f"Processing {len(tasks)} partitions ({len(models)} models x {num_shards} shards) "
+                    f"with {workers} workers")
+
+    # Polars sizes its thread pool at import, so the limit is inherited through the environment
+    previous_threads = os.environ.get("POLARS_MAX_THREADS")
+    os.environ["POLARS_MAX_THREADS"] = str(max(1, (os.cpu_count() or 1) // workers))
+    entries = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(process_partition, task): task for task in tasks}
+            for future in as_completed(futures):
+                entry = future.result()
+                entries.append(entry)
+                if logger:
+                    logger.info(f"Finished partition {entry['model']}/{entry['shard']}: "
+                                f"{entry['sequences']} sequences in {entry['seconds']} s")
+    finally:
+        if previous_threads is None:
+            os.environ.pop("POLARS_MAX_THREADS", None)
+        else:
+            os.environ["POLARS_MAX_THREADS"] = previous_threads
+
+    entries.sort(key=lambda entry: (entry['model'], entry['shard']))
+    manifest = {
+        'source': str(source),
+        'parameters': asdict(tasks[0]) if tasks else {},
+        'max_normal_seq': max_normal_seq,
+        'workers': workers,
+        'wall_seconds': round(time.perf_counter() - start, 3),
+        'total_sequences': sum(entry['sequences'] for entry in entries),
+        'partitions': entries,
+    }
+    for key in ['model', 'shard', 'max_normal_seq']:
+        manifest['parameters'].pop(key, None)
+
+    output_directory = Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+    with open(output_directory / MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    if entries:
+        scaler = Scaler.load(Path(entries[0]['path']) / SCALER_FILE)
+        for entry in entries[1:]:
+            scaler = scaler.merge(Scaler.load(Path(entry['path']) / SCALER_FILE))
+        scaler.save(output_directory / SCALER_FILE)
+
+    if logger:
+        logger.info(f"Wrote {manifest['total_sequences']} sequences from {len(entries)} partitions "
+                    f"in {manifest['wall_seconds']} s, manifest at {output_directory / MANIFEST_FILE}")
+    return manifest
+
+
+def _partition_caps(source: Union[str, Path], models: List[str], num_shards: int, size: int) -> Dict[Any, int]:
+    # Share of every (model, shard) partition in a cap of the whole run, in proportion to its rows
+    rows = (pl.scan_parquet(source)
+            .filter(pl.col('model').is_in(models))
+            .group_by(pl.col('model'), (pl.col('serial_number').hash(seed=0) % num_shards).alias('shard'))
+            .agg(pl.len().alias('stratum_size'))
+            .sort(['model', 'shard'])
+            .collect())
+    caps = _allocate(rows, size)
+    return {(model, shard): quota for model, shard, quota in caps.select(['model', 'shard', 'quota']).iter_rows()}
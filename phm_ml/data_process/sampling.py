@@ -0,0 +1,251 @@
+import json
+import logging
+import polars as pl
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Union
+
+SAMPLING_METHODS = ["reservoir", "bernoulli"]
+
+# Parquet metadata key of the provenance (sampling parameters, source fingerprint) of a saved sample index
+PROVENANCE_KEY = "phm_ml.sample_index"
+
+_HASH_RANGE = 2.0 ** 64
+
+
+def hash_key(column: Union[str, pl.Expr], seed: int = 0) -> pl.Expr:
+    """
+    Seeded pseudo-random key in [0, 1) derived from the values of `column`.
+
+    The same value always gets the same key for a given seed, so every row of a drive shares its key and
+    the sample does not depend on row order, partitioning or the number of passes over the data.
+    """
+    expr = pl.col(column) if isinstance(column, str) else column
+    return (expr.cast(pl.String).hash(seed=seed).cast(pl.Float64) / _HASH_RANGE).alias('sample_key')
+
+
+def _class_value(sizes: Dict, label) -> Optional[Union[int, float]]:
+    # Class keys may be given as bools or as 0/1
+    for key, value in sizes.items():
+        if bool(key) == bool(label):
+            return value
+    return None
+
+
+def stratified_sample_drives(
+    summary: pl.DataFrame,
+    sizes: Optional[Dict[int, Optional[int]]] = None,
+    fractions: Optional[Dict[int, float]] = None,
+    strata: Sequence[str] = ("failed", "model", "date_bucket"),
+    date_bucket: str = "1mo",
+    method: str = "reservoir",
+    seed: int = 0,
+    logger: logging.Logger = None
+) -> pl.DataFrame:
+    """
+    Draw a seeded, stratified sample of drives from a drive summary.
+
+    Sampling is at drive level, so all rows of a drive end up on the same side of the sample (and of any
+    split). Each drive gets a seeded hash key; drives are stratified by class (`failed`), model and the
+    date bucket of their first observation.
+
+    - "reservoir": the k drives with the smallest keys of every stratum (bottom-k sampling, a uniform
+      sample without replacement). The class sizes are allocated to the strata in proportion to their
+      drive counts. Bottom-k samples of disjoint partitions merge into the bottom-k sample of the union.
+    - "bernoulli": every drive with a key below the fraction of its class, i.e. an independent
+      coin flip per drive; sizes are only exact in expectation.
+
+    The summary comes from summarize_serials, a single (streaming) grouped pass over the data.
+
+    Args:
+        summary: Output of summarize_serials, with a model column if "model" is in strata
+        sizes: Reservoir sample size per class, keyed by failed (True/1) or normal (False/0);
+            None keeps every drive of the class. Defaults to keeping all drives
+        fractions: Bernoulli sampling fraction per class, keyed like sizes
+        strata: Stratification columns; "date_bucket" is derived from first_date
+        date_bucket: Bucket width of first_date, as a polars duration string (default: "1mo")
+        method: One of SAMPLING_METHODS (default: "reservoir")
+        seed: Seed of the hash keys (default: 0)
+        logger: Optional logger instance for logging
+
+    Returns:
+        Sample index: one row per sampled drive with serial_number, the strata columns, the number of
+        rows of the drive (count) and its sample_key
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method '{method}', expected one of {SAMPLING_METHODS}")
+    strata = list(strata)
+
+    drives = summary.with_columns(hash_key('serial_number', seed))
+    if "date_bucket" in strata:
+        first_date = pl.col('first_date')
+        if summary.schema['first_date'] == pl.String:
+            first_date = first_date.str.to_date()
+        drives = drives.with_columns(first_date.dt.truncate(date_bucket).alias('date_bucket'))
+
+    if method == "bernoulli":
+        fractions = fractions or {}
+        fraction = pl.Series([_class_value(fractions, failed) for failed in [False, True]], dtype=pl.Float64)
+        sample = drives.filter(
+            pl.col('sample_key') < pl.when(pl.col('failed')).then(fraction[1]).otherwise(fraction[0]).fill_null(1.0))
+    else:
+        sizes = sizes or {}
+        stratum_sizes = drives.group_by(strata).agg(pl.len().alias('stratum_size'))
+        allocations = []
+        for failed in [False, True]:
+            class_strata = stratum_sizes.filter(pl.col('failed') == failed)
+            allocations.append(_allocate(class_strata, _class_value(sizes, failed)))
+        quotas = pl.concat(allocations).select(strata + ['quota'])
+        sample = (drives
+                  .join(quotas, on=strata, how='left', nulls_equal=True)
+                  .filter(pl.col('sample_key').rank('ordinal').over(strata) <= pl.col('quota'))
+                  .drop('quota'))
+
+    index = sample.select(['serial_number'] + strata + ['count', 'sample_key']).sort(['failed', 'serial_number'])
+    if logger:
+        counts = index.group_by('failed').len().sort('failed')
+        logger.info(f"Sampled {index.height} of {summary.height} drives ({method}, seed {seed}): "
+                    f"{dict(zip(counts['failed'], counts['len']))} by failed")
+    return index
+
+
+def _allocate(class_strata: pl.DataFrame, size: Optional[int]) -> pl.DataFrame:
+    # Proportional allocation of `size` drives to the strata of one class (largest remainder method)
+    total = class_strata.get_column('stratum_size').sum()
+    if size is None or total == 0 or size >= total:
+        return class_strata.with_columns(pl.col('stratum_size').cast(pl.Int64).alias('quota'))
+    exact = class_strata.get_column('stratum_size').cast(pl.Float64) * size / total
+    quota = exact.floor().cast(pl.Int64)
+    remainder = size - quota.sum()
+    order = (exact - quota).arg_sort(descending=True)
+    bonus = pl.Series([0] * len(quota), dtype=pl.Int64).scatter(order[:remainder], 1)
+    return class_strata.with_columns((quota + bonus).alias('quota'))
+
+
+def assign_splits(index: pl.DataFrame, splits: Dict[str, float], seed: int = 1) -> pl.DataFrame:
+    """
+    Assign every sampled drive to a split (e.g. {"train": 0.8, "test": 0.2}) by its seeded hash key.
+
+    Splits are per drive, so the rows of one drive never end up in two splits. Use a different seed
+    than the sampling, so the split is independent of the sample selection.
+
+    Args:
+        index: Sample index from stratified_sample_drives
+        splits: Split name to fraction; fractions are normalized to sum to 1
+        seed: Seed of the split keys (default: 1)
+
+    Returns:
+        Index with a `split` column
+    """
+    total = sum(splits.values())
+    bounds, upper = [], 0.0
+    for name, fraction in splits.items():
+        upper += fraction / total
+        bounds.append((name, upper))
+    key = hash_key('serial_number', seed)
+    split = pl.when(key < bounds[0][1]).then(pl.lit(bounds[0][0]))
+    for name, upper in bounds[1:]:
+        split = split.when(key < upper).then(pl.lit(name))
+    return index.with_columns(split.otherwise(pl.lit(bounds[-1][0])).alias('split'))
+
+
+def save_sample_index(index: pl.DataFrame, path: Union[str, Path], provenance: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Save a sample index so later runs reuse the same drives instead of resampling.
+
+    Args:
+        index: Sample index
+        path: Parquet file to write
+        provenance: Optional JSON-serializable description of how the index was drawn, e.g. the sampling
+            parameters and a fingerprint of the source data; stored in the parquet metadata
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    metadata = {PROVENANCE_KEY: json.dumps(provenance, sort_keys=True, default=str)} if provenance is not None else None
+    index.write_parquet(path, metadata=metadata)
+
+
+def load_sample_index(path: Union[str, Path]) -> pl.DataFrame:
+    """Load a sample index written by save_sample_index."""
+    return pl.read_parquet(path)
+
+
+def sample_index_provenance(path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """Provenance saved with a sample index by save_sample_index, or None if it has none."""
+    provenance = pl.read_parquet_metadata(path).get(PROVENANCE_KEY)
+    return json.loads(provenance) if provenance is not None else None
+
+
+def apply_sample_index(df: pl.LazyFrame, index: pl.DataFrame, split: Optional[str] = None) -> pl.LazyFrame:
+    """
+    Restrict a frame to the rows of the sampled drives (optionally of one split), as a lazy semi-join.
+
+    Args:
+        df: LazyFrame containing hard drive data, e.g. a scan of the partitioned dataset
+        index: Sample index from stratified_sample_drives or load_sample_index
+        split: Optional split name (requires assign_splits)
+
+    Returns:
+        LazyFrame with the rows of the sampled drives
+    """
+    if split is not None:
+        index = index.filter(pl.col('split') == split)
+    serials = index.select(pl.col('serial_number').cast(df.collect_schema()['serial_number']))
+    return df.join(serials.lazy(), on='serial_number', how='semi')
+
+
+def sample_rows(
+    df: pl.LazyFrame,
+    sizes: Dict[int, Optional[int]],
+    label_column: str = "failure",
+    seed: int = 0,
+    identity: Optional[Sequence[str]] = None,
+    engine: str = "auto"
+) -> pl.LazyFrame:
+    """
+    Seeded row-level bottom-k sampling per class, e.g. to downsample the majority class.
+
+    Every row gets a seeded hash key of its identity columns; each class keeps the rows with the
+    `sizes[class]` smallest keys (all rows for None). Like hash_key, the key depends only on the row's
+    values, so the sample does not depend on row order or partitioning. One aggregation finds the key
+    threshold of every class, and the filter is applied lazily. Rows sharing the threshold key (e.g.
+    duplicate rows) are kept in their order up to the size, so a class never exceeds its size.
+
+    Args:
+        df: LazyFrame to sample
+        sizes: Number of rows to keep per label value (None keeps all rows of the label)
+        label_column: Column with the class label (default: "failure")
+        seed: Seed of the hash keys (default: 0)
+        identity: Columns identifying a row. Defaults to (serial_number, date) when the frame has them,
+            otherwise all columns
+        engine: Polars engine used for the threshold aggregation (default: "auto")
+
+    Returns:
+        LazyFrame with the sampled rows, in their original order
+    """
+    limited = {label: size for label, size in sizes.items() if size is not None}
+    if not limited:
+        return df
+    if identity is None:
+        names = df.collect_schema().names()
+        identity = ['serial_number', 'date'] if {'serial_number', 'date'} <= set(names) else names
+    keyed = df.with_columns(pl.struct(list(identity)).hash(seed=seed).alias('__key'))
+
+    aggregations = []
+    for label, size in limited.items():
+        keys = pl.col('__key').filter(pl.col(label_column) == label)
+        threshold = keys.bottom_k(size).max()
+        aggregations += [threshold.alias(f"{label}__threshold"), (keys < threshold).sum().alias(f"{label}__below")]
+    stats = keyed.select(aggregations).collect(engine=engine).row(0, named=True)
+
+    keep = pl.lit(True)
+    for label, size in limited.items():
+        threshold = stats[f"{label}__threshold"]
+        in_class = pl.col(label_column) == label
+        if threshold is None:
+            keep = keep & ~in_class
+            continue
+        # Ties at the threshold fill the remaining places of the class, in row order
+        at_threshold = in_class & (pl.col('__key') == threshold)
+        ties = at_threshold & (at_threshold.cum_sum() <= size - stats[f"{label}__below"])
+        keep = keep & (~in_class | (pl.col('__key') < threshold) | ties)
+    return keyed.filter(keep).drop('__key')
@@ -0,0 +1,318 @@
+import json
+import logging
+import math
+import numpy as np
+import polars as pl
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+SCALING_METHODS = ["standard", "minmax", "robust"]
+
+# Values closer to zero than this fall into the zero bucket of the quantile sketch
+_MIN_SKETCH_VALUE = 1e-9
+
+
+@dataclass
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy guarantees (DDSketch).
+
+    Values are counted in logarithmically sized buckets: bucket i of the positive (negative) store holds
+    values v with gamma^(i-1) < |v| <= gamma^i, where gamma = (1 + a) / (1 - a) for relative accuracy a.
+    Two sketches with the same accuracy are merged by adding their bucket counts, so sketches fitted on
+    shards or in other processes combine into exactly the sketch of the whole data.
+
+    Attributes:
+        relative_accuracy (float): Relative error bound of the quantile estimates.
+        positive (Dict[int, int]): Bucket counts of positive values.
+        negative (Dict[int, int]): Bucket counts of negative values, indexed by |v|.
+        zero (int): Number of values with |v| < 1e-9.
+    """
+    relative_accuracy: float = 0.01
+    positive: Dict[int, int] = field(default_factory=dict)
+    negative: Dict[int, int] = field(default_factory=dict)
+    zero: int = 0
+
+    @property
+    def gamma(self) -> float:
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    @property
+    def offset(self) -> int:
+        # Shifts every bucket index of |v| >= _MIN_SKETCH_VALUE above zero, so the sign can be encoded in one key
+        return 1 - math.ceil(math.log(_MIN_SKETCH_VALUE) / math.log(self.gamma))
+
+    @property
+    def count(self) -> int:
+        return self.zero + sum(self.positive.values()) + sum(self.negative.values())
+
+    def bucket_key_expr(self, column: str) -> pl.Expr:
+        """Signed bucket key of every non-null value of `column`: 0 for zero, +/-(index + offset) otherwise."""
+        value = pl.col(column).cast(pl.Float64).drop_nulls()
+        index = (value.abs().clip(_MIN_SKETCH_VALUE).log() / math.log(self.gamma)).ceil().cast(pl.Int64) + self.offset
+        return (pl.when(value.abs() < _MIN_SKETCH_VALUE)
+                .then(pl.lit(0, dtype=pl.Int64))
+                .otherwise(value.sign().cast(pl.Int64) * index)
+                .alias('bucket'))
+
+    def add_bucket_counts(self, bucket_counts: List[Dict[str, int]]) -> None:
+        """Add the output of bucket_key_expr(...).value_counts() to the sketch."""
+        for entry in bucket_counts:
+            key, count = entry['bucket'], entry['count']
+            if key == 0:
+                self.zero += count
+            elif key > 0:
+                self.positive[key - self.offset] = self.positive.get(key - self.offset, 0) + count
+            else:
+                self.negative[-key - self.offset] = self.negative.get(-key - self.offset, 0) + count
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Combine two sketches of the same accuracy into a new one."""
+        if not math.isclose(self.relative_accuracy, other.relative_accuracy):
+            raise ValueError("Quantile sketches with different relative accuracy cannot be merged")
+        merged = QuantileSketch(self.relative_accuracy, dict(self.positive), dict(self.negative), self.zero + other.zero)
+        for store, other_store in [(merged.positive, other.positive), (merged.negative, other.negative)]:
+            for index, count in other_store.items():
+                store[index] = store.get(index, 0) + count
+        return merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1); None for an empty sketch."""
+        total = self.count
+        if total == 0:
+            return None
+        # Buckets in ascending value order: large negative, ..., zero, ..., large positive
+        negative = sorted(self.negative, reverse=True)
+        positive = sorted(self.positive)
+        values = ([-self._bucket_value(index) for index in negative] + [0.0]
+                  + [self._bucket_value(index) for index in positive])
+        counts = [self.negative[index] for index in negative] + [self.zero] + [self.positive[index] for index in positive]
+        rank = q * (total - 1)
+        position = int(np.searchsorted(np.cumsum(counts), rank, side='right'))
+        return values[min(position, len(values) - 1)]
+
+    def _bucket_value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'positive': {str(index): count for index, count in self.positive.items()},
+            'negative': {str(index): count for index, count in self.negative.items()},
+            'zero': self.zero,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QuantileSketch':
+        return cls(
+            data['relative_accuracy'],
+            {int(index): count for index, count in data['positive'].items()},
+            {int(index): count for index, count in data['negative'].items()},
+            data['zero']
+        )
+
+
+@dataclass
+class ColumnStats:
+    """Streaming statistics of one column: count, mean, sum of squared deviations, min, max and a quantile sketch.
+
+    Attributes:
+        count (int): Number of non-null values.
+        mean (float): Mean of the non-null values.
+        m2 (float): Sum of squared deviations from the mean (count * population variance).
+        min (Optional[float]): Smallest value.
+        max (Optional[float]): Largest value.
+        sketch (QuantileSketch): Quantile sketch of the values.
+    """
+    count: int
+    mean: float
+    m2: float
+    min: Optional[float]
+    max: Optional[float]
+    sketch: QuantileSketch
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def merge(self, other: 'ColumnStats') -> 'ColumnStats':
+        """Combine the statistics of two disjoint parts of the data (Chan et al. parallel update)."""
+        if self.count == 0:
+            return ColumnStats(other.count, other.mean, other.m2, other.min, other.max, self.sketch.merge(other.sketch))
+        if other.count == 0:
+            return ColumnStats(self.count, self.mean, self.m2, self.min, self.max, self.sketch.merge(other.sketch))
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        return ColumnStats(
+            count=count,
+            mean=self.mean + delta * other.count / count,
+            m2=self.m2 + other.m2 + delta ** 2 * self.count * other.count / count,
+            min=min(self.min, other.min),
+            max=max(self.max, other.max),
+            sketch=self.sketch.merge(other.sketch)
+        )
+
+
+@dataclass
+class Scaler:
+    """Per-column scaling fitted with fit_scaler and applied lazily to frames or to sequence tensors.
+
+    Attributes:
+        method (str): One of SCALING_METHODS. "standard" scales to zero mean and unit variance, "minmax" to
+            [0, 1] and "robust" subtracts the median and divides by the interquartile range (from the sketch).
+        stats (Dict[str, ColumnStats]): Fitted statistics of every scaled column.
+    """
+    method: str
+    stats: Dict[str, ColumnStats]
+
+    def __post_init__(self):
+        if self.method not in SCALING_METHODS:
+            raise ValueError(f"Unknown scaling method '{self.method}', expected one of {SCALING_METHODS}")
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.stats)
+
+    def parameters(self) -> Dict[str, Dict[str, float]]:
+        """Center and scale of every column; columns without spread get scale 1."""
+        parameters = {}
+        for col, stats in self.stats.items():
+            if self.method == "standard":
+                center, scale = stats.mean, stats.std
+            elif self.method == "minmax":
+                center, scale = stats.min, (stats.max - stats.min) if stats.count else 0.0
+            else:
+                center = stats.sketch.quantile(0.5)
+                scale = stats.sketch.quantile(0.75) - stats.sketch.quantile(0.25) if stats.count else 0.0
+            parameters[col] = {'center': center or 0.0, 'scale': scale if scale else 1.0}
+        return parameters
+
+    def merge(self, other: 'Scaler') -> 'Scaler':
+        """Combine scalers fitted on disjoint parts of the data (e.g. serial shards or worker processes)."""
+        if self.method != other.method:
+            raise ValueError("Scalers with different methods cannot be merged")
+        stats = dict(self.stats)
+        for col, other_stats in other.stats.items():
+            stats[col] = stats[col].merge(other_stats) if col in stats else other_stats
+        return Scaler(self.method, stats)
+
+    def transform(self, df: pl.LazyFrame) -> pl.LazyFrame:
+        """
+        Scale the fitted columns of a frame as part of its lazy plan; other columns are left untouched.
+
+        Args:
+            df: LazyFrame with (a subset of) the fitted columns, e.g. a scan of the test data
+
+        Returns:
+            LazyFrame with the fitted columns scaled to Float64
+        """
+        names = set(df.collect_schema().names())
+        return df.with_columns([
+            ((pl.col(col).cast(pl.Float64) - params['center']) / params['scale']).alias(col)
+            for col, params in self.parameters().items() if col in names
+        ])
+
+    def transform_array(self, X: np.ndarray, feature_names: List[str]) -> np.ndarray:
+        """
+        Scale a feature tensor whose last axis follows `feature_names` (e.g. a batch of a SequenceStore).
+
+        Features without fitted statistics are left unchanged. The result keeps the dtype of X.
+
+        Args:
+            X: Array of shape (..., n_features)
+            feature_names: Names of the features along the last axis
+
+        Returns:
+            Scaled copy of X
+        """
+        parameters = self.parameters()
+        center = np.array([parameters[col]['center'] if col in parameters else 0.0 for col in feature_names])
+        scale = np.array([parameters[col]['scale'] if col in parameters else 1.0 for col in feature_names])
+        return ((X - center) / scale).astype(X.dtype, copy=False)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Persist the fitted statistics as JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({
+                'method': self.method,
+                'stats': {
+                    col: {'count': stats.count, 'mean': stats.mean, 'm2': stats.m2, 'min': stats.min,
+                          'max': stats.max, 'sketch': stats.sketch.to_dict()}
+                    for col, stats in self.stats.items()
+                },
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'Scaler':
+        """Load a scaler saved with save()."""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['method'], {
+            col: ColumnStats(stats['count'], stats['mean'], stats['m2'], stats['min'], stats['max'],
+                             QuantileSketch.from_dict(stats['sketch']))
+            for col, stats in data['stats'].items()
+        })
+
+
+def fit_scaler(
+    df: pl.LazyFrame,
+    columns: Optional[List[str]] = None,
+    method: str = "standard",
+    relative_accuracy: float = 0.01,
+    engine: str = "auto",
+    logger: logging.Logger = None
+) -> Scaler:
+    """
+    Fit scaling statistics of all columns in a single aggregation over the data.
+
+    Count, mean, variance, min, max and the bucket counts of the quantile sketch of every column are
+    computed by one select, so the frame is scanned once and can be run by the streaming engine. Fit on
+    every shard separately and combine with Scaler.merge to get the statistics of the union.
+
+    Args:
+        df: Input LazyFrame, typically the gap-filled training data
+        columns: Columns to fit. Defaults to all SMART columns (smart_*), matching build_sequences
+        method: Scaling method, one of SCALING_METHODS (default: "standard")
+        relative_accuracy: Relative accuracy of the quantile sketches (default: 0.01)
+        engine: Polars engine used to run the aggregation (default: "auto")
+        logger: Optional logger instance for logging
+
+    Returns:
+        Fitted Scaler
+    """
+    if columns is None:
+        columns = [col for col in df.collect_schema().names() if col.startswith("smart_")]
+    sketch = QuantileSketch(relative_accuracy)
+
+    row = df.select(
+        [pl.col(col).count().alias(f"{col}__count") for col in columns]
+        + [pl.col(col).cast(pl.Float64).mean().alias(f"{col}__mean") for col in columns]
+        + [pl.col(col).cast(pl.Float64).var(ddof=0).alias(f"{col}__var") for col in columns]
+        + [pl.col(col).cast(pl.Float64).min().alias(f"{col}__min") for col in columns]
+        + [pl.col(col).cast(pl.Float64).max().alias(f"{col}__max") for col in columns]
+        + [sketch.bucket_key_expr(col).value_counts().implode().alias(f"{col}__sketch") for col in columns]
+    ).collect(engine=engine).row(0, named=True)
+
+    stats = {}
+    for col in columns:
+        count = row[f"{col}__count"]
+        col_sketch = QuantileSketch(relative_accuracy)
+        col_sketch.add_bucket_counts(row[f"{col}__sketch"])
+        stats[col] = ColumnStats(
+            count=count,
+            mean=row[f"{col}__mean"] or 0.0,
+            m2=(row[f"{col}__var"] or 0.0) * count,
+            min=row[f"{col}__min"],
+            max=row[f"{col}__max"],
+            sketch=col_sketch
+        )
+
+    if logger:
+        logger.info(f"Fitted {method} scaling of {len(columns)} columns")
+    return Scaler(method, stats)
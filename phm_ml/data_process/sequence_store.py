@@ -0,0 +1,235 @@
+import json
+import queue
+import threading
+import numpy as np
+import polars as pl
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from phm_ml.data_process.scaling import Scaler
+from phm_ml.data_process.sequences import SequenceSet
+
+STORE_FILE = "store.json"
+
+
+def write_sequence_store(sequences: SequenceSet, directory: Union[str, Path]) -> 'SequenceStore':
+    """
+    Persist sequences as a memory-mappable store.
+
+    The store holds X.npy (the feature tensor), y.npy (labels), meta.parquet (serial_number and
+    end_date of every sequence) and store.json (feature names, shape and dtype).
+
+    Args:
+        sequences: Output of build_sequences
+        directory: Directory of the store
+
+    Returns:
+        SequenceStore opened on the written directory
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    np.save(directory / "X.npy", sequences.X)
+    np.save(directory / "y.npy", sequences.y)
+    pl.DataFrame({
+        'serial_number': sequences.serial_numbers.astype(str),
+        'end_date': sequences.end_dates,
+    }).write_parquet(directory / "meta.parquet")
+    with open(directory / STORE_FILE, 'w') as f:
+        json.dump({
+            'feature_names': sequences.feature_names,
+            'shape': list(sequences.X.shape),
+            'dtype': str(sequences.X.dtype),
+        }, f, indent=2)
+
+    return SequenceStore(directory)
+
+
+def merge_sequence_stores(sources: List[Union[str, Path]], directory: Union[str, Path]) -> 'SequenceStore':
+    """
+    Concatenate several stores (e.g. the partitions of run_parallel_pipeline) into one.
+
+    The merged tensor is written through a memory-mapped .npy file one source at a time, so memory use
+    is bounded by the largest source rather than the total.
+
+    Args:
+        sources: Directories of the stores to merge; all must have the same features
+        directory: Directory of the merged store
+
+    Returns:
+        SequenceStore opened on the merged directory
+    """
+    stores = [SequenceStore(source) for source in sources]
+    if not stores:
+        raise ValueError("No sequence stores to merge")
+    feature_names = stores[0].feature_names
+    if any(store.feature_names != feature_names for store in stores):
+        raise ValueError("Sequence stores have different features and cannot be merged")
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    total = sum(len(store) for store in stores)
+    X = np.lib.format.open_memmap(directory / "X.npy", mode='w+', dtype=stores[0].X.dtype,
+                                  shape=(total,) + stores[0].X.shape[1:])
+    offset = 0
+    for store in stores:
+        X[offset:offset + len(store)] = store.X
+        offset += len(store)
+    X.flush()
+    del X
+
+    np.save(directory / "y.npy", np.concatenate([store.y for store in stores]))
+    pl.concat([store.meta() for store in stores], how='vertical').write_parquet(directory / "meta.parquet")
+    with open(directory / STORE_FILE, 'w') as f:
+        json.dump({
+            'feature_names': feature_names,
+            'shape': [total] + list(stores[0].X.shape[1:]),
+            'dtype': str(stores[0].X.dtype),
+        }, f, indent=2)
+
+    return SequenceStore(directory)
+
+
+class SequenceStore:
+    """Read-only view of a sequence store; the feature tensor is memory-mapped, never loaded whole.
+
+    Args:
+        directory: Directory written by write_sequence_store or merge_sequence_stores
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        with open(self.directory / STORE_FILE, 'r') as f:
+            info = json.load(f)
+        self.feature_names: List[str] = info['feature_names']
+        self.X = np.load(self.directory / "X.npy", mmap_mode='r')
+        self.y = np.load(self.directory / "y.npy")
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    def meta(self) -> pl.DataFrame:
+        """serial_number and end_date of every sequence, in store order."""
+        return pl.read_parquet(self.directory / "meta.parquet")
+
+    def batches(self, batch_size: int = 256, **kwargs) -> 'BatchIterator':
+        """Shortcut for BatchIterator(self, batch_size, **kwargs)."""
+        return BatchIterator(self, batch_size, **kwargs)
+
+
+class BatchIterator:
+    """Iterate over a SequenceStore in batches with shuffling, class balancing and prefetching.
+
+    Each pass over the iterator is one epoch. Indices are drawn up front; each batch's indices are sorted
+    before reading so the memory-mapped tensor is read in page order, and a background thread keeps up to
+    `prefetch` batches ready while the training step runs.
+
+    Args:
+        store: Sequence store to read from
+        batch_size: Number of sequences per batch (default: 256)
+        shuffle: Shuffle the sequence order every epoch (default: True)
+        balanced: Draw every label equally often, sampling minority labels with replacement.
+            An epoch then has `epoch_size` sequences (default: False)
+        epoch_size: Number of sequences per epoch when balanced. Defaults to the store size
+        drop_last: Drop the last incomplete batch (default: False)
+        prefetch: Number of batches prepared ahead by the background thread; 0 disables it (default: 2)
+        seed: Seed of the shuffling and sampling; epoch e uses seed + e
+        scaler: Optional fitted Scaler applied to every batch as it is read, so the store stays unscaled
+    """
+
+    def __init__(
+        self,
+        store: SequenceStore,
+        batch_size: int = 256,
+        shuffle: bool = True,
+        balanced: bool = False,
+        epoch_size: Optional[int] = None,
+        drop_last: bool = False,
+        prefetch: int = 2,
+        seed: int = 0,
+        scaler: Optional[Scaler] = None
+    ):
+        self.store = store
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.balanced = balanced
+        self.epoch_size = epoch_size or len(store)
+        self.drop_last = drop_last
+        self.prefetch = prefetch
+        self.seed = seed
+        self.scaler = scaler
+        self.epoch = 0
+
+    def _epoch_indices(self, rng: np.random.Generator) -> np.ndarray:
+        if self.balanced:
+            labels = np.unique(self.store.y)
+            if not len(labels):
+                return np.empty(0, dtype=np.int64)
+            per_label = -(-self.epoch_size // len(labels))
+            pools = [np.flatnonzero(self.store.y == label) for label in labels]
+            indices = np.concatenate([rng.choice(pool, size=per_label, replace=per_label > len(pool))
+                                      for pool in pools])
+            rng.shuffle(indices)
+            return indices[:self.epoch_size]
+        indices = np.arange(len(self.store))
+        if self.shuffle:
+            rng.shuffle(indices)
+        return indices
+
+    def __len__(self) -> int:
+        size = self.epoch_size if self.balanced else len(self.store)
+        return size // self.batch_size if self.drop_last else -(-size // self.batch_size)
+
+    def _load(self, batch_indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        batch_indices = np.sort(batch_indices)
+        X = np.ascontiguousarray(self.store.X[batch_indices])
+        if self.scaler is not None:
+            X = self.scaler.transform_array(X, self.store.feature_names)
+        return X, self.store.y[batch_indices]
+
+    def _batch_indices(self) -> List[np.ndarray]:
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        indices = self._epoch_indices(rng)
+        return [indices[start:start + self.batch_size] for start in range(0, len(indices), self.batch_size)
+                if not self.drop_last or start + self.batch_size <= len(indices)]
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        batches = self._batch_indices()
+        if self.prefetch <= 0:
+            for batch_indices in batches:
+                yield self._load(batch_indices)
+            return
+
+        ready: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        done = object()
+
+        def worker():
+            try:
+                for batch_indices in batches:
+                    if stop.is_set():
+                        return
+                    ready.put(self._load(batch_indices))
+                ready.put(done)
+            except BaseException as error:  # surfaced in the consuming thread
+                ready.put(error)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock the worker if it is waiting on a full queue
+            while thread.is_alive():
+                try:
+                    ready.get_nowait()
+                except queue.Empty:
+                    thread.join(timeout=0.01)
@@ -0,0 +1,130 @@
+import logging
+import numpy as np
+import polars as pl
+from dataclasses import dataclass
+from typing import List, Optional
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+@dataclass
+class SequenceSet:
+    """Container for sliding-window sequences extracted from a gap-filled dataframe.
+
+    Attributes:
+        X (np.ndarray): Feature tensor of shape (n_sequences, sequence_length, n_features).
+        y (np.ndarray): Label of each sequence, taken `lookahead` rows after the window end.
+        serial_numbers (np.ndarray): Serial number of the drive each sequence comes from.
+        end_dates (np.ndarray): Date of the last row of each sequence.
+        feature_names (List[str]): Names of the feature columns, in tensor order.
+    """
+    X: np.ndarray
+    y: np.ndarray
+    serial_numbers: np.ndarray
+    end_dates: np.ndarray
+    feature_names: List[str]
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+
+def build_sequences(
+    df: pl.LazyFrame,
+    sequence_length: int,
+    lookahead: int,
+    stride: int = 1,
+    max_normal_seq: Optional[int] = None,
+    max_failed_seq: Optional[int] = None,
+    feature_columns: Optional[List[str]] = None,
+    label_column: str = "failure",
+    dtype: np.dtype = np.float32,
+    seed: int = 0,
+    logger: logging.Logger = None
+) -> SequenceSet:
+    """
+    Extract every sliding window of every drive into a contiguous 3D tensor.
+
+    The frame is sorted by (serial_number, date) so each drive is one contiguous block. Windows are
+    strided zero-copy views over that block; only the selected windows are copied into the output.
+    A window ending at row t is labelled with the value of `label_column` at row t + lookahead of the
+    same drive, so the last window of a failed drive ends `lookahead` rows before its failure.
+    Windows are aligned to the end of each drive so the last (failure) window is always kept.
+
+    Args:
+        df: Cleaned, gap-filled LazyFrame containing hard drive data
+        sequence_length: Length of each sequence
+        lookahead: Number of steps to look ahead
+        stride: Step between consecutive window ends of the same drive (default: 1)
+        max_normal_seq: Optional cap on the number of sequences labelled 0
+        max_failed_seq: Optional cap on the number of sequences labelled 1
+        feature_columns: Feature columns to extract. Defaults to all SMART columns
+        label_column: Column holding the target label (default: "failure")
+        dtype: Dtype of the feature tensor (default: float32)
+        seed: Seed for the random subsampling applied by the per-class caps
+        logger: Optional logger instance for logging
+
+    Returns:
+        SequenceSet with features, labels and serial/end-date metadata
+    """
+    if sequence_length < 1 or lookahead < 0 or stride < 1:
+        raise ValueError("sequence_length and stride must be >= 1 and lookahead >= 0")
+
+    if feature_columns is None:
+        feature_columns = [col for col in df.collect_schema().names() if col.startswith("smart_")]
+
+    data = (df
+            .select(['serial_number', 'date', label_column] + feature_columns)
+            .sort(['serial_number', 'date'])
+            .collect())
+
+    features = data.select(feature_columns).to_numpy().astype(dtype, copy=False)
+    labels = data[label_column].to_numpy()
+    serials = data['serial_number'].to_numpy()
+    dates = data['date'].to_numpy()
+    n_rows = data.height
+    del data
+
+    # Position of every row inside its drive's block and the size of that block
+    if n_rows:
+        block_start = np.flatnonzero(np.r_[True, serials[1:] != serials[:-1]])
+    else:
+        block_start = np.empty(0, dtype=np.int64)
+    block_len = np.diff(np.r_[block_start, n_rows])
+    row_pos = np.arange(n_rows) - np.repeat(block_start, block_len)
+    row_block_len = np.repeat(block_len, block_len)
+
+    # A window starting at row i is valid if it and its target row stay inside the drive
+    remaining = row_block_len - row_pos - sequence_length - lookahead
+    starts = np.flatnonzero((remaining >= 0) & (remaining % stride == 0))
+
+    ends = starts + sequence_length - 1
+    y = labels[ends + lookahead]
+
+    rng = np.random.default_rng(seed)
+    keep = []
+    for label, cap in ((0, max_normal_seq), (1, max_failed_seq)):
+        idx = np.flatnonzero(y == label)
+        if cap is not None and idx.size > cap:
+            idx = np.sort(rng.choice(idx, size=cap, replace=False))
+        keep.append(idx)
+    keep.append(np.flatnonzero((y != 0) & (y != 1)))
+    keep = np.sort(np.concatenate(keep))
+    starts, ends, y = starts[keep], ends[keep], y[keep]
+
+    if n_rows >= sequence_length:
+        # (n_rows - sequence_length + 1, n_features, sequence_length) view without copying
+        windows = sliding_window_view(features, sequence_length, axis=0)
+        X = np.ascontiguousarray(windows[starts].transpose(0, 2, 1))
+    else:
+        X = np.empty((0, sequence_length, len(feature_columns)), dtype=dtype)
+
+    if logger:
+        logger.info(f"Created {X.shape[0]} sequences of shape {X.shape[1:]} "
+                    f"({int((y == 1).sum())} failed, {int((y == 0).sum())} normal)")
+
+    return SequenceSet(
+        X=X,
+        y=y,
+        serial_numbers=serials[ends],
+        end_dates=dates[ends],
+        feature_names=feature_columns
+    )
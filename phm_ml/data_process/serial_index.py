@@ -0,0 +1,158 @@
+import logging
+import polars as pl
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+INDEX_FILE = "_serial_index.parquet"
+SORTED_FILE = "_sorted.parquet"
+
+
+def write_serial_indexed_parquet(
+    df: pl.LazyFrame,
+    output_directory: Union[str, Path],
+    rows_per_file: int = 16_384,
+    engine: str = "streaming",
+    logger: logging.Logger = None
+) -> 'SerialIndex':
+    """
+    Write hard drive data sorted by (serial_number, date) together with a serial-number index.
+
+    Whole serials are packed into parquet files of roughly `rows_per_file` rows: a serial is never
+    split across files and belongs to the file in which its first row falls. Every file is written as
+    a single row group, so row group boundaries are serial boundaries. The sidecar index maps each
+    serial to (file, offset, length).
+
+    The data is never collected: it is sunk once, sorted, into a temporary file, and every part file
+    is sunk from a slice of it. Data files of an earlier write to the same directory are removed first.
+
+    Args:
+        df: Input LazyFrame containing hard drive data
+        output_directory: Directory for the data files and the index
+        rows_per_file: Target number of rows per file and row group (default: 16,384)
+        engine: Polars engine used to sort and write the data (default: "streaming")
+        logger: Optional logger instance for logging
+
+    Returns:
+        SerialIndex over the written directory
+    """
+    output_directory = Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+    for stale in [*output_directory.glob("part-*.parquet"), output_directory / INDEX_FILE]:
+        stale.unlink(missing_ok=True)
+
+    sorted_file = output_directory / SORTED_FILE
+    df.sort(['serial_number', 'date']).sink_parquet(sorted_file, row_group_size=rows_per_file, engine=engine)
+
+    # Start offset and length of each serial's contiguous block
+    blocks = (pl.scan_parquet(sorted_file)
+              .group_by('serial_number')
+              .len('length')
+              .sort('serial_number')
+              .collect(engine=engine)
+              .with_columns((pl.col('length').cum_sum() - pl.col('length')).alias('start'))
+              .with_columns((pl.col('start') // rows_per_file).alias('part')))
+
+    files = (blocks
+             .group_by('part', maintain_order=True)
+             .agg(pl.col('start').min().alias('file_start'), pl.col('length').sum().alias('file_rows'))
+             .with_row_index('file_id'))
+
+    for file_id, file_start, file_rows in files.select(['file_id', 'file_start', 'file_rows']).iter_rows():
+        (pl.scan_parquet(sorted_file)
+         .slice(file_start, file_rows)
+         .sink_parquet(output_directory / f"part-{file_id:05d}.parquet", row_group_size=file_rows, engine=engine))
+    sorted_file.unlink()
+
+    index = (blocks
+             .join(files.select(['part', 'file_id', 'file_start']), on='part', how='left')
+             .select([
+                 pl.col('serial_number'),
+                 pl.format("part-{}.parquet", pl.col('file_id').cast(pl.String).str.zfill(5)).alias('file'),
+                 (pl.col('start') - pl.col('file_start')).alias('offset'),
+                 pl.col('length'),
+             ]))
+    index.write_parquet(output_directory / INDEX_FILE)
+
+    if logger:
+        logger.info(f"Wrote {blocks['length'].sum()} rows of {index.height} serials into {files.height} files "
+                    f"with serial index at {output_directory / INDEX_FILE}")
+
+    return SerialIndex(output_directory)
+
+
+class SerialIndex:
+    """Serial-number index over a directory written by write_serial_indexed_parquet.
+
+    The index is loaded into a dict once, so locating a drive is O(1). A single drive is read with a
+    sliced scan of its file; several drives with one filtered scan over only the files holding them.
+
+    Args:
+        directory: Directory containing the data files and the `_serial_index.parquet` sidecar
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        index = pl.read_parquet(self.directory / INDEX_FILE)
+        self._locations: Dict[str, Tuple[str, int, int]] = {
+            serial: (file, offset, length)
+            for serial, file, offset, length in index.iter_rows()
+        }
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, serial: str) -> bool:
+        return serial in self._locations
+
+    @property
+    def serials(self) -> List[str]:
+        """All indexed serial numbers, in storage order."""
+        return list(self._locations)
+
+    def locate(self, serial: str) -> Tuple[str, int, int]:
+        """Return (file, offset, length) of a serial; raises KeyError if unknown."""
+        return self._locations[serial]
+
+    def read_serial(self, serial: str, columns: Optional[List[str]] = None) -> pl.DataFrame:
+        """
+        Read all rows of one drive, sorted by date.
+
+        Args:
+            serial: Serial number of the drive
+            columns: Optional subset of columns to read
+
+        Returns:
+            DataFrame with the rows of the drive
+        """
+        file, offset, length = self.locate(serial)
+        scan = pl.scan_parquet(self.directory / file)
+        if columns is not None:
+            scan = scan.select(columns)
+        return scan.slice(offset, length).collect()
+
+    def read_serials(self, serials: Iterable[str], columns: Optional[List[str]] = None) -> pl.DataFrame:
+        """
+        Read the rows of several drives with one scan over the files that hold them.
+
+        Args:
+            serials: Serial numbers of the drives; unknown serials raise KeyError
+            columns: Optional subset of columns to read
+
+        Returns:
+            DataFrame with the rows of the drives, sorted by (serial_number, date)
+        """
+        serials = sorted(set(serials))
+        # Files in storage order, so the filtered scan keeps (serial_number, date) order
+        files = sorted({self.locate(serial)[0] for serial in serials})
+        if not files:
+            return self.scan().select(columns or pl.all()).head(0).collect()
+
+        scan = (pl.scan_parquet([self.directory / file for file in files])
+                .filter(pl.col('serial_number').is_in(serials)))
+        if columns is not None:
+            scan = scan.select(columns)
+        return scan.collect()
+
+    def scan(self) -> pl.LazyFrame:
+        """Lazily scan the whole indexed dataset."""
+        return pl.scan_parquet(self.directory / "part-*.parquet")
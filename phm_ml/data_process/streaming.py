@@ -0,0 +1,88 @@
+import logging
+import math
+import shutil
+import polars as pl
+from pathlib import Path
+from typing import Callable, Union
+
+from phm_ml.utils.memory import estimate_row_bytes, log_peak_rss, track_peak_rss
+
+
+def estimate_frame_bytes(df: pl.LazyFrame) -> int:
+    """
+    Estimate the in-memory size of a LazyFrame from its schema and row count.
+
+    The row count of a parquet scan is answered from the file metadata, so this does not read the data.
+    Variable-width columns (strings) are counted as 16 bytes per value.
+
+    Args:
+        df: Input LazyFrame
+
+    Returns:
+        Estimated size in bytes
+    """
+    row_bytes = estimate_row_bytes(df.collect_schema())
+    num_rows = df.select(pl.len()).collect(engine="streaming").item()
+    return num_rows * row_bytes
+
+
+def plan_num_shards(df: pl.LazyFrame, memory_budget_gb: float, overhead: float = 4.0) -> int:
+    """
+    Choose the number of serial-hash shards so that one shard fits in the memory budget.
+
+    Args:
+        df: Input LazyFrame
+        memory_budget_gb: Memory budget in GB
+        overhead: Peak memory of a stage relative to the size of its input (joins, sorts, copies)
+
+    Returns:
+        Number of shards (at least 1)
+    """
+    budget = memory_budget_gb * 1024 ** 3
+    return max(1, math.ceil(estimate_frame_bytes(df) * overhead / budget))
+
+
+def run_sharded(
+    df: pl.LazyFrame,
+    stage: Callable[[pl.LazyFrame], pl.LazyFrame],
+    spill_directory: Union[str, Path],
+    num_shards: int,
+    stage_name: str = "stage",
+    engine: str = "streaming",
+    memory_budget_gb: float = None,
+    logger: logging.Logger = None
+) -> pl.LazyFrame:
+    """
+    Run a per-serial stage over serial-hash shards and spill each shard's output to disk.
+
+    All stages of the Backblaze pipeline (cleaning, gap filling, windowing) only combine rows of the
+    same serial, so running them on disjoint sets of serials gives the same result as one global run
+    while only one shard is in memory at a time.
+
+    Args:
+        df: Input LazyFrame containing hard drive data
+        stage: Function mapping a LazyFrame to the stage output, e.g. lambda lf: fix_date_gaps(lf)
+        spill_directory: Directory for the spilled shard outputs; it is emptied first
+        num_shards: Number of shards, e.g. from plan_num_shards
+        stage_name: Name of the stage used for the spill files and logging
+        engine: Polars engine used to execute each shard (default: "streaming")
+        memory_budget_gb: Optional memory budget in GB, only used to flag shards whose peak RSS exceeds it
+        logger: Optional logger instance for logging
+
+    Returns:
+        LazyFrame scanning the spilled output of all shards
+    """
+    spill_directory = Path(spill_directory) / stage_name
+    if spill_directory.exists():
+        shutil.rmtree(spill_directory)
+    spill_directory.mkdir(parents=True)
+
+    for shard in range(num_shards):
+        shard_df = df.filter(pl.col('serial_number').hash(seed=0) % num_shards == shard) if num_shards > 1 else df
+        # The peak is reset per shard, so each shard is checked against the budget on its own
+        with track_peak_rss() as tracker:
+            stage(shard_df).sink_parquet(spill_directory / f"shard-{shard:04d}.parquet", engine=engine)
+        if logger:
+            log_peak_rss(logger, f"{stage_name} shard {shard + 1}/{num_shards}", memory_budget_gb, peak=tracker.peak)
+
+    return pl.scan_parquet(spill_directory / "shard-*.parquet")
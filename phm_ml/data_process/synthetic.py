@@ -0,0 +1,172 @@
+import logging
+import numpy as np
+import polars as pl
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+# SMART attributes with a column in the Backblaze 2017 daily files, in file order
+BACKBLAZE_SMART_IDS = [
+    1, 2, 3, 4, 5, 7, 8, 9, 10, 11, 12, 13, 15, 22, 183, 184, 187, 188, 189, 190, 191, 192, 193, 194,
+    195, 196, 197, 198, 199, 200, 201, 220, 222, 223, 224, 225, 226, 240, 241, 242, 250, 251, 252, 254, 255,
+]
+
+# Attributes reported by the ST4000DM000; the other columns are null, as in the real files
+REPORTED_SMART_IDS = [1, 3, 4, 5, 7, 9, 10, 12, 183, 184, 187, 188, 189, 190, 191, 192, 193, 194, 197, 198,
+                      199, 240, 241, 242]
+
+# How the raw value of a reported attribute evolves: power-on hours, slowly growing counters,
+# large noisy rates, temperatures, or error counts that ramp up before a failure
+SMART_KINDS = {
+    1: "noise", 7: "noise", 195: "noise",
+    9: "hours", 240: "hours",
+    4: "counter", 12: "counter", 192: "counter", 193: "counter", 241: "counter", 242: "counter",
+    190: "temperature", 194: "temperature",
+}
+
+MODEL_CAPACITY_BYTES = {
+    "ST4000DM000": 4000787030016,
+    "ST8000DM002": 8001563222016,
+    "HGST HMS5C4040BLE640": 4000787030016,
+    "ST12000NM0007": 12000138625024,
+}
+
+
+def generate_fleet(
+    num_serials: int = 1000,
+    num_days: int = 90,
+    failure_rate: float = 0.02,
+    missing_day_rate: float = 0.01,
+    models: Union[Sequence[str], Dict[str, float]] = ("ST4000DM000",),
+    smart_ids: Optional[List[int]] = None,
+    start_date: date = date(2017, 1, 1),
+    late_join_rate: float = 0.05,
+    date_as_string: bool = False,
+    seed: int = 0,
+    logger: logging.Logger = None
+) -> pl.DataFrame:
+    """
+    Generate a synthetic Backblaze-shaped fleet with the column layout of the daily files.
+
+    Columns are date, serial_number, model, capacity_bytes, failure and smart_N_normalized /
+    smart_N_raw for every id in `smart_ids`. Attributes outside REPORTED_SMART_IDS are all null.
+    Every drive reports daily from its first day until the end of the period, or until its failure
+    day, whose row has failure = 1. Error counters (e.g. SMART 5/187/197/198) of failing drives
+    ramp up over the weeks before the failure. Missing days are dropped at random, except for the
+    first and last row of each drive. Everything is drawn from one seeded generator, so the same
+    arguments always give the same frame.
+
+    Args:
+        num_serials: Number of drives in the fleet (default: 1000)
+        num_days: Number of days in the period (default: 90)
+        failure_rate: Fraction of drives failing during the period (default: 0.02)
+        missing_day_rate: Fraction of daily rows dropped (default: 0.01)
+        models: Drive models, or a mapping of model to fleet share (default: ST4000DM000 only)
+        smart_ids: SMART attributes with columns. Defaults to BACKBLAZE_SMART_IDS
+        start_date: First day of the period (default: 2017-01-01)
+        late_join_rate: Fraction of drives installed during the first half of the period (default: 0.05)
+        date_as_string: Emit dates as "YYYY-MM-DD" strings like the raw CSV files (default: False)
+        seed: Seed of the generator (default: 0)
+        logger: Optional logger instance for logging
+
+    Returns:
+        DataFrame sorted by date and serial_number
+    """
+    rng = np.random.default_rng(seed)
+    smart_ids = BACKBLAZE_SMART_IDS if smart_ids is None else smart_ids
+    if not isinstance(models, dict):
+        models = {model: 1.0 for model in models}
+    model_names = list(models)
+    shares = np.array(list(models.values()), dtype=float)
+
+    # Per-drive life: first day, last day and whether the last day is a failure
+    drive_model = rng.choice(len(model_names), size=num_serials, p=shares / shares.sum())
+    first_day = np.where(rng.random(num_serials) < late_join_rate, rng.integers(0, max(num_days // 2, 1), num_serials), 0)
+    failed = rng.random(num_serials) < failure_rate
+    last_day = np.full(num_serials, num_days - 1)
+    last_day[failed] = rng.integers(first_day[failed], num_days)
+
+    # One row per drive and day of its life
+    life = last_day - first_day + 1
+    serial = np.repeat(np.arange(num_serials), life)
+    day = np.arange(serial.size) - np.repeat(np.cumsum(life) - life, life) + first_day[serial]
+    boundary = (day == first_day[serial]) | (day == last_day[serial])
+    keep = boundary | (rng.random(serial.size) >= missing_day_rate)
+    serial, day = serial[keep], day[keep]
+    failure = (failed[serial] & (day == last_day[serial])).astype(np.int64)
+    rows = serial.size
+
+    columns = {
+        'date': pl.Series(day + (start_date - date(1970, 1, 1)).days).cast(pl.Int32).cast(pl.Date),
+        'serial_number': pl.Series(serial).cast(pl.String).str.zfill(7),
+        'model': pl.Series(model_names, dtype=pl.String).gather(drive_model[serial]),
+        'capacity_bytes': pl.Series([MODEL_CAPACITY_BYTES.get(model, MODEL_CAPACITY_BYTES["ST4000DM000"])
+                                     for model in model_names], dtype=pl.Int64).gather(drive_model[serial]),
+        'failure': failure,
+    }
+    # Error counters ramp up over the last 30 days of failing drives
+    days_to_failure = np.where(failed[serial], last_day[serial] - day, num_days + 30)
+    ramp = np.clip(30 - days_to_failure, 0, None).astype(float)
+    age_days = day.astype(float) + rng.integers(0, 1500, num_serials)[serial]
+
+    reported = set(REPORTED_SMART_IDS)
+    for smart_id in smart_ids:
+        if smart_id not in reported:
+            columns[f"smart_{smart_id}_normalized"] = pl.Series([None] * rows, dtype=pl.Float64)
+            columns[f"smart_{smart_id}_raw"] = pl.Series([None] * rows, dtype=pl.Float64)
+            continue
+        kind = SMART_KINDS.get(smart_id, "error")
+        if kind == "hours":
+            raw = age_days * 24 + rng.integers(0, 24, rows)
+            normalized = np.clip(100 - raw // 8760, 1, 100)
+        elif kind == "counter":
+            rate = rng.gamma(2.0, 2.0 if smart_id < 240 else 5e7, num_serials)
+            raw = np.floor(age_days * rate[serial])
+            normalized = np.full(rows, 100.0)
+        elif kind == "noise":
+            raw = rng.integers(0, 2 ** 28, rows).astype(float)
+            normalized = rng.integers(100, 120, rows).astype(float)
+        elif kind == "temperature":
+            raw = np.round(rng.normal(24, 3, num_serials)[serial] + rng.normal(0, 1, rows) + ramp / 10)
+            normalized = raw if smart_id == 194 else 100 - raw
+        else:
+            # Error counts: constant for a few healthy drives, ramping up quadratically before a failure
+            base = np.where(rng.random(num_serials) < 0.05, rng.poisson(8, num_serials), 0)[serial]
+            severity = rng.gamma(1.0, 0.5, num_serials)[serial]
+            raw = base + np.floor(severity * ramp ** 2)
+            normalized = np.clip(100 - np.log1p(raw) * 5, 1, 100)
+        columns[f"smart_{smart_id}_normalized"] = normalized.astype(float)
+        columns[f"smart_{smart_id}_raw"] = raw.astype(float)
+
+    df = (pl.DataFrame(columns)
+          .with_columns(("Z" + pl.col('serial_number')).alias('serial_number'))
+          .sort(['date', 'serial_number']))
+    if date_as_string:
+        df = df.with_columns(pl.col('date').dt.strftime("%Y-%m-%d"))
+
+    if logger:
+        logger.info(f"Generated {num_serials} drives over {num_days} days: {df.height} rows, "
+                    f"{int(failed.sum())} failures")
+    return df
+
+
+def write_daily_csv(df: pl.DataFrame, directory: Union[str, Path]) -> List[Path]:
+    """
+    Write a fleet as one CSV per day (`<directory>/YYYY-MM-DD.csv`), the layout of the Backblaze downloads.
+
+    Args:
+        df: Frame from generate_fleet
+        directory: Output directory, e.g. `data_Q1_2017`
+
+    Returns:
+        Paths of the written files, in date order
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    df = df.with_columns(pl.col('date').cast(pl.String))
+    paths = []
+    for (day,), day_df in df.partition_by('date', as_dict=True, maintain_order=True).items():
+        path = directory / f"{day}.csv"
+        day_df.write_csv(path)
+        paths.append(path)
+    return sorted(paths)
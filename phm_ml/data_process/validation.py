@@ -0,0 +1,262 @@
+import json
+import logging
+import polars as pl
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+VALIDATION_CHECKS = ["duplicate_rows", "post_failure_rows", "model_changes", "decreasing_counters"]
+VALIDATION_ACTIONS = ["report", "dedupe", "quarantine"]
+
+# Lifetime counters that never decrease on a healthy reporting path: start/stop count, reallocated sectors,
+# power-on hours, power cycles, reported uncorrectable errors, retract and load cycles, UDMA CRC errors,
+# head flying hours and total LBAs written / read
+CUMULATIVE_SMART_IDS = [4, 5, 9, 12, 187, 192, 193, 199, 240, 241, 242]
+
+VIOLATIONS_FILE = "violations.parquet"
+SUMMARY_FILE = "summary.json"
+
+
+@dataclass
+class ValidationReport:
+    """Result of validate_telemetry.
+
+    Attributes:
+        summary (Dict[str, Any]): Rows and serials checked, the total of every check and the decreasing
+            steps per counter column.
+        violations (pl.DataFrame): One row per serial failing any check, with its row count, the
+            count of every check of VALIDATION_CHECKS and the comma-separated decreasing_columns.
+    """
+    summary: Dict[str, Any]
+    violations: pl.DataFrame
+
+    def serials(self, checks: Optional[Sequence[str]] = None) -> pl.Series:
+        """
+        Serials failing any of `checks` (default: all of VALIDATION_CHECKS).
+
+        Args:
+            checks: Checks to consider, a subset of VALIDATION_CHECKS
+
+        Returns:
+            Series of serial numbers
+        """
+        checks = VALIDATION_CHECKS if checks is None else list(checks)
+        unknown = [check for check in checks if check not in VALIDATION_CHECKS]
+        if unknown:
+            raise ValueError(f"Unknown checks {unknown}, expected some of {VALIDATION_CHECKS}")
+        failing = pl.any_horizontal([pl.col(check) > 0 for check in checks])
+        return self.violations.filter(failing).get_column('serial_number')
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Write the violations as parquet and the summary as JSON."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.violations.write_parquet(directory / VIOLATIONS_FILE)
+        with open(directory / SUMMARY_FILE, 'w') as f:
+            json.dump(self.summary, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> 'ValidationReport':
+        """Load a report written by save()."""
+        directory = Path(directory)
+        with open(directory / SUMMARY_FILE, 'r') as f:
+            summary = json.load(f)
+        return cls(summary, pl.read_parquet(directory / VIOLATIONS_FILE))
+
+
+def validate_telemetry(
+    df: pl.LazyFrame,
+    counter_columns: Optional[List[str]] = None,
+    engine: str = "auto",
+    logger: logging.Logger = None
+) -> ValidationReport:
+    """
+    Run every data-quality check in one pass over the data.
+
+    The rows are sorted once by (serial_number, date) and compared with the previous row of the same
+    serial; one grouped aggregation then counts per serial:
+    - duplicate_rows: rows with the same date as the previous row
+    - post_failure_rows: rows dated after the first failure (failure = 1)
+    - model_changes: rows whose model differs from the previous row
+    - decreasing_counters: readings of the cumulative SMART counters below the previous day's reading
+      (rows next to a null reading are not compared)
+
+    Checks whose columns are missing (failure, model, the counters) are skipped. Only the serials
+    failing a check are kept, so the report stays small for mostly clean data.
+
+    Args:
+        df: Input LazyFrame containing hard drive data, e.g. a scan of the interim parquet file
+        counter_columns: Cumulative counters to check. Defaults to the raw columns of CUMULATIVE_SMART_IDS
+        engine: Polars engine used to run the aggregation (default: "auto", or "streaming")
+        logger: Optional logger instance for logging
+
+    Returns:
+        ValidationReport with the summary and the per-serial violations
+    """
+    schema = df.collect_schema()
+    if counter_columns is None:
+        counter_columns = [f"smart_{smart_id}_raw" for smart_id in CUMULATIVE_SMART_IDS]
+    counter_columns = [col for col in counter_columns if col in schema]
+    has_failure, has_model = 'failure' in schema, 'model' in schema
+
+    # Comparing neighbouring rows of the sorted data is several times faster than sorting every
+    # counter within its group
+    same_serial = pl.col('serial_number') == pl.col('serial_number').shift()
+    same_date = pl.col('date') == pl.col('date').shift()
+    flags = [(same_serial & same_date).alias('__duplicate')]
+    if has_model:
+        flags.append((same_serial & (pl.col('model') != pl.col('model').shift())).alias('__model_change'))
+    flags += [(same_serial & ~same_date & (pl.col(col).diff() < 0)).alias(f"{col}__decreasing")
+              for col in counter_columns]
+
+    aggregations = [pl.len().alias('rows'), pl.col('__duplicate').sum().alias('duplicate_rows')]
+    if has_failure:
+        failure_date = pl.col('date').filter(pl.col('failure') == 1).min()
+        aggregations.append((pl.col('date') > failure_date).sum().alias('post_failure_rows'))
+    else:
+        aggregations.append(pl.lit(0, dtype=pl.UInt32).alias('post_failure_rows'))
+    if has_model:
+        aggregations.append(pl.col('__model_change').sum().alias('model_changes'))
+    else:
+        aggregations.append(pl.lit(0, dtype=pl.UInt32).alias('model_changes'))
+    decreasing = [f"{col}__decreasing" for col in counter_columns]
+    aggregations += [pl.col(col).sum() for col in decreasing]
+
+    per_serial = (df
+                  .select(['serial_number', 'date'] + (['failure'] if has_failure else []) + (['model'] if has_model else [])
+                          + counter_columns)
+                  .sort(['serial_number', 'date'])
+                  .select(['serial_number', 'date'] + (['failure'] if has_failure else []) + flags)
+                  .group_by('serial_number')
+                  .agg(aggregations)
+                  .collect(engine=engine))
+
+    per_serial = per_serial.with_columns(
+        pl.sum_horizontal([pl.col(col) for col in decreasing] or [pl.lit(0)]).cast(pl.UInt32).alias('decreasing_counters')
+    )
+    violations = per_serial.filter(
+        (pl.col('duplicate_rows') > 0) | (pl.col('post_failure_rows') > 0)
+        | (pl.col('model_changes') > 0) | (pl.col('decreasing_counters') > 0)
+    )
+    decreasing_columns = pl.concat_str(
+        [pl.when(pl.col(f"{col}__decreasing") > 0).then(pl.lit(col)) for col in counter_columns]
+        or [pl.lit(None, dtype=pl.String)], separator=",", ignore_nulls=True
+    )
+    violations = violations.select(
+        ['serial_number', 'rows'] + VALIDATION_CHECKS
+        + [pl.when(decreasing_columns != "").then(decreasing_columns).alias('decreasing_columns')]
+    ).sort('serial_number')
+
+    totals = per_serial.select(
+        pl.col('rows').sum(), pl.len().alias('serials'),
+        *[pl.col(check).sum() for check in VALIDATION_CHECKS],
+        *[pl.col(col).sum().alias(col[:-len('__decreasing')]) for col in decreasing]
+    ).row(0, named=True)
+    summary = {
+        'rows': totals['rows'],
+        'serials': totals['serials'],
+        'serials_with_violations': violations.height,
+        **{check: totals[check] for check in VALIDATION_CHECKS},
+        'decreasing_by_column': {col: totals[col] for col in counter_columns if totals[col]},
+    }
+
+    if logger:
+        logger.info(f"Validated {summary['rows']} rows of {summary['serials']} serials: "
+                    f"{summary['duplicate_rows']} duplicate rows, {summary['post_failure_rows']} post-failure rows, "
+                    f"{summary['model_changes']} model changes, "
+                    f"{summary['decreasing_counters']} decreasing counter readings")
+    return ValidationReport(summary, violations)
+
+
+def deduplicate_rows(df: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Keep one row per (serial_number, date), preferring a failure row and then the last row in file order.
+
+    Args:
+        df: Input LazyFrame containing hard drive data
+
+    Returns:
+        LazyFrame without duplicate (serial_number, date) rows. With a failure column the rows come
+        sorted by (serial_number, date), otherwise in the original order
+    """
+    if 'failure' in df.collect_schema():
+        df = df.sort(['serial_number', 'date', 'failure'], maintain_order=True)
+    return df.unique(subset=['serial_number', 'date'], keep='last', maintain_order=True)
+
+
+def drop_post_failure_rows(df: pl.LazyFrame) -> pl.LazyFrame:
+    """Drop the rows of every serial that are dated after its first failure."""
+    failure_date = pl.col('date').filter(pl.col('failure') == 1).min().over('serial_number')
+    return df.filter(failure_date.is_null() | (pl.col('date') <= failure_date))
+
+
+def quarantine_serials(
+    df: pl.LazyFrame,
+    report: ValidationReport,
+    checks: Optional[Sequence[str]] = None
+) -> Tuple[pl.LazyFrame, pl.LazyFrame]:
+    """
+    Split the data into the serials passing the checks and the quarantined ones.
+
+    Args:
+        df: Input LazyFrame containing hard drive data
+        report: Report of validate_telemetry for df
+        checks: Checks leading to quarantine (default: all of VALIDATION_CHECKS)
+
+    Returns:
+        Tuple of (clean rows, quarantined rows) as LazyFrames
+    """
+    serials = report.serials(checks).to_frame().lazy()
+    serials = serials.select(pl.col('serial_number').cast(df.collect_schema()['serial_number']))
+    return (df.join(serials, on='serial_number', how='anti'),
+            df.join(serials, on='serial_number', how='semi'))
+
+
+def apply_validation(
+    df: pl.LazyFrame,
+    report: ValidationReport,
+    action: str = "report",
+    quarantine_file: Optional[Union[str, Path]] = None,
+    logger: logging.Logger = None
+) -> pl.LazyFrame:
+    """
+    Apply a validation action to the data.
+
+    - "report": leave the data unchanged
+    - "dedupe": drop duplicate (serial_number, date) rows and rows after a failure; serials with model
+      changes or decreasing counters are kept, since their rows cannot be repaired by dropping rows
+    - "quarantine": drop every serial failing a check, optionally writing its rows to `quarantine_file`
+
+    Args:
+        df: Input LazyFrame containing hard drive data
+        report: Report of validate_telemetry for df
+        action: One of VALIDATION_ACTIONS (default: "report")
+        quarantine_file: Optional parquet file for the quarantined rows
+        logger: Optional logger instance for logging
+
+    Returns:
+        LazyFrame with the action applied
+    """
+    if action not in VALIDATION_ACTIONS:
+        raise ValueError(f"Unknown validation action '{action}', expected one of {VALIDATION_ACTIONS}")
+    if action == "report" or report.violations.is_empty():
+        return df
+
+    if action == "dedupe":
+        if report.summary['duplicate_rows']:
+            df = deduplicate_rows(df)
+        if report.summary['post_failure_rows']:
+            df = drop_post_failure_rows(df)
+        if logger:
+            logger.info(f"Dropping {report.summary['duplicate_rows']} duplicate and "
+                        f"{report.summary['post_failure_rows']} post-failure rows")
+        return df
+
+    clean, quarantined = quarantine_serials(df, report)
+    if quarantine_file is not None:
+        quarantine_file = Path(quarantine_file)
+        quarantine_file.parent.mkdir(parents=True, exist_ok=True)
+        quarantined.sink_parquet(quarantine_file)
+    if logger:
+        logger.info(f"Quarantined {report.violations.height} of {report.summary['serials']} serials")
+    return clean
@@ -0,0 +1,252 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import polars as pl
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+
+def fingerprint_file(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Fingerprint an input file without reading its data.
+
+    Args:
+        path: Path to the input file
+
+    Returns:
+        Dictionary with the resolved path, size and modification time; for parquet files also the
+        schema and row count taken from the footer metadata
+    """
+    path = Path(path)
+    stat = path.stat()
+    fingerprint = {'path': str(path.resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if path.suffix == '.parquet':
+        fingerprint['schema'] = {k: str(v) for k, v in pl.read_parquet_schema(path).items()}
+        fingerprint['num_rows'] = pl.scan_parquet(path).select(pl.len()).collect().item()
+    return fingerprint
+
+
+def code_version(functions: Iterable[Callable]) -> str:
+    """Hash the source code of the functions implementing a stage."""
+    digest = hashlib.sha256()
+    for function in functions:
+        digest.update(inspect.getsource(function).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class StageCache:
+    """Content-addressed on-disk cache for pipeline stage outputs.
+
+    Each entry is an Arrow IPC file named after a hash of the stage name, the fingerprints of its input
+    files, the keys of upstream entries, its parameters and the source code of the functions that
+    compute it. Changing any of them yields a new key, so stale entries are never read; they age out
+    through LRU eviction once the cache exceeds `max_size_gb`.
+
+    Entries written or read through this instance are pinned: evict() never deletes them, since scans
+    returned earlier may still reference them, even when a single entry exceeds the budget. Nothing is
+    evicted on write; Pipeline.run calls evict() once the run is over, other callers call it when they
+    are done, and release() unpins the entries.
+
+    DataFrame outputs are read back as DataFrames. LazyFrame outputs are streamed to disk (sink) and
+    read back as scans, so a large stage output never has to fit in memory. A stage that writes its
+    output as parquet files itself (e.g. spilled shards) writes them to parts_path() and commits the
+    directory with commit_parts(), so the files become the entry without being written again.
+
+    Args:
+        directory: Directory holding the cache entries
+        max_size_gb: Size budget of the cache in GB (default: 20)
+        logger: Optional logger instance for hit/miss logging. Defaults to the "phm_ml" logger
+    """
+
+    def __init__(self, directory: Union[str, Path], max_size_gb: float = 20, logger: logging.Logger = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_size_gb * 1024 ** 3)
+        self.logger = logger or logging.getLogger("phm_ml")
+        self._pinned: Set[Path] = set()
+
+    def key(
+        self,
+        stage: str,
+        inputs: Iterable[Union[str, Path]] = (),
+        params: Optional[Dict[str, Any]] = None,
+        code: Iterable[Callable] = (),
+        upstream: Iterable[str] = ()
+    ) -> str:
+        """
+        Compute the cache key of a stage.
+
+        Args:
+            stage: Stage name
+            inputs: Input files read by the stage
+            params: JSON-serializable parameters of the stage
+            code: Functions implementing the stage; their source code is part of the key
+            upstream: Keys of the cache entries the stage consumes
+
+        Returns:
+            Hex digest identifying the stage output
+        """
+        payload = {
+            'stage': stage,
+            'inputs': [fingerprint_file(path) for path in inputs],
+            'params': params or {},
+            'code': code_version(code),
+            'upstream': list(upstream),
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _entry_path(self, stage: str, key: str, lazy: bool = False) -> Path:
+        return self.directory / f"{stage}-{key[:24]}{'.scan' if lazy else ''}.arrow"
+
+    def _parts_entry_path(self, stage: str, key: str) -> Path:
+        return self.directory / f"{stage}-{key[:24]}.parts"
+
+    def _find_entry(self, stage: str, key: str) -> Optional[Path]:
+        for entry in [self._entry_path(stage, key), self._entry_path(stage, key, lazy=True),
+                      self._parts_entry_path(stage, key)]:
+            if entry.exists():
+                return entry
+        return None
+
+    @staticmethod
+    def _entry_size(entry: Path) -> int:
+        if entry.is_dir():
+            return sum(p.stat().st_size for p in entry.rglob("*") if p.is_file())
+        return entry.stat().st_size
+
+    def contains(self, stage: str, key: str) -> bool:
+        """Whether the cache holds an entry for the stage and key, without reading it."""
+        return self._find_entry(stage, key) is not None
+
+    def get(self, stage: str, key: str) -> Optional[Union[pl.DataFrame, pl.LazyFrame]]:
+        """
+        Return the cached output of a stage, or None on a miss. A hit refreshes the entry's LRU time
+        and pins the entry.
+
+        Outputs stored from a DataFrame are read into memory; outputs sunk from a LazyFrame or
+        committed as parquet files are returned as a scan of the entry.
+        """
+        entry = self._find_entry(stage, key)
+        if entry is None:
+            self.logger.info(f"Cache miss for stage '{stage}' ({key[:12]})")
+            return None
+        os.utime(entry)
+        self._pinned.add(entry)
+        self.logger.info(f"Cache hit for stage '{stage}' ({key[:12]})")
+        if entry.is_dir():
+            return pl.scan_parquet(entry / "**" / "*.parquet")
+        if entry == self._entry_path(stage, key, lazy=True):
+            return pl.scan_ipc(entry)
+        return pl.read_ipc(entry)
+
+    def put(self, stage: str, key: str, df: Union[pl.DataFrame, pl.LazyFrame], engine: str = "streaming") -> Path:
+        """Store and pin the output of a stage.
+
+        A LazyFrame is streamed to the entry with `engine` instead of being collected.
+        """
+        if isinstance(df, pl.LazyFrame):
+            df.sink_ipc(self.sink_path(stage, key), engine=engine)
+            return self.commit(stage, key)
+        entry = self._entry_path(stage, key)
+        tmp_entry = entry.with_suffix('.tmp')
+        df.write_ipc(tmp_entry)
+        os.replace(tmp_entry, entry)
+        self._pinned.add(entry)
+        return entry
+
+    def sink_path(self, stage: str, key: str) -> Path:
+        """Temporary file to sink a LazyFrame output to, e.g. as part of pl.collect_all; see commit()."""
+        return self._entry_path(stage, key, lazy=True).with_suffix('.tmp')
+
+    def commit(self, stage: str, key: str) -> Path:
+        """Turn the file written to sink_path() into the stage's entry and pin it."""
+        entry = self._entry_path(stage, key, lazy=True)
+        os.replace(self.sink_path(stage, key), entry)
+        self._pinned.add(entry)
+        return entry
+
+    def parts_path(self, stage: str, key: str) -> Path:
+        """Temporary directory (not yet created) for a stage to write its parquet output files to; see commit_parts()."""
+        return self._parts_entry_path(stage, key).with_suffix('.parts-tmp')
+
+    def commit_parts(self, stage: str, key: str) -> Path:
+        """Turn the directory written to parts_path() into the stage's entry and pin it."""
+        entry = self._parts_entry_path(stage, key)
+        if entry.exists():
+            shutil.rmtree(entry)
+        for stale in [self._entry_path(stage, key), self._entry_path(stage, key, lazy=True)]:
+            stale.unlink(missing_ok=True)
+        os.replace(self.parts_path(stage, key), entry)
+        self._pinned.add(entry)
+        return entry
+
+    def run(
+        self,
+        stage: str,
+        compute: Callable[[], pl.DataFrame],
+        inputs: Iterable[Union[str, Path]] = (),
+        params: Optional[Dict[str, Any]] = None,
+        code: Iterable[Callable] = (),
+        upstream: Iterable[str] = ()
+    ) -> Tuple[Union[pl.DataFrame, pl.LazyFrame], str]:
+        """
+        Return the cached output of a stage, computing and storing it on a miss.
+
+        A LazyFrame from `compute` is streamed into the cache and returned as a scan of the entry.
+
+        Args:
+            stage: Stage name
+            compute: Zero-argument callable producing the stage output
+            inputs: Input files read by the stage
+            params: JSON-serializable parameters of the stage
+            code: Functions implementing the stage; their source code is part of the key
+            upstream: Keys of the cache entries the stage consumes
+
+        Returns:
+            Tuple of (stage output, cache key); pass the key as `upstream` to dependent stages
+        """
+        key = self.key(stage, inputs, params, code, upstream)
+        df = self.get(stage, key)
+        if df is None:
+            df = compute()
+            entry = self.put(stage, key, df)
+            if isinstance(df, pl.LazyFrame):
+                df = pl.scan_ipc(entry)
+        return df, key
+
+    def entries(self) -> List[Path]:
+        """Cache entries, least recently used first."""
+        entries = [*self.directory.glob("*.arrow"), *self.directory.glob("*.parts")]
+        return sorted(entries, key=lambda p: p.stat().st_mtime_ns)
+
+    def size(self) -> int:
+        """Total size of the cache entries in bytes."""
+        return sum(self._entry_size(entry) for entry in self.entries())
+
+    def release(self) -> None:
+        """Unpin all entries, e.g. once the frames read from the cache are no longer used."""
+        self._pinned.clear()
+
+    def evict(self) -> List[Path]:
+        """Delete least recently used unpinned entries until the cache fits in its size budget."""
+        entries = self.entries()
+        sizes = {entry: self._entry_size(entry) for entry in entries}
+        total = sum(sizes.values())
+        evicted = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry in self._pinned:
+                continue
+            total -= sizes[entry]
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+            evicted.append(entry)
+            self.logger.info(f"Evicted cache entry {entry.name}")
+        return evicted
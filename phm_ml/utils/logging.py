@@ -7,15 +7,21 @@ def setup_logging(
     name: str = "phm_ml",
     log_file: Optional[Union[str, Path]] = None,
     level: Union[int, Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]] = "INFO",
-    file_mode: str = "a"
+    file_mode: str = "a",
+    metrics_file: Optional[Union[str, Path]] = None
 ) -> logging.Logger:
     """Set up a simple logger with console and optional file output.
+
+    Stage metrics recorded with phm_ml.utils.profiling go to the `<name>.metrics` child logger. They are
+    kept in memory for log_stage_summary and, if a log file is given, written as JSON lines next to it.
     
     Args:
         name: Logger name. Defaults to "phm_ml".
         log_file: Optional path to log file. If None, logs only to console.
         level: Logging level, either as string name or logging constant.
         file_mode: File opening mode. Defaults to append ("a").
+        metrics_file: Optional path of the JSON-lines stage metrics. Defaults to
+            `<log_file stem>.metrics.jsonl` next to the log file, or none without a log file.
     
     Returns:
         Configured logger instance.
@@ -54,5 +60,24 @@ def setup_logging(
         file_handler = logging.FileHandler(log_file, mode=file_mode, encoding='utf-8')
         file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
-    
+
+        if metrics_file is None:
+            metrics_file = log_file.with_name(f"{log_file.stem}.metrics.jsonl")
+
+    # Stage metrics: one JSON object per line, kept out of the console and the text log. Imported here,
+    # so importing this module does not pull in polars
+    from phm_ml.utils.profiling import StageMetricsCollector, metrics_logger
+
+    stage_logger = metrics_logger(logger)
+    stage_logger.setLevel(logging.INFO)
+    stage_logger.propagate = False
+    stage_logger.handlers.clear()
+    stage_logger.addHandler(StageMetricsCollector())
+    if metrics_file:
+        metrics_file = Path(metrics_file)
+        metrics_file.parent.mkdir(parents=True, exist_ok=True)
+        metrics_handler = logging.FileHandler(metrics_file, mode=file_mode, encoding='utf-8')
+        metrics_handler.setFormatter(logging.Formatter("%(message)s"))
+        stage_logger.addHandler(metrics_handler)
+
     return logger
\ No newline at end of file
@@ -0,0 +1,150 @@
+import logging
+import sys
+import threading
+import polars as pl
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+_PROC_STATUS = "/proc/self/status"
+
+
+def _proc_status_bytes(field: str) -> int:
+    # Linux only: fields like "VmHWM:   123456 kB"
+    try:
+        with open(_PROC_STATUS, 'r') as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size of the process in bytes (0 where it cannot be measured)."""
+    return _proc_status_bytes("VmRSS")
+
+
+class PeakTracker:
+    """Peak RSS of the process over a block of code, see track_peak_rss."""
+
+    def __init__(self):
+        self._folded = 0
+
+    @property
+    def peak(self) -> int:
+        """Highest RSS since the block started, in bytes (the process peak where it cannot be reset)."""
+        return max(self._folded, peak_rss_bytes())
+
+
+_trackers: List[PeakTracker] = []
+_trackers_lock = threading.Lock()
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak RSS of the process to its current RSS, so the next peak_rss_bytes() only covers
+    what runs afterwards. Only supported on Linux. The peak reached so far is kept by every active
+    track_peak_rss block, so nested blocks do not hide it from the enclosing ones.
+
+    Returns:
+        Whether the peak was reset
+    """
+    with _trackers_lock:
+        peak = peak_rss_bytes()
+        for tracker in _trackers:
+            tracker._folded = max(tracker._folded, peak)
+        try:
+            with open("/proc/self/clear_refs", 'w') as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+
+
+@contextmanager
+def track_peak_rss() -> Iterator[PeakTracker]:
+    """
+    Measure the peak RSS of a block of code, e.g. one shard or one stage.
+
+    The process peak is reset when the block starts, so tracker.peak covers only the block (and
+    whatever runs concurrently in other threads); blocks may be nested.
+
+    Example:
+        with track_peak_rss() as tracker:
+            shard_df.collect()
+        log_peak_rss(logger, "shard 1", memory_budget_gb, peak=tracker.peak)
+    """
+    tracker = PeakTracker()
+    reset_peak_rss()
+    with _trackers_lock:
+        _trackers.append(tracker)
+    try:
+        yield tracker
+    finally:
+        with _trackers_lock:
+            _trackers.remove(tracker)
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of the current process in bytes (0 where it cannot be measured)."""
+    # /proc reflects reset_peak_rss(); getrusage keeps the peak of the whole process lifetime
+    peak = _proc_status_bytes("VmHWM")
+    if peak:
+        return peak
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def log_peak_rss(logger: logging.Logger, stage: str, memory_budget_gb: float = None, peak: Optional[int] = None) -> int:
+    """
+    Log the peak RSS of a stage, warning if it exceeds the memory budget.
+
+    Args:
+        logger: Logger instance
+        stage: Name of the stage that just finished
+        memory_budget_gb: Optional memory budget in GB
+        peak: Peak RSS of the stage in bytes, e.g. from track_peak_rss. Defaults to the peak since
+            the last reset_peak_rss()
+
+    Returns:
+        Peak RSS in bytes
+    """
+    peak = peak_rss_bytes() if peak is None else peak
+    message = f"Peak RSS after {stage}: {peak / 1024 ** 3:.2f} GB"
+    if memory_budget_gb is not None and peak > memory_budget_gb * 1024 ** 3:
+        logger.warning(f"{message} exceeds the memory budget of {memory_budget_gb} GB")
+    else:
+        logger.info(message)
+    return peak
+
+
+_DTYPE_BYTES = {
+    pl.Boolean: 1, pl.Int8: 1, pl.UInt8: 1, pl.Int16: 2, pl.UInt16: 2,
+    pl.Int32: 4, pl.UInt32: 4, pl.Float32: 4, pl.Date: 4,
+    pl.Int64: 8, pl.UInt64: 8, pl.Float64: 8, pl.Datetime: 8, pl.Duration: 8,
+    pl.Categorical: 4, pl.Enum: 4,
+}
+
+
+def estimate_row_bytes(schema: pl.Schema, string_bytes: int = 16) -> int:
+    """
+    Estimate the in-memory size of one row of a frame with the given schema.
+
+    Args:
+        schema: Polars schema
+        string_bytes: Assumed size of one value of a variable-width column (default: 16)
+
+    Returns:
+        Estimated bytes per row
+    """
+    return sum(_DTYPE_BYTES.get(dtype.base_type(), string_bytes) for dtype in schema.dtypes())
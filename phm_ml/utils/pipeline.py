@@ -0,0 +1,387 @@
+import json
+import logging
+import os
+import shutil
+import polars as pl
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from phm_ml.utils.cache import StageCache
+from phm_ml.utils.profiling import profile_stage
+
+
+@dataclass
+class StageFunction:
+    """Implementation of a pipeline stage, referenced by name from the pipeline config.
+
+    Attributes:
+        function (Callable): Called as function(context, **inputs, **params), where inputs are the outputs
+            of the upstream stages and params the `params` of the stage in the config.
+        code (List[Callable]): Functions implementing the stage; their source code is part of the stage key.
+        key_params (Optional[Callable]): Maps (config, params) to the settings the output depends on.
+        files (Optional[Callable]): Maps (config, params) to the input files read by the stage.
+    """
+    function: Callable[..., Any]
+    code: List[Callable] = field(default_factory=list)
+    key_params: Optional[Callable[[Any, Dict[str, Any]], Dict[str, Any]]] = None
+    files: Optional[Callable[[Any, Dict[str, Any]], List[str]]] = None
+
+
+def stage_function(
+    registry: Dict[str, StageFunction],
+    name: Optional[str] = None,
+    code: Iterable[Callable] = (),
+    key_params: Optional[Callable[[Any, Dict[str, Any]], Dict[str, Any]]] = None,
+    files: Optional[Callable[[Any, Dict[str, Any]], List[str]]] = None
+) -> Callable:
+    """
+    Decorator registering a function as a stage implementation.
+
+    Args:
+        registry: Registry of stage functions, e.g. BACKBLAZE_STAGES
+        name: Name the config refers to. Defaults to the function name
+        code: Library functions the stage calls; with the function itself, their source is part of the key
+        key_params: Maps (config, params) to the settings the output depends on
+        files: Maps (config, params) to the input files read by the stage
+    """
+    def decorator(function: Callable) -> Callable:
+        registry[name or function.__name__] = StageFunction(function, [function, *code], key_params, files)
+        return function
+    return decorator
+
+
+@dataclass
+class Stage:
+    """A node of the pipeline, as declared in the `pipeline.stages` section of the config.
+
+    Attributes:
+        name (str): Stage name, also used for its cache entries and metrics.
+        function (str): Name of the registered StageFunction.
+        depends_on (Dict[str, str]): Argument name of the function to the upstream stage providing it.
+        params (Dict[str, Any]): Extra keyword arguments of the function; part of the stage key.
+        cache (bool): Store the output frame in the stage cache. A LazyFrame output is sunk to the cache
+            entry and downstream stages get a scan of it.
+        materialize (bool): Collect a LazyFrame output once, so downstream stages share the result
+            instead of each executing the plan again.
+    """
+    name: str
+    function: str
+    depends_on: Dict[str, str] = field(default_factory=dict)
+    params: Dict[str, Any] = field(default_factory=dict)
+    cache: bool = False
+    materialize: bool = False
+
+    @property
+    def upstream(self) -> List[str]:
+        return list(dict.fromkeys(self.depends_on.values()))
+
+
+@dataclass
+class StageContext:
+    """What a stage function gets besides its inputs and params.
+
+    Attributes:
+        key (str): Key of the stage in this run; it changes with the inputs, params, settings and code.
+        output_directory (Optional[Path]): For cached stages, a directory (not yet created) the stage may
+            write its output to as parquet files, returning a scan of them. The directory then becomes the
+            cache entry as is, instead of the scan being written to the cache again.
+    """
+    stage: str
+    config: Any
+    logger: logging.Logger
+    engine: str = "auto"
+    key: str = ""
+    output_directory: Optional[Path] = None
+
+
+class Pipeline:
+    """DAG of stages declared in config, run wave by wave with caching and resume.
+
+    Every stage gets a key from its function, params, settings, code, input files and the keys of its
+    upstream stages, so keys are known before anything runs. A wave is every stage whose upstream stages
+    are done:
+
+    - stages with a cache entry are read from the cache, and their upstream stages are only run if
+      another stage needs them; e.g. a validation pass feeding only cache hits is skipped;
+    - the other stage functions run concurrently in a thread pool (polars releases the GIL);
+    - the LazyFrame outputs of cached or materialized stages run together in one pl.collect_all, so the
+      plans run in parallel and their common sub-plans (e.g. the same scan and sort) run once. Cached
+      outputs are sunk to the cache and passed downstream as scans; materialized ones are collected.
+
+    Each finished stage is recorded with its key in a state file. After a failure, run(resume=True)
+    skips the stages that already completed with the same key, unless a stage that has to run needs
+    their output, and picks up from the failed stage. run(from_stage=...) re-runs a stage and everything
+    downstream of it, ignoring their cache entries.
+
+    Args:
+        stages: Stages of the pipeline
+        registry: Stage functions by name
+        config: Configuration passed to the stage functions, e.g. load_config()
+        cache: Stage output cache
+        targets: Stages produced by default. Defaults to all stages
+        max_workers: Threads running the stage functions of a wave (default: 4)
+        engine: Polars engine collecting the stage outputs (default: "auto")
+        state_file: JSON file recording the completed stages, required for resume
+        logger: Optional logger instance for logging. Defaults to the "phm_ml" logger
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        registry: Dict[str, StageFunction],
+        config: Any,
+        cache: StageCache,
+        targets: Optional[List[str]] = None,
+        max_workers: int = 4,
+        engine: str = "auto",
+        state_file: Optional[Union[str, Path]] = None,
+        logger: logging.Logger = None
+    ):
+        self.stages = {stage.name: stage for stage in stages}
+        self.registry = registry
+        self.config = config
+        self.cache = cache
+        self.targets = targets
+        self.max_workers = max_workers
+        self.engine = engine
+        self.state_file = Path(state_file) if state_file else None
+        self.logger = logger or logging.getLogger("phm_ml")
+
+        for stage in stages:
+            if stage.function not in registry:
+                raise ValueError(f"Stage '{stage.name}' uses unknown function '{stage.function}', "
+                                 f"expected one of {sorted(registry)}")
+            unknown = [name for name in stage.upstream if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}")
+        self.plan(list(self.stages))
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Any,
+        registry: Dict[str, StageFunction],
+        cache: StageCache,
+        logger: logging.Logger = None
+    ) -> 'Pipeline':
+        """Build the pipeline declared in the `pipeline` section of a config such as load_config()."""
+        settings = config.pipeline
+        stages = [Stage(name, **spec) for name, spec in settings.stages.items()]
+        return cls(stages, registry, config, cache, targets=settings.targets,
+                   max_workers=settings.max_workers, engine=config.execution.engine, state_file=settings.state_file, logger=logger)
+
+    def plan(self, targets: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Order the stages needed for the targets so every stage comes after its upstream stages.
+
+        Args:
+            targets: Stages to produce. Defaults to the pipeline targets
+
+        Returns:
+            Stage names in execution order; ties keep the declaration order
+        """
+        targets = list(targets or self.targets or self.stages)
+        unknown = [name for name in targets if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown target stages {unknown}, expected some of {list(self.stages)}")
+
+        needed, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in needed:
+                needed.add(name)
+                todo.extend(self.stages[name].upstream)
+
+        order, done = [], set()
+        while len(order) < len(needed):
+            ready = [name for name in self.stages
+                     if name in needed and name not in done and all(up in done for up in self.stages[name].upstream)]
+            if not ready:
+                raise ValueError(f"Pipeline has a dependency cycle among {sorted(needed - done)}")
+            order.extend(ready)
+            done.update(ready)
+        return order
+
+    def downstream(self, stage: str) -> Set[str]:
+        """All stages depending directly or indirectly on `stage`."""
+        found, todo = set(), [stage]
+        while todo:
+            name = todo.pop()
+            for other in self.stages.values():
+                if name in other.upstream and other.name not in found:
+                    found.add(other.name)
+                    todo.append(other.name)
+        return found
+
+    def keys(self, order: List[str]) -> Dict[str, str]:
+        """Keys of the stages in `order` (which must list upstream stages first)."""
+        keys = {}
+        for name in order:
+            stage = self.stages[name]
+            function = self.registry[stage.function]
+            params = {
+                'function': stage.function,
+                'params': stage.params,
+                'settings': function.key_params(self.config, stage.params) if function.key_params else {},
+            }
+            files = function.files(self.config, stage.params) if function.files else []
+            upstream = [f"{arg}={keys[up]}" for arg, up in sorted(stage.depends_on.items())]
+            keys[name] = self.cache.key(name, files, params, function.code, upstream)
+        return keys
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if self.state_file is None or not self.state_file.exists():
+            return {}
+        return json.loads(self.state_file.read_text(encoding='utf-8'))['stages']
+
+    def _save_state(self, state: Dict[str, Dict[str, Any]]) -> None:
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_suffix('.tmp')
+        tmp_file.write_text(json.dumps({'stages': state}, indent=2), encoding='utf-8')
+        os.replace(tmp_file, self.state_file)
+
+    def _run_stage(self, name: str, key: str, outputs: Dict[str, Any], from_cache: bool, committed: Set[str]) -> Any:
+        stage = self.stages[name]
+        with profile_stage(name, self.logger) as run:
+            if from_cache:
+                output = self.cache.get(name, key)
+            else:
+                inputs = {arg: outputs[up] for arg, up in stage.depends_on.items()}
+                output_directory = self.cache.parts_path(name, key) if stage.cache else None
+                if output_directory is not None and output_directory.exists():
+                    shutil.rmtree(output_directory)
+                context = StageContext(name, self.config, self.logger, self.engine, key, output_directory)
+                output = self.registry[stage.function].function(context, **inputs, **stage.params)
+                if output_directory is not None and output_directory.exists():
+                    output = pl.scan_parquet(self.cache.commit_parts(name, key) / "**" / "*.parquet")
+                    committed.add(name)
+                if isinstance(output, pl.LazyFrame):
+                    run.record_plan(output, engine=self.engine)
+            run.set_rows(rows_out=output)
+        return output
+
+    def run(
+        self,
+        targets: Optional[Iterable[str]] = None,
+        from_stage: Optional[str] = None,
+        resume: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run the stages needed for the targets.
+
+        Args:
+            targets: Stages to produce. Defaults to the pipeline targets
+            from_stage: Optional stage to re-run together with everything downstream of it, ignoring
+                their cache entries
+            resume: Skip stages that completed with the same key in an earlier run (needs a state file)
+
+        Returns:
+            Outputs of the target stages by name (skipped targets are left out)
+        """
+        targets = list(targets or self.targets or self.stages)
+        order = self.plan(targets)
+        if from_stage is not None and from_stage not in order:
+            raise ValueError(f"from_stage '{from_stage}' is not part of the run {order}")
+        if resume and self.state_file is None:
+            raise ValueError("resume requires a pipeline state_file")
+
+        keys = self.keys(order)
+        forced = {from_stage} | self.downstream(from_stage) if from_stage is not None else set()
+        state = self._load_state() if self.state_file is not None else {}
+        for name in forced:
+            state.pop(name, None)
+        completed = {name for name in order if resume and name not in forced
+                     and state.get(name, {}).get('status') == "ok" and state[name].get('key') == keys[name]}
+        cached = {name for name in order if self.stages[name].cache and name not in forced
+                  and self.cache.contains(name, keys[name])}
+
+        # A stage runs if it is a target that has not completed, or a stage computing its output needs it;
+        # stages that completed before or only feed cache hits are skipped
+        consumers = {name: [other for other in order if name in self.stages[other].upstream] for name in order}
+        runs = set()
+        for name in reversed(order):
+            if (name in targets and name not in completed) or any(other in runs and other not in cached
+                                                                  for other in consumers[name]):
+                runs.add(name)
+        skipped = [name for name in order if name not in runs]
+        if skipped:
+            self.logger.info(f"Skipping stages completed in an earlier run or only feeding cached stages: {skipped}")
+
+        outputs: Dict[str, Any] = {}
+        pending = [name for name in order if name in runs]
+        finished = set()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while pending:
+                    wave = [name for name in pending if all(up not in pending for up in self.stages[name].upstream)]
+                    pending = [name for name in pending if name not in wave]
+                    self.logger.info(f"Running stages {wave}")
+
+                    committed: Set[str] = set()
+                    futures = {name: pool.submit(self._run_stage, name, keys[name], outputs, name in cached, committed)
+                               for name in wave}
+                    errors = {}
+                    for name, future in futures.items():
+                        try:
+                            outputs[name] = future.result()
+                        except Exception as error:
+                            errors[name] = error
+
+                    # Stages that wrote their output files to their output_directory are already in the cache
+                    sunk = {name for name in committed if name not in errors}
+                    if not errors:
+                        # Cached outputs are sunk to their cache entry and passed on as scans, so they are
+                        # never held in memory as a whole; materialized outputs are collected
+                        lazy = [name for name in wave if isinstance(outputs[name], pl.LazyFrame) and name not in cached
+                                and name not in sunk and (self.stages[name].cache or self.stages[name].materialize)]
+                        sunk |= {name for name in lazy if self.stages[name].cache}
+                        plans = [outputs[name].sink_ipc(self.cache.sink_path(name, keys[name]), lazy=True)
+                                 if name in sunk else outputs[name] for name in lazy]
+                        if lazy:
+                            try:
+                                with profile_stage(f"collect {'+'.join(lazy)}", self.logger) as run:
+                                    frames = run.collect_all(plans, engine=self.engine)
+                                    for name, frame in zip(lazy, frames):
+                                        outputs[name] = (pl.scan_ipc(self.cache.commit(name, keys[name]))
+                                                         if name in sunk else frame)
+                                    run.set_rows(rows_out=sum(
+                                        outputs[name].select(pl.len()).collect().item() if name in sunk else outputs[name].height
+                                        for name in lazy))
+                            except Exception as error:
+                                errors.update({name: error for name in lazy})
+
+                    for name in wave:
+                        if name in errors:
+                            continue
+                        if self.stages[name].cache and name not in cached and name not in sunk:
+                            if not isinstance(outputs[name], pl.DataFrame):
+                                errors[name] = TypeError(f"Cached stage '{name}' returned {type(outputs[name]).__name__}, "
+                                                         f"expected a polars frame")
+                                continue
+                            self.cache.put(name, keys[name], outputs[name])
+                        state[name] = {'key': keys[name], 'status': "ok",
+                                       'finished_at': datetime.now().isoformat(timespec='seconds')}
+                    for name in errors:
+                        state[name] = {'key': keys[name], 'status': "error",
+                                       'finished_at': datetime.now().isoformat(timespec='seconds')}
+                    if self.state_file is not None:
+                        self._save_state(state)
+                    if errors:
+                        name, error = next(iter(errors.items()))
+                        self.logger.error(f"Stage '{name}' failed: {error!r}. Completed stages are recorded in "
+                                          f"{self.state_file}; run again with resume to continue from the failed stage")
+                        raise error
+
+                    # Release outputs no remaining stage needs
+                    finished.update(wave)
+                    for name in list(outputs):
+                        if name not in targets and all(other in finished for other in consumers[name] if other in runs):
+                            del outputs[name]
+        finally:
+            # Evict only once the run is over; the entries this run wrote or read are pinned
+            self.cache.evict()
+
+        return {name: output for name, output in outputs.items() if name in targets}
@@ -0,0 +1,316 @@
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+import polars as pl
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from phm_ml.utils.memory import current_rss_bytes, track_peak_rss
+
+try:
+    import pyinstrument
+except ImportError:  # optional, only needed for profiler="pyinstrument"
+    pyinstrument = None
+
+PROFILERS = ["cprofile", "pyinstrument"]
+
+# Names of the stages currently running in each thread, outermost first
+_active = threading.local()
+
+
+def _active_stages() -> List[str]:
+    if not hasattr(_active, 'stages'):
+        _active.stages = []
+    return _active.stages
+
+
+@dataclass
+class StageMetrics:
+    """Resource usage of one pipeline stage.
+
+    Attributes:
+        stage (str): Name of the stage.
+        parent (Optional[str]): Stage this one ran inside of, if any.
+        status (str): "ok", or "error" if the stage raised.
+        started_at (str): ISO timestamp of the stage start.
+        wall_seconds (float): Elapsed wall-clock time.
+        cpu_seconds (float): CPU time of the process (all threads, including the polars pool).
+        peak_rss_bytes (int): Peak RSS of the process during the stage (the peak is reset when it starts).
+        rss_increase_bytes (int): Peak RSS during the stage above the RSS at its start.
+        rows_in (Optional[int]): Rows going into the stage, if known.
+        rows_out (Optional[int]): Rows coming out of the stage, if known.
+        query_plan (Optional[str]): Optimized polars plan of the frame collected by the stage.
+        plan_timings (Optional[List[Dict]]): Per-node timings of that plan, where polars can profile it.
+        profile_file (Optional[str]): Output of the cProfile/pyinstrument hook.
+    """
+    stage: str
+    parent: Optional[str] = None
+    status: str = "ok"
+    started_at: str = ""
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    rss_increase_bytes: int = 0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    query_plan: Optional[str] = None
+    plan_timings: Optional[List[Dict[str, Any]]] = None
+    profile_file: Optional[str] = None
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        if rows is None or self.wall_seconds <= 0:
+            return None
+        return rows / self.wall_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), 'rows_per_second': self.rows_per_second}
+
+
+class StageMetricsCollector(logging.Handler):
+    """Logging handler keeping the metrics of every finished stage for the end-of-run summary."""
+
+    def __init__(self):
+        super().__init__()
+        self.metrics: List[StageMetrics] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        metrics = getattr(record, 'stage_metrics', None)
+        if metrics is not None:
+            self.metrics.append(metrics)
+
+
+def metrics_logger(logger: logging.Logger) -> logging.Logger:
+    """Child logger receiving the JSON metrics lines of `logger` (configured by setup_logging)."""
+    return logging.getLogger(f"{logger.name}.metrics")
+
+
+def _count_rows(value: Any) -> Optional[int]:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, pl.DataFrame):
+        return value.height
+    if value is not None and hasattr(value, '__len__') and not isinstance(value, (pl.LazyFrame, str)):
+        return len(value)
+    return None
+
+
+class StageRun:
+    """Handle of a running stage, yielded by profile_stage to record rows and query plans."""
+
+    def __init__(self, metrics: StageMetrics):
+        self.metrics = metrics
+
+    def set_rows(self, rows_in: Any = None, rows_out: Any = None) -> None:
+        """Record rows in/out, given as counts or as frames / sized containers."""
+        if rows_in is not None:
+            self.metrics.rows_in = _count_rows(rows_in)
+        if rows_out is not None:
+            self.metrics.rows_out = _count_rows(rows_out)
+
+    def record_plan(self, *dfs: pl.LazyFrame, engine: str = "auto") -> None:
+        """Record the optimized plans of LazyFrames the stage returns without collecting them."""
+        self.metrics.query_plan = "\n\n".join(df.explain(engine=engine) for df in dfs)
+
+    def collect(self, df: pl.LazyFrame, engine: str = "auto", timings: bool = False) -> pl.DataFrame:
+        """
+        Collect a LazyFrame as part of the stage, recording its optimized plan and output rows.
+
+        With `timings`, the per-node timings of the plan are recorded as well, where the installed
+        polars supports LazyFrame.profile. Profiling only runs on the in-memory engine, so timings are
+        skipped for any other engine: the frame is collected with `engine` and only its plan is recorded.
+
+        Args:
+            df: LazyFrame to collect
+            engine: Polars engine (default: "auto")
+            timings: Record per-node timings with LazyFrame.profile (default: False)
+
+        Returns:
+            Collected DataFrame
+        """
+        self.record_plan(df, engine=engine)
+        if timings and engine in ("auto", "in-memory") and hasattr(df, 'profile'):
+            result, node_timings = df.profile()
+            self.metrics.plan_timings = node_timings.to_dicts()
+        else:
+            result = df.collect(engine=engine)
+        self.metrics.rows_out = result.height
+        return result
+
+    def collect_all(self, dfs: List[pl.LazyFrame], engine: str = "auto") -> List[pl.DataFrame]:
+        """
+        Collect several LazyFrames in one pl.collect_all, recording their optimized plans and output rows.
+
+        Args:
+            dfs: LazyFrames to collect; sinks (e.g. sink_ipc(..., lazy=True)) yield empty frames
+            engine: Polars engine (default: "auto")
+
+        Returns:
+            Collected DataFrames, in the order of `dfs`
+        """
+        self.record_plan(*dfs, engine=engine)
+        frames = pl.collect_all(dfs, engine=engine)
+        self.metrics.rows_out = sum(frame.height for frame in frames)
+        return frames
+
+
+@contextmanager
+def profile_stage(
+    stage: str,
+    logger: logging.Logger = None,
+    rows_in: Any = None,
+    profiler: Optional[str] = None,
+    profile_directory: Union[str, Path] = "profiles"
+) -> Iterator[StageRun]:
+    """
+    Measure a pipeline stage and emit its metrics as one JSON line.
+
+    Records wall time, CPU time and peak RSS around the block. Rows in/out and the polars plan are
+    recorded through the yielded StageRun. The metrics go to the `<logger>.metrics` child logger, which
+    setup_logging writes next to the log file and collects for log_stage_summary.
+
+    Example:
+        with profile_stage("gap_filled", logger, rows_in=raw_df) as stage:
+            gap_filled_df = stage.collect(fix_date_gaps(data_clean(raw_df.lazy(), logger)))
+
+    Args:
+        stage: Name of the stage
+        logger: Logger whose metrics child receives the record. Defaults to the "phm_ml" logger
+        rows_in: Rows going into the stage, as a count or a frame
+        profiler: Optional function profiler for this stage, "cprofile" or "pyinstrument"
+        profile_directory: Directory of the profiler output (default: "profiles")
+
+    Yields:
+        StageRun of the stage
+    """
+    if profiler is not None and profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}', expected one of {PROFILERS}")
+    if profiler == "pyinstrument" and pyinstrument is None:
+        raise ImportError("profiler='pyinstrument' requires the pyinstrument package")
+
+    logger = logger or logging.getLogger("phm_ml")
+    active_stages = _active_stages()
+    metrics = StageMetrics(stage, parent=active_stages[-1] if active_stages else None,
+                           started_at=datetime.now().isoformat(timespec='seconds'))
+    run = StageRun(metrics)
+    run.set_rows(rows_in=rows_in)
+
+    if profiler == "cprofile":
+        function_profiler = cProfile.Profile()
+        function_profiler.enable()
+    elif profiler == "pyinstrument":
+        function_profiler = pyinstrument.Profiler()
+        function_profiler.start()
+
+    active_stages.append(stage)
+    rss_before = current_rss_bytes()
+    with track_peak_rss() as tracker:
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield run
+        except BaseException:
+            metrics.status = "error"
+            raise
+        finally:
+            active_stages.pop()
+            metrics.wall_seconds = time.perf_counter() - wall_start
+            metrics.cpu_seconds = time.process_time() - cpu_start
+            metrics.peak_rss_bytes = tracker.peak
+            metrics.rss_increase_bytes = max(metrics.peak_rss_bytes - rss_before, 0)
+
+            if profiler is not None:
+                profile_directory = Path(profile_directory)
+                profile_directory.mkdir(parents=True, exist_ok=True)
+                if profiler == "cprofile":
+                    function_profiler.disable()
+                    profile_file = profile_directory / f"{stage}.prof"
+                    function_profiler.dump_stats(profile_file)
+                else:
+                    function_profiler.stop()
+                    profile_file = profile_directory / f"{stage}.html"
+                    profile_file.write_text(function_profiler.output_html(), encoding='utf-8')
+                metrics.profile_file = str(profile_file)
+
+            metrics_logger(logger).info(json.dumps(metrics.to_dict(), default=str), extra={'stage_metrics': metrics})
+            logger.debug(f"Stage {stage}: {metrics.wall_seconds:.2f} s wall, {metrics.cpu_seconds:.2f} s CPU, "
+                          f"peak RSS {metrics.peak_rss_bytes / 1024 ** 3:.2f} GB")
+
+
+def instrument_stage(stage: Optional[str] = None, profiler: Optional[str] = None) -> Callable:
+    """
+    Decorator running a function inside profile_stage.
+
+    Rows in are taken from the first DataFrame argument and rows out from a DataFrame result (or the first
+    DataFrame of a tuple result). LazyFrames are not counted, since that would execute them; functions
+    returning LazyFrames are better measured where the plan is collected (StageRun.collect). The metrics
+    go to the `logger` argument of the call (passed by position or keyword) if given, else to the
+    "phm_ml" logger.
+
+    Args:
+        stage: Name of the stage. Defaults to the function name
+        profiler: Optional function profiler, see profile_stage
+    """
+    def decorator(function: Callable) -> Callable:
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            rows_in = next((arg for arg in list(args) + list(kwargs.values()) if isinstance(arg, pl.DataFrame)), None)
+            try:
+                logger = signature.bind_partial(*args, **kwargs).arguments.get('logger')
+            except TypeError:  # the call itself raises the error
+                logger = None
+            logger = logger if isinstance(logger, logging.Logger) else None
+            with profile_stage(stage or function.__name__, logger, rows_in=rows_in, profiler=profiler) as run:
+                result = function(*args, **kwargs)
+                outputs = result if isinstance(result, tuple) else (result,)
+                run.set_rows(rows_out=next((out for out in outputs if isinstance(out, pl.DataFrame)), None))
+            return result
+        return wrapper
+    return decorator
+
+
+def stage_summary(metrics: List[StageMetrics]) -> str:
+    """Format stage metrics as a plain-text table, one line per stage; nested stages are indented and left out of the total."""
+    header = f"{'stage':<28} {'wall s':>9} {'cpu s':>9} {'peak GB':>8} {'+GB':>6} {'rows in':>12} {'rows out':>12} {'rows/s':>12}"
+    lines = [header, "-" * len(header)]
+
+    def rows(value):
+        return f"{value:,}" if value is not None else "-"
+
+    for m in metrics:
+        rate = f"{m.rows_per_second:,.0f}" if m.rows_per_second is not None else "-"
+        name = f"  {m.stage}" if m.parent else m.stage
+        lines.append(f"{name[:28]:<28} {m.wall_seconds:>9.2f} {m.cpu_seconds:>9.2f} "
+                     f"{m.peak_rss_bytes / 1024 ** 3:>8.2f} {m.rss_increase_bytes / 1024 ** 3:>6.2f} "
+                     f"{rows(m.rows_in):>12} {rows(m.rows_out):>12} {rate:>12}")
+    lines.append("-" * len(header))
+    top_level = [m for m in metrics if m.parent is None]
+    lines.append(f"{'total':<28} {sum(m.wall_seconds for m in top_level):>9.2f} {sum(m.cpu_seconds for m in top_level):>9.2f}")
+    return "\n".join(lines)
+
+
+def log_stage_summary(logger: logging.Logger) -> List[StageMetrics]:
+    """
+    Log the end-of-run summary table of all stages recorded for `logger` since setup_logging.
+
+    Args:
+        logger: Logger configured with setup_logging
+
+    Returns:
+        Metrics of the recorded stages, in completion order
+    """
+    collectors = [handler for handler in metrics_logger(logger).handlers if isinstance(handler, StageMetricsCollector)]
+    metrics = collectors[0].metrics if collectors else []
+    if metrics:
+        logger.info("Stage summary:\n" + stage_summary(metrics))
+    return metrics
@@ -4,9 +4,17 @@ import glob
 import re
 from pathlib import Path
 
+from phm_ml.data_process.sampling import sample_rows
+from phm_ml.utils.profiling import instrument_stage, log_stage_summary
+from phm_ml.utils.logging import setup_logging
+
+@instrument_stage()
 def load_all_csv_files_streaming(base_directory='.', year=2017, num_quarters=2, num_csv=None):
     """
     Load and combine CSV files from specified directories using Polars for memory efficiency
+
+    The result is held in memory; to convert a full year use
+    phm_ml.data_process.ingest_backblaze.ingest_csv_to_parquet, which streams to partitioned parquet.
     
     Args:
         base_directory: Base directory containing the data folders
@@ -38,7 +46,7 @@ def load_all_csv_files_streaming(base_directory='.', year=2017, num_quarters=2,
     for directory in sorted_directories:
         print(f"  - {directory}")
 
-    combined_df = None
+    frames = []
     csv_count = 0
     for directory in sorted_directories[:num_quarters]:
         csv_files = sorted(directory.glob("*.csv"))
@@ -54,30 +62,35 @@ def load_all_csv_files_streaming(base_directory='.', year=2017, num_quarters=2,
                 csv_count += 1
                 print(f"  - Loaded {file.name}: ({df.height} rows, {df.width} columns)")
 
-                if combined_df is None:
-                    combined_df = df
-                else:
-                    combined_df = pl.concat([combined_df, df], how="vertical_relaxed", rechunk=True)
-                    
+                frames.append(df)
+
                 if num_csv and csv_count == num_csv:
-                    return combined_df
-                del df
+                    return pl.concat(frames, how="diagonal_relaxed")
 
             except Exception as e:
                 print(f"  - Error loading {file}: {str(e)}")
 
     print(f"\nSuccessfully loaded {csv_count} CSV files from {num_quarters} directories")
-    return combined_df
+    # Concatenate once at the end: appending to a growing frame copies it for every file
+    return pl.concat(frames, how="diagonal_relaxed") if frames else None
 
-def preprocess_data(df, harddrive_model='ST4000DM000'):
+@instrument_stage()
+def preprocess_data(df, harddrive_model='ST4000DM000', engine="auto"):
     """
     Preprocess the data for a specific hard drive model
     
     Args:
-        df: Input Polars DataFrame
+        df: Input Polars DataFrame or LazyFrame (e.g. pl.scan_parquet / pl.scan_csv)
         harddrive_model: Model to filter for
+        engine: Polars engine for the passes over the data; use "streaming" to process
+            data that does not fit in memory
+    
+    Returns:
+        Preprocessed frame, a LazyFrame if a LazyFrame was given
     """
     print("Initial preprocessing steps...")
+    is_lazy = isinstance(df, pl.LazyFrame)
+    df = df.lazy()
     
     # Filter for specific model
     df = df.filter(pl.col("model") == harddrive_model)
@@ -89,46 +102,58 @@ def preprocess_data(df, harddrive_model='ST4000DM000'):
     df = df.drop(["model", "date", "serial_number"])
     
     # Remove normalized columns (keep only raw values)
-    cols = [c for c in df.columns if c.lower().find("normalized") == -1]
-    df = df[cols]
+    cols = [c for c in df.collect_schema().names() if c.lower().find("normalized") == -1]
+    df = df.select(cols)
     
-    # Remove zero-valued columns
-    df = df.select([col for col in df.columns if df[col].is_not_null().any()])
+    # Remove all-null columns, detected for all columns in one pass
+    non_null = df.select(pl.all().is_not_null().any()).collect(engine=engine).row(0, named=True)
+    df = df.select([col for col in cols if non_null[col]])
     
     # Fill any remaining nulls with 0
     df = df.fill_null(0)
     
-    return df
+    return df if is_lazy else df.collect(engine=engine)
 
-def balance_dataset(df, balance_ratio=1.2):
+@instrument_stage()
+def balance_dataset(df, balance_ratio=1.2, seed=0, engine="auto"):
     """
     Balance the dataset by downsampling the majority class
     
+    Normal rows are drawn by seeded hash-based (bottom-k) sampling, so the same seed always keeps
+    the same rows and the frame is never materialized for the sampling.
+    
     Args:
-        df: Input Polars DataFrame
+        df: Input Polars DataFrame or LazyFrame
         balance_ratio: Ratio of normal to failed samples
+        seed: Seed of the sampling
+        engine: Polars engine for the passes over the data
+    
+    Returns:
+        Balanced frame, a LazyFrame if a LazyFrame was given
     """
     print("Balancing dataset...")
+    is_lazy = isinstance(df, pl.LazyFrame)
+    df = df.lazy()
     
-    # Get failed samples
-    failed_samples = df.filter(pl.col("failure") == 1)
-    n_failed = failed_samples.height
+    # Class counts in one pass
+    counts = df.select([
+        pl.len().alias('rows'),
+        (pl.col("failure") == 1).sum().alias('failed'),
+    ]).collect(engine=engine).row(0, named=True)
+    n_failed = counts['failed']
     
     # Calculate number of normal samples to keep
-    n_normal_target = int(n_failed * balance_ratio)
-    
-    # Get random sample of normal cases
-    normal_samples = df.filter(pl.col("failure") == 0).sample(n=n_normal_target)
+    n_normal_target = min(int(n_failed * balance_ratio), counts['rows'] - n_failed)
     
-    # Combine failed and sampled normal cases
-    balanced_df = pl.concat([failed_samples, normal_samples])
+    # Keep all failed cases and a seeded sample of the normal cases
+    balanced_df = sample_rows(df, {0: n_normal_target, 1: None}, label_column="failure", seed=seed, engine=engine)
     
-    print(f"Original dataset size: {df.height}")
-    print(f"Balanced dataset size: {balanced_df.height}")
+    print(f"Original dataset size: {counts['rows']}")
+    print(f"Balanced dataset size: {n_failed + n_normal_target}")
     print(f"Number of failed samples: {n_failed}")
     print(f"Number of normal samples: {n_normal_target}")
     
-    return balanced_df
+    return balanced_df if is_lazy else balanced_df.collect(engine=engine)
 
 def prepare_train_test_split(df):
     """
@@ -146,6 +171,7 @@ def prepare_train_test_split(df):
 def main():
     # Example usage
     base_dir = "/path/to/data"
+    logger = setup_logging(log_file="logs/preprocess.log")
     
     # Load training data
     print("Loading training data...")
@@ -170,6 +196,7 @@ def main():
     print("\nPreprocessing complete!")
     print(f"Training set shape: {X_train.shape}")
     print(f"Test set shape: {X_test.shape}")
+    log_stage_summary(logger)
     
     return X_train, y_train, X_test, y_test
 
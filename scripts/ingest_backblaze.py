@@ -0,0 +1,30 @@
+import argparse
+import polars as pl
+from phm_ml.data_process.ingest_backblaze import ingest_csv_to_parquet, export_model_parquet
+from phm_ml.data_process.serial_index import write_serial_indexed_parquet
+from phm_ml.utils.logging import setup_logging
+
+parser = argparse.ArgumentParser(description="Convert raw Backblaze CSV files into interim parquet data")
+parser.add_argument("--raw-dir", required=True, help="Directory containing the data_*_{year} folders")
+parser.add_argument("--year", type=int, required=True)
+parser.add_argument("--num-quarters", type=int, default=None)
+parser.add_argument("--partition-dir", default="data/partitioned", help="Output directory of the partitioned dataset")
+parser.add_argument("--workers", type=int, default=4)
+parser.add_argument("--model", default=None, help="Optional drive model to export as a single interim file")
+parser.add_argument("--output", default=None, help="Interim parquet file for --model, e.g. data/interim/Lab1-2017-Q1-ST4000DM000.parquet")
+parser.add_argument("--start-date", default=None)
+parser.add_argument("--end-date", default=None)
+parser.add_argument("--index-dir", default=None, help="Optional directory for a serial-indexed copy of the --model export")
+args = parser.parse_args()
+
+logger = setup_logging()
+
+ingest_csv_to_parquet(args.raw_dir, args.year, args.partition_dir, num_quarters=args.num_quarters,
+                      max_workers=args.workers, logger=logger)
+
+if args.model:
+    output = args.output or f"data/interim/{args.year}-{args.model}.parquet"
+    export_model_parquet(args.partition_dir, args.model, output, start_date=args.start_date,
+                         end_date=args.end_date, logger=logger)
+    if args.index_dir:
+        write_serial_indexed_parquet(pl.scan_parquet(output), args.index_dir, logger=logger)
@@ -1,17 +1,34 @@
-import polars as pl
-from phm_ml.data_process.data_backblaze_harddrive import data_clean, get_disk_serials, adjust_dates, fix_date_gaps, create_failed_sequences, create_normal_sequences 
-from phm_ml.config.config_loader import DataConfig
-from phm_ml.utils.logging import setup_logging  
+import argparse
+from phm_ml.data_process.backblaze_pipeline import BACKBLAZE_STAGES
+from phm_ml.config.config_loader import load_config
+from phm_ml.utils.cache import StageCache
+from phm_ml.utils.logging import setup_logging
+from phm_ml.utils.pipeline import Pipeline
+from phm_ml.utils.profiling import log_stage_summary
 
-logger = setup_logging()
+# The stages and their dependencies are declared in the `pipeline` section of config/data.yaml
+parser = argparse.ArgumentParser(description="Run the Backblaze pipeline declared in config/data.yaml")
+parser.add_argument("--targets", nargs="*", default=None,
+                    help="Stages to produce; their upstream stages run as needed (default: pipeline.targets)")
+parser.add_argument("--from-stage", default=None,
+                    help="Re-run this stage and everything downstream of it, ignoring their cache entries")
+parser.add_argument("--resume", action="store_true",
+                    help="Skip the stages completed by the previous run, e.g. after a failure")
+parser.add_argument("--list", action="store_true", help="Print the stages of the run in execution order and exit")
+parser.add_argument("--set", nargs="*", default=[], metavar="SECTION.KEY=VALUE",
+                    help="Override config values, e.g. --set time_series.sequence_length=20 execution.engine=auto")
+args = parser.parse_args()
+config = load_config(overrides=args.set)
 
-train_df = pl.scan_parquet(DataConfig.path['train_data'])
-normal_serials, failed_serials, normal_df, failed_df = get_disk_serials(train_df, num_normal=100, logger=logger)
+# Stage metrics are written as JSON lines next to the log (run_backblaze.metrics.jsonl)
+logger = setup_logging(log_file=config.path['log_file'])
+cache = StageCache(config.cache.directory, config.cache.max_size_gb, logger)
+pipeline = Pipeline.from_config(config, BACKBLAZE_STAGES, cache, logger)
 
-normal_df = fix_date_gaps(data_clean(normal_df, logger), normal_serials, logger)
-failed_df = fix_date_gaps(data_clean(failed_df, logger), failed_serials, logger)
-failed_sequences = create_failed_sequences(failed_df, failed_serials, sequence_length=5, lookahead=1, logger=logger)
-normal_sequences = create_normal_sequences(normal_df, normal_serials, sequence_length=5, lookahead=1, logger=logger)
-
-print(failed_sequences.slice(0,50).collect())
-print(normal_sequences.slice(0,50).collect())
+if args.list:
+    for name in pipeline.plan(args.targets):
+        stage = pipeline.stages[name]
+        print(f"{name:<20} {stage.function:<16} <- {', '.join(stage.upstream) or '-'}")
+else:
+    pipeline.run(args.targets, from_stage=args.from_stage, resume=args.resume)
+    log_stage_summary(logger)
@@ -0,0 +1,63 @@
+import argparse
+import polars as pl
+from pathlib import Path
+from phm_ml.data_process.feature_selection import (
+    load_column_selection, profile_smart_columns, save_column_selection, select_smart_columns
+)
+from phm_ml.data_process.parallel import run_parallel_pipeline
+from phm_ml.data_process.sequence_store import merge_sequence_stores
+from phm_ml.config.config_loader import load_config
+from phm_ml.utils.logging import setup_logging
+
+# Workers are spawned and re-import this module, so everything runs under the main guard
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Backblaze pipeline over all drive models in a process pool")
+    parser.add_argument("--source", default=None, help="Parquet file or glob with the interim data (default: path.train_data)")
+    parser.add_argument("--output", default="data/sequences", help="Output directory of the partitions and the manifest")
+    parser.add_argument("--models", nargs="*", default=None, help="Drive models to process (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: execution.workers)")
+    parser.add_argument("--num-shards", type=int, default=None, help="Shards per drive model (default: execution.num_shards)")
+    parser.add_argument("--merge-to", default=None, help="Optional directory for one merged sequence store of all partitions")
+    parser.add_argument("--set", nargs="*", default=[], metavar="SECTION.KEY=VALUE",
+                        help="Override config values, e.g. --set time_series.sequence_length=20")
+    args = parser.parse_args()
+    config = load_config(overrides=args.set)
+
+    logger = setup_logging()
+
+    source = args.source or config.path['train_data']
+    # The SMART column selection of run_backblaze.py (feature_pruning.selection_file), made from the
+    # source if it has not been saved yet
+    smart_columns = None
+    pruning = config.feature_pruning
+    if pruning.enabled and Path(pruning.selection_file).exists():
+        smart_columns = load_column_selection(pruning.selection_file)
+        logger.info(f"Using the {len(smart_columns)} SMART columns selected in {pruning.selection_file}")
+    elif pruning.enabled:
+        smart_columns = select_smart_columns(
+            profile_smart_columns(pl.scan_parquet(source), engine=config.execution.engine),
+            max_null_fraction=pruning.max_null_fraction,
+            min_variance=pruning.min_variance,
+            min_distinct=pruning.min_distinct,
+            logger=logger
+        )
+        save_column_selection(smart_columns, pruning.selection_file)
+
+    manifest = run_parallel_pipeline(
+        source,
+        args.output,
+        sequence_length=config.time_series.sequence_length,
+        lookahead=config.time_series.lookahead,
+        models=args.models,
+        num_shards=args.num_shards or config.execution.num_shards,
+        workers=args.workers or config.execution.workers,
+        compact=config.execution.compact_dtypes,
+        smart_columns=smart_columns,
+        scaling_method=config.scaling.method,
+        relative_accuracy=config.scaling.relative_accuracy,
+        max_normal_seq=config.time_series.max_normal_seq,
+        logger=logger
+    )
+
+    if args.merge_to:
+        merge_sequence_stores([partition['path'] for partition in manifest['partitions']], args.merge_to)
@@ -0,0 +1,45 @@
+import argparse
+import polars as pl
+from pathlib import Path
+from phm_ml.data_process.ingest_backblaze import harmonize_schema, read_daily_csv
+from phm_ml.scoring.health import at_risk, latest_snapshots, score_fleet
+from phm_ml.utils.logging import setup_logging
+
+
+def read_snapshot(path: str) -> pl.LazyFrame:
+    # A Backblaze daily CSV file, or parquet (e.g. a day of the partitioned dataset)
+    path = Path(path)
+    if path.suffix == '.csv':
+        return read_daily_csv(path, harmonize_schema([path])).lazy()
+    return pl.scan_parquet(path)
+
+
+parser = argparse.ArgumentParser(description="Score every drive of a daily snapshot and write the ranked at-risk list")
+parser.add_argument("--snapshot", help="Daily snapshot, e.g. data_Q1_2017/2017-03-31.csv or a parquet file")
+parser.add_argument("--previous", default=None, help="Previous daily snapshot for the growth rules")
+parser.add_argument("--history", default=None,
+                    help="Parquet file or glob with several days per drive, used instead of --snapshot/--previous")
+parser.add_argument("--max-age-days", type=int, default=0,
+                    help="With --history, leave out drives whose latest row is older than the newest date by more days")
+parser.add_argument("--min-score", type=float, default=1.0, help="Minimum risk score of the at-risk list")
+parser.add_argument("--top", type=int, default=None, help="Keep only the highest-ranked drives")
+parser.add_argument("--output", default="data/scores/at_risk.csv", help="CSV file of the at-risk list")
+args = parser.parse_args()
+
+logger = setup_logging()
+
+if args.history:
+    snapshot, previous = latest_snapshots(pl.scan_parquet(args.history), max_age_days=args.max_age_days)
+elif args.snapshot:
+    snapshot = read_snapshot(args.snapshot)
+    previous = read_snapshot(args.previous) if args.previous else None
+else:
+    parser.error("either --snapshot or --history is required")
+
+scores = score_fleet(snapshot, previous, logger=logger)
+ranked = at_risk(scores, min_score=args.min_score, top_k=args.top)
+
+output = Path(args.output)
+output.parent.mkdir(parents=True, exist_ok=True)
+ranked.write_csv(output)
+logger.info(f"Wrote {ranked.height} at-risk drives to {output}")
@@ -0,0 +1,10 @@
+import polars as pl
+import pytest
+
+from phm_ml.data_process.synthetic import generate_fleet
+
+
+@pytest.fixture(scope="session")
+def fleet() -> pl.DataFrame:
+    """A small seeded fleet with failures and missing days, shared by the tests."""
+    return generate_fleet(60, 40, failure_rate=0.2, missing_day_rate=0.1, smart_ids=[5, 9, 187, 194, 197], seed=7)
@@ -0,0 +1,56 @@
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from phm_ml.utils.cache import StageCache
+from phm_ml.utils.pipeline import Pipeline, Stage, StageFunction
+
+
+def test_lazy_outputs_are_sunk_and_read_as_scans(fleet, tmp_path):
+    cache = StageCache(tmp_path)
+    key = cache.key("gap_filled", params={'compact': False})
+    output, _ = cache.run("gap_filled", lambda: fleet.lazy().filter(pl.col('failure') == 0), params={'compact': False})
+    assert isinstance(output, pl.LazyFrame)
+    assert cache.contains("gap_filled", key)
+    cached = cache.get("gap_filled", key)
+    assert isinstance(cached, pl.LazyFrame)
+    assert_frame_equal(cached.collect(), fleet.filter(pl.col('failure') == 0))
+
+
+def test_frame_outputs_are_read_into_memory(fleet, tmp_path):
+    cache = StageCache(tmp_path)
+    summary = fleet.group_by('serial_number').len().sort('serial_number')
+    key = cache.key("serial_summary")
+    assert cache.get("serial_summary", key) is None
+    cache.put("serial_summary", key, summary)
+    assert_frame_equal(cache.get("serial_summary", key), summary)
+
+
+def test_oversized_entry_survives_eviction(fleet, tmp_path):
+    old = StageCache(tmp_path)
+    old_entry = old.put("serial_summary", old.key("serial_summary"), fleet.head(10))
+
+    cache = StageCache(tmp_path, max_size_gb=1e-9)
+    output, key = cache.run("gap_filled", lambda: fleet.lazy(), params={'compact': False})
+    assert cache.evict() == [old_entry]
+    assert cache.contains("gap_filled", key)
+    assert_frame_equal(output.collect(), fleet)
+
+    cache.release()
+    cache.evict()
+    assert not cache.contains("gap_filled", key)
+
+
+def test_stage_output_files_become_the_entry(fleet, tmp_path):
+    def write_parts(context):
+        context.output_directory.mkdir(parents=True)
+        fleet.write_parquet(context.output_directory / "part-0.parquet")
+        return pl.scan_parquet(context.output_directory / "*.parquet")
+
+    registry = {'write': StageFunction(write_parts)}
+    cache = StageCache(tmp_path)
+    for _ in range(2):
+        output = Pipeline([Stage('parts', 'write', cache=True)], registry, None, cache).run()['parts']
+        assert_frame_equal(output.collect(), fleet)
+    entries = cache.entries()
+    assert [entry.suffix for entry in entries] == ['.parts']
+    assert [p.name for p in entries[0].iterdir()] == ["part-0.parquet"]
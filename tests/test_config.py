@@ -0,0 +1,91 @@
+import pickle
+import subprocess
+import sys
+from dataclasses import replace
+
+import pytest
+
+from phm_ml.config.config_loader import (
+    ConfigError, DataConfig, FrozenDict, Settings, TimeSeriesConfig, load_config
+)
+
+
+def _write(tmp_path, text: str) -> str:
+    path = tmp_path / "data.yaml"
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_defaults_and_path_resolution():
+    config = DataConfig.from_dict({'path': {'train_data': "data/train.parquet", 'log_file': "/tmp/run.log"}})
+    assert config.path['train_data'] == f"{Settings.PROJECT_ROOT}/data/train.parquet"
+    assert config.path['log_file'] == "/tmp/run.log"
+    assert config.sampling.index_file.startswith(str(Settings.PROJECT_ROOT))
+    assert config.time_series == TimeSeriesConfig()
+
+
+@pytest.mark.parametrize("config, message", [
+    ({'unknown': {}}, "Unknown configuration sections"),
+    ({'time_series': {'sequence_len': 5}}, "unknown keys"),
+    ({'time_series': {'sequence_length': "10"}}, "time_series.sequence_length"),
+    ({'time_series': {'sequence_length': 0}}, "positive"),
+    ({'time_series': {'lookahead': -1}}, "non-negative"),
+    ({'time_series': {'max_normal_seq': 0}}, "positive"),
+    ({'time_series': {'label_column': "fails_within_90d"}}, "label_column"),
+    ({'execution': {'engine': "gpu"}}, "execution.engine"),
+    ({'pipeline': {'targets': ["missing"]}}, "unknown stages"),
+    ({'path': {'train_data': 5}}, "path"),
+])
+def test_invalid_values_raise(config, message):
+    with pytest.raises(ConfigError, match=message):
+        DataConfig.from_dict(config)
+
+
+def test_zero_lookahead_and_uncapped_normal_sequences():
+    time_series = DataConfig.from_dict({'time_series': {'lookahead': 0, 'max_normal_seq': None}}).time_series
+    assert (time_series.lookahead, time_series.max_normal_seq) == (0, None)
+
+
+def test_overrides_from_environment_and_command_line(tmp_path):
+    path = _write(tmp_path, "time_series:\n  sequence_length: 10\n  rul_horizons: [7]\n")
+    config = DataConfig.from_yaml(path, overrides=["time_series.lookahead=3", "time_series.sequence_length=30"],
+                                  environ={'PHM_ML__TIME_SERIES__SEQUENCE_LENGTH': "20", 'OTHER': "1"})
+    assert (config.time_series.sequence_length, config.time_series.lookahead) == (30, 3)
+    assert config.time_series.rul_horizons == (7,)
+    with pytest.raises(ConfigError, match="Invalid override"):
+        DataConfig.from_yaml(path, overrides=["time_series.lookahead"], environ={})
+
+
+def test_shared_instance_is_immutable(tmp_path, monkeypatch):
+    path = _write(tmp_path, "path:\n  train_data: train.parquet\npipeline:\n  stages:\n"
+                            "    scan: {function: scan, params: {path: train_data}}\n")
+    monkeypatch.setenv("PHM_ML_CONFIG", path)
+    config = load_config()
+    assert load_config() is config
+
+    with pytest.raises(TypeError):
+        config.path['train_data'] = "other.parquet"
+    with pytest.raises(TypeError):
+        config.pipeline.stages['scan']['params']['path'] = "test_data"
+    with pytest.raises(AttributeError):
+        config.time_series.rul_horizons.append(90)
+    assert isinstance(config.pipeline.stages['scan'], FrozenDict)
+
+    plain = config.to_dict()
+    plain['path']['train_data'] = "other.parquet"
+    plain['time_series']['rul_horizons'].append(90)
+    assert load_config().path['train_data'].endswith("train.parquet")
+    assert load_config().time_series.rul_horizons == (7, 30)
+
+    copy = pickle.loads(pickle.dumps(config))
+    assert copy == config and isinstance(copy.path, FrozenDict)
+    assert replace(config, time_series=TimeSeriesConfig(sequence_length=5)).time_series.sequence_length == 5
+
+
+def test_import_does_not_load_yaml_or_polars():
+    # -X importtime lists every module imported, with its cumulative import time in microseconds
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import phm_ml.config.config_loader"],
+                            capture_output=True, text=True, check=True)
+    imported = [line.split("|")[-1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")]
+    assert "phm_ml.config.config_loader" in imported
+    assert not [name for name in imported if name.split(".")[0] in ("yaml", "polars", "numpy", "pandas")]
@@ -0,0 +1,49 @@
+import logging
+import polars as pl
+from datetime import date
+from polars.testing import assert_frame_equal
+
+from phm_ml.data_process.data_backblaze_harddrive import data_clean, fix_date_gaps
+
+logger = logging.getLogger("phm_ml.tests")
+
+
+def _sorted(df: pl.DataFrame) -> pl.DataFrame:
+    return df.sort(['serial_number', 'date'])
+
+
+def test_fix_date_gaps_vectorized_matches_loop(fleet):
+    cleaned = data_clean(fleet.lazy(), logging.getLogger("phm_ml.tests")).collect()
+    vectorized = fix_date_gaps(cleaned.lazy()).collect()
+    loop = fix_date_gaps(cleaned.lazy(), vectorized=False).collect()
+    assert_frame_equal(_sorted(vectorized), _sorted(loop))
+
+
+def test_fix_date_gaps_fills_every_day_and_forward_fills():
+    df = pl.DataFrame({
+        'date': [date(2017, 1, 1), date(2017, 1, 4), date(2017, 1, 1), date(2017, 1, 2)],
+        'serial_number': ['A', 'A', 'B', 'B'],
+        'smart_5_raw': [1.0, 3.0, 7.0, 8.0],
+    })
+    result = _sorted(fix_date_gaps(df.lazy()).collect())
+    assert result.filter(pl.col('serial_number') == 'A')['date'].to_list() == [
+        date(2017, 1, 1), date(2017, 1, 2), date(2017, 1, 3), date(2017, 1, 4)]
+    assert result.filter(pl.col('serial_number') == 'A')['smart_5_raw'].to_list() == [1.0, 1.0, 1.0, 3.0]
+    assert result.filter(pl.col('serial_number') == 'B')['smart_5_raw'].to_list() == [7.0, 8.0]
+
+
+def test_fix_date_gaps_restricts_to_serials(fleet):
+    serials = fleet['serial_number'].unique().sort().head(3)
+    result = fix_date_gaps(fleet.lazy(), serials=serials).collect()
+    assert set(result['serial_number'].unique()) == set(serials)
+
+
+def test_data_clean_logs_the_dtypes_it_casts_to(fleet, caplog):
+    with caplog.at_level(logging.INFO, logger="phm_ml.tests"):
+        data_clean(fleet.lazy(), logger, compact=True, float32=True)
+    assert "float64" not in caplog.text
+    assert "SMART columns by dtype" in caplog.text
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger="phm_ml.tests"):
+        data_clean(fleet.lazy(), logger)
+    assert "SMART columns to float64" in caplog.text
@@ -0,0 +1,37 @@
+import polars as pl
+import pytest
+
+from phm_ml.data_process.feature_selection import (
+    load_column_selection, profile_smart_columns, prune_smart_columns, save_column_selection, select_smart_columns
+)
+
+
+def _frame() -> pl.LazyFrame:
+    return pl.LazyFrame({
+        'serial_number': ['A', 'A', 'B', 'B'],
+        'smart_1_raw': [1.0, 2.0, 3.0, 4.0],
+        'smart_2_raw': [None, None, None, None],
+        'smart_3_raw': [7.0, 7.0, 7.0, 7.0],
+        'smart_4_raw': [None, 1.0, None, 5.0],
+        'smart_1_normalized': [100.0, 100.0, 99.0, 98.0],
+    }, schema_overrides={'smart_2_raw': pl.Float64})
+
+
+def test_profile_and_select_drop_dead_and_constant_columns():
+    profile = profile_smart_columns(_frame())
+    assert profile['column'].to_list() == ['smart_1_raw', 'smart_2_raw', 'smart_3_raw', 'smart_4_raw']
+    stats = {row['column']: row for row in profile.iter_rows(named=True)}
+    assert stats['smart_2_raw']['null_fraction'] == 1.0 and stats['smart_2_raw']['variance'] == 0.0
+    assert stats['smart_3_raw']['n_distinct'] == 1 and stats['smart_3_raw']['variance'] == 0.0
+    assert stats['smart_4_raw']['null_fraction'] == 0.5 and stats['smart_4_raw']['variance'] == pytest.approx(8.0)
+
+    assert select_smart_columns(profile) == ['smart_1_raw', 'smart_4_raw']
+    assert select_smart_columns(profile, max_null_fraction=0.4) == ['smart_1_raw']
+
+
+def test_pruning_keeps_other_columns_and_adds_missing_ones(tmp_path):
+    save_column_selection(['smart_1_raw', 'smart_9_raw'], tmp_path / "selection.json")
+    keep = load_column_selection(tmp_path / "selection.json")
+    pruned = prune_smart_columns(_frame(), keep).collect()
+    assert pruned.columns == ['serial_number', 'smart_1_raw', 'smart_9_raw']
+    assert pruned['smart_9_raw'].null_count() == pruned.height
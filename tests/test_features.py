@@ -0,0 +1,49 @@
+import logging
+
+import polars as pl
+import pytest
+from datetime import date, timedelta
+
+from phm_ml.data_process.features import FeatureSpec, add_features, parse_feature_specs
+
+
+def _drives() -> pl.DataFrame:
+    # Two drives with interleaved rows, so every feature has to stay within its drive
+    values = {'A': [0.0, 0.0, 2.0, 2.0, 5.0], 'B': [10.0, 11.0, 11.0, 11.0, 20.0]}
+    rows = [{'date': date(2017, 1, 1) + timedelta(days=day), 'serial_number': serial, 'smart_5_raw': value,
+             'smart_5_normalized': 100.0}
+            for serial, column in values.items() for day, value in enumerate(column)]
+    return pl.DataFrame(rows).sample(fraction=1.0, shuffle=True, seed=4)
+
+
+def _feature(specs, column: str, serial: str) -> list:
+    result = add_features(_drives().lazy(), specs).collect()
+    return result.filter(pl.col('serial_number') == serial)[column].to_list()
+
+
+def test_delta_and_rolling_features_stay_within_each_drive():
+    assert _feature([FeatureSpec("delta", window=1)], 'smart_5_raw__delta_1', 'A') == [0, 0, 2, 0, 3]
+    assert _feature([FeatureSpec("delta", window=2)], 'smart_5_raw__delta_2', 'B') == [0, 0, 1, 0, 9]
+    assert _feature([FeatureSpec("rolling_mean", window=2)], 'smart_5_raw__rolling_mean_2', 'A') == [0, 0, 1, 2, 3.5]
+    assert _feature([FeatureSpec("rolling_max", window=3)], 'smart_5_raw__rolling_max_3', 'B') == [10, 11, 11, 11, 20]
+    assert _feature([FeatureSpec("rolling_min", window=3)], 'smart_5_raw__rolling_min_3', 'B') == [10, 10, 10, 11, 11]
+    std = _feature([FeatureSpec("rolling_std", window=2)], 'smart_5_raw__rolling_std_2', 'A')
+    assert std[0] == 0 and std[2] == pytest.approx(2 ** 0.5)
+
+
+def test_ewm_and_days_since_change():
+    ewm = _feature([FeatureSpec("ewm_mean", span=3)], 'smart_5_raw__ewm_mean_3', 'B')
+    assert ewm[0] == 10 and ewm[1] == pytest.approx(10.5)
+    assert _feature([FeatureSpec("days_since_change")], 'smart_5_raw__days_since_change', 'A') == [0, 1, 0, 1, 0]
+    assert _feature([FeatureSpec("days_since_change")], 'smart_5_raw__days_since_change', 'B') == [0, 0, 1, 2, 0]
+
+
+def test_specs_from_config():
+    specs = parse_feature_specs([{'kind': "delta", 'columns': ["smart_5_raw", "smart_9_raw"]},
+                                 {'kind': "rolling_mean", 'window': 7}])
+    result = add_features(_drives().lazy(), specs, logging.getLogger("phm_ml.tests")).collect()
+    # "smart" selects raw SMART columns only; missing columns are skipped
+    assert [col for col in result.columns if '__' in col] == ['smart_5_raw__delta_1', 'smart_5_raw__rolling_mean_7']
+    assert add_features(_drives().lazy(), []).collect().equals(_drives())
+    with pytest.raises(ValueError):
+        FeatureSpec("median")
@@ -0,0 +1,61 @@
+import polars as pl
+
+from phm_ml.scoring.health import at_risk, latest_snapshots, score_fleet
+
+
+def _snapshot(**columns) -> pl.DataFrame:
+    serials = [f"S{i}" for i in range(len(next(iter(columns.values()))))]
+    return pl.DataFrame({'serial_number': serials, 'model': "M", 'failure': 0, **columns})
+
+
+def test_ranking_and_reasons():
+    today = _snapshot(smart_5_raw=[0, 8, 8, 0], smart_187_raw=[0, 0, 3, 0], smart_188_raw=[0, 0, 0, 2])
+    yesterday = _snapshot(smart_5_raw=[0, 8, 4, 0], smart_187_raw=[0, 0, 3, 0], smart_188_raw=[0, 0, 0, 2])
+    scores = score_fleet(today, yesterday, zscore_columns=[])
+
+    assert scores['serial_number'].to_list() == ["S2", "S1", "S3", "S0"]
+    assert scores['rank'].to_list() == [1, 2, 3, 4]
+    assert scores['risk_score'].to_list() == [4.0, 1.0, 0.5, 0.0]
+    reasons = dict(zip(scores['serial_number'], scores['reasons']))
+    assert reasons == {"S2": "smart_5_nonzero,smart_5_growth,smart_187_nonzero", "S1": "smart_5_nonzero",
+                       "S3": "smart_188_nonzero", "S0": None}
+    assert at_risk(scores, min_score=1.0)['serial_number'].to_list() == ["S2", "S1"]
+
+
+def test_zscores_flag_outliers_within_their_model():
+    values = [0] * 39 + [50]
+    scores = score_fleet(_snapshot(smart_194_raw=values), zscore_columns=['smart_194_raw'], rules=[], min_group_size=30)
+    assert scores.row(0, named=True)['serial_number'] == "S39"
+    assert scores.row(0, named=True)['reasons'] == "z:smart_194_raw"
+    assert score_fleet(_snapshot(smart_194_raw=values), zscore_columns=['smart_194_raw'], rules=[],
+                       min_group_size=50)['risk_score'].sum() == 0
+
+
+def test_duplicate_serials_are_scored_once():
+    today = _snapshot(smart_5_raw=[0, 8, 0])
+    yesterday = _snapshot(smart_5_raw=[0, 4, 0])
+    duplicated = score_fleet(pl.concat([today, today.tail(2)]), pl.concat([yesterday, yesterday, yesterday.tail(1)]),
+                             zscore_columns=[])
+    expected = score_fleet(today, yesterday, zscore_columns=[])
+    assert duplicated.height == 3
+    assert duplicated.sort('serial_number').equals(expected.sort('serial_number'))
+
+
+def test_latest_snapshots_pair_days(fleet):
+    snapshot, previous = latest_snapshots(fleet)
+    snapshot, previous = snapshot.collect(), previous.collect()
+    assert snapshot['serial_number'].is_unique().all()
+    last = fleet.group_by('serial_number').agg(pl.col('date').max())
+    assert snapshot.join(last, on=['serial_number', 'date'], how='anti').is_empty()
+    assert previous.height <= snapshot.height
+
+
+def test_latest_snapshots_leave_out_stale_drives():
+    history = pl.DataFrame({'serial_number': ["A", "A", "B", "B", "C"],
+                            'date': ["2017-03-30", "2017-03-31", "2017-03-29", "2017-03-30", "2017-03-20"],
+                            'smart_5_raw': [0, 1, 0, 0, 3]})
+    snapshot, previous = latest_snapshots(history)
+    assert snapshot.collect()['serial_number'].to_list() == ["A"]
+    assert previous.collect()['date'].to_list() == ["2017-03-30"]
+    assert latest_snapshots(history, max_age_days=1)[0].collect()['serial_number'].to_list() == ["A", "B"]
+    assert latest_snapshots(history, max_age_days=None)[0].collect().height == 3
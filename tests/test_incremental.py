@@ -0,0 +1,56 @@
+import logging
+
+import numpy as np
+import polars as pl
+
+from phm_ml.data_process.data_backblaze_harddrive import data_clean, fix_date_gaps
+from phm_ml.data_process.incremental import IncrementalState
+from phm_ml.data_process.sequences import build_sequences
+
+logger = logging.getLogger("phm_ml.tests")
+
+
+def _windows(serials, end_dates, X, y):
+    order = np.lexsort((end_dates, serials))
+    return serials[order].tolist(), end_dates[order].astype('datetime64[D]').tolist(), X[order], y[order]
+
+
+def test_daily_increments_match_full_run(fleet, tmp_path):
+    cleaned = data_clean(fleet.lazy(), logger).collect()
+    value_columns = [col for col in cleaned.columns if col not in ['date', 'serial_number']]
+    features = [col for col in value_columns if col != 'failure']
+    full = build_sequences(fix_date_gaps(cleaned.lazy()), 5, 2, feature_columns=features)
+
+    state = IncrementalState.empty(cleaned.schema, sequence_length=5, lookahead=2)
+    appended, batches = [], []
+    for day in cleaned['date'].unique().sort():
+        rows, sequences = state.update(cleaned.filter(pl.col('date') == day).lazy())
+        appended.append(rows)
+        batches.append(sequences)
+        # Persisting and reloading between days must not change the result
+        state.save(tmp_path)
+        state = IncrementalState.load(tmp_path)
+
+    gap_filled = fix_date_gaps(cleaned.lazy()).collect()
+    assert pl.concat(appended).height == gap_filled.height
+    assert state.state['row_count'].sum() == gap_filled.height
+
+    incremental = _windows(np.concatenate([s.serial_numbers for s in batches]),
+                           np.concatenate([s.end_dates for s in batches]),
+                           np.concatenate([s.X for s in batches]),
+                           np.concatenate([s.y for s in batches]))
+    expected = _windows(full.serial_numbers, full.end_dates, full.X, full.y)
+    assert len(full) > 0 and full.y.sum() > 0
+    assert incremental[:2] == expected[:2]
+    np.testing.assert_array_equal(incremental[2], expected[2])
+    np.testing.assert_array_equal(incremental[3], expected[3])
+
+
+def test_rows_already_processed_are_ignored(fleet):
+    cleaned = data_clean(fleet.lazy(), logger).collect()
+    first_day = cleaned.filter(pl.col('date') == cleaned['date'].min())
+    state = IncrementalState.empty(cleaned.schema, sequence_length=3, lookahead=1)
+    rows, _ = state.update(first_day.lazy())
+    assert rows.height == first_day.height
+    rows, sequences = state.update(first_day.lazy())
+    assert rows.height == 0 and len(sequences) == 0
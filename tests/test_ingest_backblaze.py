@@ -0,0 +1,50 @@
+import logging
+
+import polars as pl
+
+from phm_ml.data_process.ingest_backblaze import ingest_csv_to_parquet
+
+logger = logging.getLogger("phm_ml.tests")
+
+
+def _write_day(directory, date: str, models) -> None:
+    rows = [f"{date},S{i},{model},1000,0,{i}.0" for i, model in enumerate(models)]
+    (directory / f"{date}.csv").write_text(
+        "date,serial_number,model,capacity_bytes,failure,smart_5_raw\n" + "\n".join(rows) + "\n", encoding='utf-8')
+
+
+def test_unreadable_file_is_skipped_and_days_are_replaced(tmp_path):
+    raw = tmp_path / "raw" / "data_Q1_2017"
+    raw.mkdir(parents=True)
+    output = tmp_path / "partitions"
+    _write_day(raw, "2017-01-01", ["A", "B"])
+    _write_day(raw, "2017-01-02", ["A"])
+    (raw / "2017-01-03.csv").write_bytes(b"\xff\xfe not a csv")
+
+    written = ingest_csv_to_parquet(tmp_path / "raw", 2017, output, logger=logger)
+    assert sorted(p.relative_to(output).as_posix() for p in written) == [
+        "model=A/2017-01-01.parquet", "model=A/2017-01-02.parquet", "model=B/2017-01-01.parquet"]
+
+    # Rerun after model B left the fleet on the first day: its stale partition is removed
+    _write_day(raw, "2017-01-01", ["A"])
+    ingest_csv_to_parquet(tmp_path / "raw", 2017, output, logger=logger)
+    assert not (output / "model=B" / "2017-01-01.parquet").exists()
+    assert pl.read_parquet(output / "model=A" / "*.parquet").height == 2
+    assert not list(output.rglob("*.tmp"))
+
+
+def test_rows_without_model_or_date(tmp_path):
+    raw = tmp_path / "raw" / "data_Q1_2017"
+    raw.mkdir(parents=True)
+    (raw / "2017-01-01.csv").write_text(
+        "date,serial_number,model,capacity_bytes,failure,smart_5_raw\n"
+        "2017-01-01,S0,A,1000,0,0.0\n"
+        "2017-01-01,S1,,1000,0,1.0\n"
+        ",S2,A,1000,0,2.0\n", encoding='utf-8')
+    output = tmp_path / "partitions"
+
+    written = ingest_csv_to_parquet(tmp_path / "raw", 2017, output, logger=logger)
+    assert sorted(p.relative_to(output).as_posix() for p in written) == [
+        "model=A/2017-01-01.parquet", "model=__null__/2017-01-01.parquet"]
+    assert pl.read_parquet(output / "model=__null__" / "2017-01-01.parquet")['serial_number'].to_list() == ["S1"]
+    assert pl.read_parquet(output / "model=A" / "*.parquet")['serial_number'].to_list() == ["S0"]
@@ -0,0 +1,47 @@
+import polars as pl
+from datetime import date, timedelta
+
+from phm_ml.data_process.data_backblaze_harddrive import summarize_serials
+from phm_ml.data_process.labels import add_rul_labels, label_columns
+
+
+def _drives() -> pl.DataFrame:
+    # Drive A fails on days 2 and 5 of 7, drive B never fails
+    rows = []
+    for serial, failures in [('A', {2, 5}), ('B', set())]:
+        for day in range(7):
+            rows.append({'date': date(2017, 1, 1) + timedelta(days=day), 'serial_number': serial,
+                         'model': 'M', 'failure': int(day in failures)})
+    return pl.DataFrame(rows).sample(fraction=1.0, shuffle=True, seed=2)
+
+
+def _labels(df: pl.DataFrame, **kwargs) -> pl.DataFrame:
+    return add_rul_labels(df.lazy(), horizons=(1, 3), **kwargs).collect()
+
+
+def test_days_to_failure_count_down_to_the_next_failure():
+    labeled = _labels(_drives())
+    a = labeled.filter(pl.col('serial_number') == 'A')
+    assert a['days_to_failure'].to_list() == [2, 1, 0, 2, 1, 0, None]
+    assert a['failure_date'].to_list() == [date(2017, 1, 3)] * 3 + [date(2017, 1, 6)] * 3 + [None]
+    assert a['event_observed'].to_list() == [True] * 6 + [False]
+    assert a['fails_within_1d'].to_list() == [0, 1, 1, 0, 1, 1, 0]
+    assert a['fails_within_3d'].to_list() == [1, 1, 1, 1, 1, 1, 0]
+    assert a['days_to_last_observation'].to_list() == [6, 5, 4, 3, 2, 1, 0]
+
+
+def test_censored_drives_and_summary():
+    df = _drives()
+    labeled = _labels(df)
+    b = labeled.filter(pl.col('serial_number') == 'B')
+    assert b['days_to_failure'].null_count() == b.height
+    assert not b['event_observed'].any() and b['fails_within_3d'].sum() == 0
+    assert set(label_columns((1, 3))) <= set(labeled.columns)
+    assert _labels(df, summary=summarize_serials(df.lazy())).equals(labeled)
+
+
+def test_days_to_failure_never_negative(fleet):
+    labeled = add_rul_labels(fleet.lazy()).collect()
+    assert labeled['days_to_failure'].drop_nulls().min() >= 0
+    failed = labeled.filter(pl.col('failure') == 1)
+    assert (failed['days_to_failure'] == 0).all() and (failed['fails_within_7d'] == 1).all()
@@ -0,0 +1,15 @@
+import pytest
+
+from phm_ml.utils.memory import reset_peak_rss, track_peak_rss
+
+
+def test_peak_is_tracked_per_block():
+    if not reset_peak_rss():
+        pytest.skip("peak RSS cannot be reset on this platform")
+    with track_peak_rss() as outer:
+        block = bytearray(64 * 1024 ** 2)
+        block[::4096] = b'\x01' * len(block[::4096])
+        del block
+        with track_peak_rss() as inner:
+            pass
+    assert outer.peak - inner.peak > 32 * 1024 ** 2
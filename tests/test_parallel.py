@@ -0,0 +1,18 @@
+import polars as pl
+
+from phm_ml.data_process.parallel import run_parallel_pipeline
+from phm_ml.data_process.sequence_store import SequenceStore
+
+
+def test_run_shares_the_normal_cap_and_column_selection(fleet, tmp_path):
+    source = tmp_path / "fleet.parquet"
+    fleet.write_parquet(source)
+    smart_columns = ["smart_5_raw", "smart_187_raw"]
+    manifest = run_parallel_pipeline(source, tmp_path / "out", 5, 1, num_shards=2, workers=1,
+                                     smart_columns=smart_columns, max_normal_seq=50)
+
+    assert manifest['max_normal_seq'] == 50
+    normal = sum(entry['sequences'] - entry['failed_sequences'] for entry in manifest['partitions'])
+    assert normal == 50
+    assert all(set(entry['feature_names']) <= set(smart_columns) for entry in manifest['partitions'])
+    assert sum(len(SequenceStore(entry['path'])) for entry in manifest['partitions']) == manifest['total_sequences']
@@ -0,0 +1,55 @@
+import logging
+import subprocess
+import sys
+
+import polars as pl
+
+from phm_ml.utils.profiling import StageMetricsCollector, instrument_stage, metrics_logger, profile_stage
+
+
+def _collector(name: str) -> StageMetricsCollector:
+    collector = StageMetricsCollector()
+    logger = metrics_logger(logging.getLogger(name))
+    logger.setLevel(logging.INFO)
+    logger.addHandler(collector)
+    return collector
+
+
+def test_instrument_stage_finds_positional_logger(fleet):
+    collector = _collector("phm_ml.tests.positional")
+
+    @instrument_stage("count")
+    def count(df: pl.DataFrame, logger: logging.Logger = None) -> pl.DataFrame:
+        return df.group_by('serial_number').len()
+
+    count(fleet, logging.getLogger("phm_ml.tests.positional"))
+    count(fleet, logger=logging.getLogger("phm_ml.tests.positional"))
+    assert [m.stage for m in collector.metrics] == ["count", "count"]
+    assert all(m.rows_in == fleet.height and m.rows_out == fleet['serial_number'].n_unique() for m in collector.metrics)
+
+
+def test_collect_all_records_plans(fleet):
+    collector = _collector("phm_ml.tests.plans")
+    lazy = fleet.lazy()
+    with profile_stage("collect", logging.getLogger("phm_ml.tests.plans")) as run:
+        frames = run.collect_all([lazy.filter(pl.col('failure') == 1), lazy.select(pl.len())])
+    (metrics,) = collector.metrics
+    assert metrics.rows_out == sum(frame.height for frame in frames) == fleet['failure'].sum() + 1
+    assert "FILTER" in metrics.query_plan
+    assert metrics.peak_rss_bytes > 0 and metrics.wall_seconds > 0
+
+
+def test_collect_profiles_only_on_request_and_in_memory(fleet):
+    collector = _collector("phm_ml.tests.timings")
+    logger = logging.getLogger("phm_ml.tests.timings")
+    failed = fleet.lazy().filter(pl.col('failure') == 1)
+    for engine, timings in [("streaming", False), ("streaming", True), ("in-memory", True)]:
+        with profile_stage(f"{engine}-{timings}", logger) as run:
+            assert run.collect(failed, engine=engine, timings=timings).height == fleet['failure'].sum()
+    assert [m.plan_timings is not None for m in collector.metrics] == [False, False, hasattr(pl.LazyFrame, 'profile')]
+    assert all(m.query_plan for m in collector.metrics)
+
+
+def test_logging_setup_does_not_import_polars():
+    code = "import sys, phm_ml.utils.logging; sys.exit('polars' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
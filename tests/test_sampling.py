@@ -0,0 +1,59 @@
+import logging
+
+import polars as pl
+from polars.testing import assert_frame_equal
+from dataclasses import replace
+
+from phm_ml.config.config_loader import DataConfig, SamplingConfig, TimeSeriesConfig
+from phm_ml.data_process.backblaze_pipeline import sample_index
+from phm_ml.data_process.data_backblaze_harddrive import summarize_serials
+from phm_ml.data_process.sampling import sample_index_provenance, sample_rows
+from phm_ml.utils.pipeline import StageContext
+
+logger = logging.getLogger("phm_ml.tests")
+
+
+def _run(config: DataConfig) -> pl.DataFrame:
+    df = pl.scan_parquet(config.path['train_data'])
+    return sample_index(StageContext("sample_index", config, logger), df, summarize_serials(df, logger))
+
+
+def test_sample_index_reused_only_when_params_and_source_match(fleet, tmp_path):
+    source = tmp_path / "train.parquet"
+    fleet.write_parquet(source)
+    config = DataConfig(path={'train_data': str(source)},
+                        time_series=TimeSeriesConfig(num_normal_serials=10),
+                        sampling=SamplingConfig(index_file=str(tmp_path / "index.parquet"), seed=1))
+
+    first = _run(config)
+    assert sample_index_provenance(config.sampling.index_file)['seed'] == 1
+    assert _run(config).equals(first)
+
+    # Other parameters: resampled and saved with the new parameters
+    more = replace(config, time_series=TimeSeriesConfig(num_normal_serials=20))
+    assert _run(more).height > first.height
+    assert sample_index_provenance(config.sampling.index_file)['num_normal_serials'] == 20
+
+    # Changed source data: resampled from the new data
+    fleet.filter(pl.col('serial_number') != first['serial_number'][0]).write_parquet(source)
+    resampled = _run(more)
+    assert first['serial_number'][0] not in resampled['serial_number'].to_list()
+
+
+def test_sample_rows_independent_of_row_order(fleet):
+    sizes = {0: 300, 1: None}
+    sample = sample_rows(fleet.lazy(), sizes, seed=3).collect()
+    shuffled = sample_rows(fleet.sample(fraction=1.0, shuffle=True, seed=11).lazy(), sizes, seed=3).collect()
+    assert sample.filter(pl.col('failure') == 0).height == 300
+    assert sample.filter(pl.col('failure') == 1).height == fleet['failure'].sum()
+    assert_frame_equal(sample.sort(['serial_number', 'date']), shuffled.sort(['serial_number', 'date']))
+    assert not sample_rows(fleet.lazy(), sizes, seed=4).collect().sort(['serial_number', 'date']).equals(
+        sample.sort(['serial_number', 'date']))
+
+
+def test_sample_rows_with_duplicates_keeps_at_most_size(fleet):
+    duplicated = pl.concat([fleet, fleet])
+    for size in [1, 301, 302]:
+        sample = sample_rows(duplicated.lazy(), {0: size, 1: None}, seed=3).collect()
+        assert sample.filter(pl.col('failure') == 0).height == size
+        assert sample.filter(pl.col('failure') == 1).height == duplicated['failure'].sum()
@@ -0,0 +1,62 @@
+import math
+
+import numpy as np
+import polars as pl
+import pytest
+
+from phm_ml.data_process.scaling import Scaler, fit_scaler
+
+
+def _assert_same_stats(merged: Scaler, full: Scaler):
+    assert merged.columns == full.columns
+    for col in full.columns:
+        a, b = merged.stats[col], full.stats[col]
+        assert a.count == b.count
+        assert a.min == b.min and a.max == b.max
+        assert a.mean == pytest.approx(b.mean, rel=1e-9, abs=1e-9)
+        assert a.m2 == pytest.approx(b.m2, rel=1e-9, abs=1e-6)
+        assert (a.sketch.positive, a.sketch.negative, a.sketch.zero) == (b.sketch.positive, b.sketch.negative, b.sketch.zero)
+
+
+def test_merged_shard_fits_equal_full_fit(fleet):
+    full = fit_scaler(fleet.lazy())
+    shards = fleet.with_columns((pl.col('serial_number').hash(seed=0) % 4).alias('shard')).partition_by('shard')
+    fits = [fit_scaler(shard.drop('shard').lazy()) for shard in shards]
+    merged = fits[0]
+    for fit in fits[1:]:
+        merged = merged.merge(fit)
+    _assert_same_stats(merged, full)
+    for method in ["standard", "minmax", "robust"]:
+        expected = Scaler(method, full.stats).parameters()
+        for col, params in Scaler(method, merged.stats).parameters().items():
+            assert params == pytest.approx(expected[col])
+
+
+def test_empty_and_single_row_shards(fleet):
+    full = fit_scaler(fleet.lazy())
+    empty = fit_scaler(fleet.head(0).lazy())
+    assert all(stats.count == 0 and stats.min is None for stats in empty.stats.values())
+    _assert_same_stats(empty.merge(full), full)
+    _assert_same_stats(full.merge(empty), full)
+
+    single = fit_scaler(fleet.head(1).lazy())
+    assert all(stats.count == 1 and stats.m2 == 0 for stats in single.stats.values())
+    _assert_same_stats(single.merge(fit_scaler(fleet.slice(1).lazy())), full)
+    # A single value has no spread, so it is only centred
+    params = single.parameters()
+    col = single.columns[0]
+    assert params[col]['scale'] == 1.0 and params[col]['center'] == fleet[col][0]
+
+
+def test_transform_standardizes_and_round_trips(fleet, tmp_path):
+    scaler = fit_scaler(fleet.lazy(), columns=['smart_9_raw', 'smart_194_raw'])
+    scaler.save(tmp_path / "scaler.json")
+    loaded = Scaler.load(tmp_path / "scaler.json")
+    scaled = loaded.transform(fleet.lazy()).collect()
+    for col in loaded.columns:
+        assert scaled[col].mean() == pytest.approx(0.0, abs=1e-9)
+        assert scaled[col].std(ddof=0) == pytest.approx(1.0)
+    X = fleet.select(['smart_194_raw', 'smart_9_raw']).to_numpy()[None]
+    np.testing.assert_allclose(loaded.transform_array(X, ['smart_194_raw', 'smart_9_raw'])[0],
+                               scaled.select(['smart_194_raw', 'smart_9_raw']).to_numpy())
+    assert math.isclose(loaded.stats['smart_9_raw'].mean, scaler.stats['smart_9_raw'].mean)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from phm_ml.data_process.scaling import ColumnStats, QuantileSketch, Scaler
+from phm_ml.data_process.sequence_store import SequenceStore, merge_sequence_stores, write_sequence_store
+from phm_ml.data_process.sequences import SequenceSet
+
+
+def _sequences(n: int, n_failed: int, offset: int = 0) -> SequenceSet:
+    # Sequence i holds the value offset + i everywhere, so batches can be traced back to the store
+    values = np.arange(offset, offset + n, dtype=np.float32)
+    return SequenceSet(
+        X=np.repeat(values[:, None, None], 3, axis=1).repeat(2, axis=2),
+        y=np.array([1] * n_failed + [0] * (n - n_failed), dtype=np.int8),
+        serial_numbers=np.array([f"S{offset + i}" for i in range(n)]),
+        end_dates=np.arange(n).astype('datetime64[D]'),
+        feature_names=['smart_5_raw', 'smart_9_raw']
+    )
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_epoch_reads_every_sequence_once(tmp_path, prefetch):
+    store = write_sequence_store(_sequences(50, 5), tmp_path)
+    assert isinstance(store.X, np.memmap) and store.X.shape == (50, 3, 2)
+    batches = list(store.batches(batch_size=16, prefetch=prefetch, seed=1))
+    assert [len(y) for _, y in batches] == [16, 16, 16, 2]
+    X = np.concatenate([X for X, _ in batches])
+    y = np.concatenate([y for _, y in batches])
+    np.testing.assert_array_equal(np.sort(X[:, 0, 0]), np.arange(50))
+    np.testing.assert_array_equal(y, (X[:, 0, 0] < 5).astype(np.int8))
+    assert len(store.batches(batch_size=16, drop_last=True)) == 3
+
+
+def test_shuffling_is_seeded_per_epoch(tmp_path):
+    store = write_sequence_store(_sequences(40, 4), tmp_path)
+
+    def first_batch(iterator):
+        return next(iter(iterator))[0][:, 0, 0]
+
+    iterator = store.batches(batch_size=10, seed=3, prefetch=0)
+    epoch_0, epoch_1 = first_batch(iterator), first_batch(iterator)
+    np.testing.assert_array_equal(epoch_0, first_batch(store.batches(batch_size=10, seed=3, prefetch=0)))
+    assert not np.array_equal(epoch_0, epoch_1)
+    # Rows of a batch are read in store order
+    assert (np.diff(epoch_0) > 0).all()
+    np.testing.assert_array_equal(first_batch(store.batches(batch_size=10, shuffle=False, prefetch=0)), np.arange(10))
+
+
+def test_balanced_batches_and_scaler(tmp_path):
+    store = write_sequence_store(_sequences(100, 5), tmp_path)
+    y = np.concatenate([y for _, y in store.batches(batch_size=32, balanced=True, epoch_size=200)])
+    assert len(y) == 200 and y.sum() == 100
+    sketch = QuantileSketch()
+    scaler = Scaler("standard", {'smart_9_raw': ColumnStats(1, 10.0, 4.0, 10.0, 10.0, sketch)})
+    X, _ = next(iter(store.batches(batch_size=100, shuffle=False, scaler=scaler)))
+    np.testing.assert_allclose(X[:, 0, 0], np.arange(100))
+    np.testing.assert_allclose(X[:, 0, 1], (np.arange(100) - 10.0) / 2.0)
+    assert X.dtype == np.float32
+
+
+def test_errors_surface_and_stores_merge(tmp_path):
+    store = write_sequence_store(_sequences(10, 1), tmp_path / "a")
+    write_sequence_store(_sequences(5, 2, offset=10), tmp_path / "b")
+    merged = merge_sequence_stores([tmp_path / "a", tmp_path / "b"], tmp_path / "merged")
+    assert len(merged) == 15 and merged.y.sum() == 3
+    np.testing.assert_array_equal(merged.X[:, 0, 0], np.arange(15))
+    assert merged.meta()['serial_number'].to_list() == [f"S{i}" for i in range(15)]
+    assert len(SequenceStore(tmp_path / "merged")) == 15
+
+    store.y = None  # a failing read in the prefetch thread is raised in the consumer
+    with pytest.raises(TypeError):
+        list(store.batches(batch_size=4, prefetch=2))
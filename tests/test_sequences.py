@@ -0,0 +1,49 @@
+import numpy as np
+import polars as pl
+import pytest
+from datetime import date, timedelta
+
+from phm_ml.data_process.sequences import build_sequences
+
+
+def _drives() -> pl.DataFrame:
+    # Drive A: 6 days, failing on the last one; drive B: 4 healthy days. smart_5_raw encodes the row.
+    rows = []
+    for serial, days, offset in [('A', 6, 0), ('B', 4, 100)]:
+        for day in range(days):
+            rows.append({'date': date(2017, 1, 1) + timedelta(days=day), 'serial_number': serial,
+                         'failure': int(serial == 'A' and day == days - 1), 'smart_5_raw': float(offset + day)})
+    # Shuffled input: build_sequences has to order each drive by date itself
+    return pl.DataFrame(rows).sample(fraction=1.0, shuffle=True, seed=1)
+
+
+def test_windows_stay_inside_each_drive_and_are_date_ordered():
+    result = build_sequences(_drives().lazy(), sequence_length=3, lookahead=1)
+    # A: windows ending at day 2..4, B: windows ending at day 2
+    assert result.X.shape == (4, 3, 1)
+    assert result.serial_numbers.tolist() == ['A', 'A', 'A', 'B']
+    np.testing.assert_array_equal(result.X[:, :, 0], [[0, 1, 2], [1, 2, 3], [2, 3, 4], [100, 101, 102]])
+
+
+def test_label_is_taken_lookahead_rows_after_window_end():
+    result = build_sequences(_drives().lazy(), sequence_length=3, lookahead=1)
+    # Only the window ending the day before A's failure is labelled 1
+    assert result.y.tolist() == [0, 0, 1, 0]
+    assert result.end_dates[2] == np.datetime64('2017-01-05')
+
+    result = build_sequences(_drives().lazy(), sequence_length=2, lookahead=0)
+    failed = result.X[result.y == 1]
+    np.testing.assert_array_equal(failed[:, :, 0], [[4, 5]])
+
+
+def test_caps_and_stride():
+    result = build_sequences(_drives().lazy(), sequence_length=2, lookahead=1, max_normal_seq=2, seed=3)
+    assert (result.y == 0).sum() == 2 and (result.y == 1).sum() == 1
+    # Windows are aligned to the end of each drive, so the failure window survives any stride
+    result = build_sequences(_drives().lazy(), sequence_length=2, lookahead=1, stride=3)
+    assert 1 in result.y.tolist()
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        build_sequences(_drives().lazy(), sequence_length=0, lookahead=1)
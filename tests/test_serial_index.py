@@ -0,0 +1,45 @@
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from phm_ml.data_process.serial_index import SerialIndex, write_serial_indexed_parquet
+
+
+def _expected(fleet: pl.DataFrame, serials) -> pl.DataFrame:
+    return fleet.filter(pl.col('serial_number').is_in(list(serials))).sort(['serial_number', 'date'])
+
+
+def test_read_serial_matches_filter(fleet, tmp_path):
+    index = write_serial_indexed_parquet(fleet.lazy(), tmp_path, rows_per_file=500)
+    assert len(index) == fleet['serial_number'].n_unique()
+    for serial in index.serials[::7]:
+        assert_frame_equal(index.read_serial(serial), _expected(fleet, [serial]))
+    serial = index.serials[-1]
+    assert_frame_equal(index.read_serial(serial, columns=['date', 'smart_5_raw']),
+                       _expected(fleet, [serial]).select(['date', 'smart_5_raw']))
+
+
+def test_files_end_at_serial_boundaries(fleet, tmp_path):
+    index = write_serial_indexed_parquet(fleet.lazy(), tmp_path, rows_per_file=500)
+    files = sorted(tmp_path.glob("part-*.parquet"))
+    assert len(files) > 1
+    for file in files:
+        serials = pl.read_parquet(file)['serial_number'].unique()
+        assert all(index.locate(serial)[0] == file.name for serial in serials)
+    assert not (tmp_path / "_sorted.parquet").exists()
+
+
+def test_read_serials_in_storage_order(fleet, tmp_path):
+    index = write_serial_indexed_parquet(fleet.lazy(), tmp_path, rows_per_file=500)
+    serials = [index.serials[i] for i in (40, 3, 17, 3)]
+    assert_frame_equal(index.read_serials(serials), _expected(fleet, serials))
+    assert_frame_equal(index.read_serials(serials, columns=['serial_number', 'failure']),
+                       _expected(fleet, serials).select(['serial_number', 'failure']))
+    assert index.read_serials([]).height == 0
+
+
+def test_rewrite_removes_stale_files(fleet, tmp_path):
+    write_serial_indexed_parquet(fleet.lazy(), tmp_path, rows_per_file=200)
+    subset = fleet.filter(pl.col('serial_number').is_in(fleet['serial_number'].unique().sort().head(5).implode()))
+    index = write_serial_indexed_parquet(subset.lazy(), tmp_path, rows_per_file=200)
+    assert index.scan().select(pl.len()).collect().item() == subset.height
+    assert SerialIndex(tmp_path).serials == index.serials
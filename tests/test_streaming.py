@@ -0,0 +1,42 @@
+import logging
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from phm_ml.data_process.data_backblaze_harddrive import compact_casts, data_clean, fix_date_gaps
+from phm_ml.data_process.streaming import run_sharded
+
+logger = logging.getLogger("phm_ml.tests")
+
+
+def _with_outlier(fleet: pl.DataFrame) -> pl.DataFrame:
+    # One drive with a reading only Int32 can hold, so per-shard profiles would disagree
+    serial = fleet['serial_number'].min()
+    return fleet.with_columns(
+        pl.when(pl.col('serial_number') == serial).then(pl.lit(100_000.0)).otherwise(pl.col('smart_5_raw')).alias('smart_5_raw')
+    )
+
+
+def test_compact_shards_share_one_schema(fleet, tmp_path):
+    df = _with_outlier(fleet).lazy()
+    casts = compact_casts(df)
+    assert casts['smart_5_raw'] == pl.Int32
+
+    result = run_sharded(df, lambda shard_df: fix_date_gaps(data_clean(shard_df, logger, compact=True, casts=casts)),
+                         spill_directory=tmp_path, num_shards=3, stage_name="gap_filled").collect()
+    assert len(list((tmp_path / "gap_filled").glob("shard-*.parquet"))) == 3
+    assert result.schema['smart_5_raw'] == pl.Int32
+
+    expected = fix_date_gaps(data_clean(df, logger, compact=True)).collect()
+    key = ['serial_number', 'date']
+    assert_frame_equal(result.with_columns(pl.col('serial_number').cast(pl.String)).sort(key),
+                       expected.with_columns(pl.col('serial_number').cast(pl.String)).sort(key))
+
+
+def test_compact_casts_cover_nulls_and_fractions(fleet):
+    df = fleet.lazy().with_columns(pl.lit(None, dtype=pl.Float64).alias('smart_9_raw'), pl.lit(0.5).alias('smart_194_raw'))
+    casts = compact_casts(df, float32=True)
+    assert casts['smart_9_raw'] == pl.Int8
+    assert casts['smart_194_raw'] == pl.Float32
+    assert casts['serial_number'] == pl.Categorical and casts['failure'] == pl.Int8
+    assert 'smart_5_normalized' not in casts
@@ -0,0 +1,112 @@
+import datetime
+import logging
+
+import polars as pl
+import pytest
+
+from phm_ml.config.config_loader import DataConfig, ValidationConfig
+from phm_ml.data_process import backblaze_pipeline
+from phm_ml.data_process.validation import (
+    VALIDATION_CHECKS, ValidationReport, apply_validation, deduplicate_rows, validate_telemetry
+)
+from phm_ml.utils.cache import StageCache
+from phm_ml.utils.pipeline import Pipeline, Stage, StageContext, StageFunction
+
+
+def test_checks_count_each_violation(fleet):
+    serials = fleet['serial_number'].unique().sort().to_list()
+    failed = fleet.filter(pl.col('failure') == 1)['serial_number'][0]
+    healthy = [serial for serial in serials if serial != failed]
+    last = fleet.filter(pl.col('serial_number') == failed).sort('date').tail(1)
+    changed = fleet.filter(pl.col('serial_number') == healthy[1]).sort('date')
+    df = pl.concat([
+        fleet.filter(pl.col('serial_number') != healthy[1]),
+        fleet.filter(pl.col('serial_number') == healthy[0]).head(2),
+        last.with_columns(pl.col('date') + datetime.timedelta(days=1), pl.lit(0, dtype=fleet['failure'].dtype).alias('failure')),
+        changed.with_columns(pl.when(pl.int_range(pl.len()) >= 5).then(pl.lit("OTHER")).otherwise(pl.col('model')).alias('model'),
+                             pl.when(pl.int_range(pl.len()) == 6).then(pl.lit(-1.0)).otherwise(pl.col('smart_9_raw')).alias('smart_9_raw')),
+    ])
+
+    report = validate_telemetry(df.lazy(), counter_columns=['smart_9_raw'], logger=logging.getLogger("phm_ml.tests"))
+    summary = report.summary
+    assert (summary['rows'], summary['serials']) == (df.height, fleet['serial_number'].n_unique())
+    assert summary['duplicate_rows'] == 2
+    assert summary['post_failure_rows'] == 1
+    assert summary['model_changes'] == 1
+    assert summary['decreasing_by_column'] == {'smart_9_raw': summary['decreasing_counters']}
+    assert summary['decreasing_counters'] >= 1
+    assert sorted(report.violations['serial_number']) == sorted([failed, healthy[0], healthy[1]])
+    assert report.serials(['duplicate_rows']).to_list() == [healthy[0]]
+    with pytest.raises(ValueError):
+        report.serials(['unknown'])
+
+
+def test_actions(fleet, tmp_path):
+    duplicated = pl.concat([fleet, fleet.head(3)])
+    report = validate_telemetry(duplicated.lazy())
+    assert apply_validation(duplicated.lazy(), report, action="report").collect().height == duplicated.height
+
+    deduped = apply_validation(duplicated.lazy(), report, action="dedupe").collect()
+    assert deduped.height == fleet.height
+    assert deduped.sort(['serial_number', 'date']).equals(fleet.sort(['serial_number', 'date']))
+
+    quarantine_file = tmp_path / "quarantined.parquet"
+    clean = apply_validation(duplicated.lazy(), report, action="quarantine", quarantine_file=quarantine_file).collect()
+    quarantined = pl.read_parquet(quarantine_file)
+    assert clean.height + quarantined.height == duplicated.height
+    assert set(quarantined['serial_number']) == set(report.serials())
+    with pytest.raises(ValueError):
+        apply_validation(duplicated.lazy(), report, action="drop")
+
+
+def test_deduplicate_prefers_failure_rows():
+    df = pl.DataFrame({'serial_number': ["A", "A", "A"], 'date': ["2017-01-01", "2017-01-02", "2017-01-02"],
+                       'failure': [0, 1, 0]})
+    assert deduplicate_rows(df.lazy()).collect()['failure'].to_list() == [0, 1]
+
+
+def test_report_round_trip(fleet, tmp_path):
+    report = validate_telemetry(pl.concat([fleet, fleet.head(1)]).lazy())
+    report.save(tmp_path)
+    loaded = ValidationReport.load(tmp_path)
+    assert loaded.summary == report.summary
+    assert loaded.violations.equals(report.violations)
+    assert set(VALIDATION_CHECKS) <= set(loaded.violations.columns)
+
+
+def test_pipeline_skips_validation_feeding_cache_hits(fleet, tmp_path):
+    calls = []
+
+    def validate(context, df):
+        calls.append(context.stage)
+        return df
+
+    registry = {
+        'scan': StageFunction(lambda context: fleet.lazy()),
+        'validate': StageFunction(validate),
+        'count': StageFunction(lambda context, df: df.group_by('serial_number').len()),
+        'report': StageFunction(lambda context, counts: counts.lazy().collect().height),
+    }
+    stages = [Stage('scan', 'scan'), Stage('validated', 'validate', {'df': 'scan'}),
+              Stage('counts', 'count', {'df': 'validated'}, cache=True), Stage('report', 'report', {'counts': 'counts'})]
+    cache = StageCache(tmp_path)
+    for _ in range(2):
+        outputs = Pipeline(stages, registry, None, cache, targets=['report']).run()
+        assert outputs['report'] == fleet['serial_number'].n_unique()
+    assert calls == ['validated']
+
+
+def test_report_only_validation_runs_once_per_key(fleet, tmp_path, monkeypatch):
+    calls = []
+
+    def counting_validate(df, **kwargs):
+        calls.append(1)
+        return validate_telemetry(df, **kwargs)
+
+    monkeypatch.setattr(backblaze_pipeline, 'validate_telemetry', counting_validate)
+    config = DataConfig(path={}, validation=ValidationConfig(report_directory=str(tmp_path)))
+    for key in ["a", "a", "b"]:
+        context = StageContext("validated", config, logging.getLogger("phm_ml.tests"), key=key)
+        assert backblaze_pipeline.validate(context, fleet.lazy()).collect().height == fleet.height
+    assert len(calls) == 2
+    assert ValidationReport.load(tmp_path / "validated").summary['stage_key'] == "b"